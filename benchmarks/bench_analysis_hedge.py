@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Latencia del análisis GPT-4 de /test-exhaustive esperando siempre a GPT-4 (antes)
+vs modo hedged con plazo y fallback simulado (después).
+
+Levanta el servidor OpenAI simulado (mock_openai.py) en un hilo y antes
+de cada consulta le asigna una latencia de cola pesada (la mayoría rápidas, algunas
+muy lentas). Cada consulta usa un resumen distinto para no acertar en la caché.
+En modo hedged verifica además que los análisis tardíos queden en la caché: una
+segunda pasada con los mismos resúmenes debe devolver todo desde GPT-4.
+
+Uso:
+    python benchmarks/bench_analysis_hedge.py [--requests 40] [--deadline 1]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from mock_openai import create_mock_openai_app  # noqa: E402
+
+def start_mock():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    mock = create_mock_openai_app(0)
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return mock, port
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+async def run(main, mock, latencies, hedge, label):
+    """Una consulta por latencia simulada; devuelve (segundos por consulta, cuántas vinieron de GPT-4)"""
+    elapsed, ai_powered = [], 0
+    for i, latency in enumerate(latencies):
+        mock.state.latency = latency
+        start = time.perf_counter()
+        result = await main.gpt_seguridad_pruebas(f"{main.RESUMEN_TECNICO_EXHAUSTIVO}\n{label} {i}", hedge=hedge)
+        elapsed.append(time.perf_counter() - start)
+        ai_powered += bool(result.get("ai_powered"))
+    return elapsed, ai_powered
+
+async def benchmark(main, mock, latencies):
+    async with main.lifespan(main.app):  # crea el cliente OpenAI
+        return await compare(main, mock, latencies)
+
+async def compare(main, mock, latencies):
+    rows = [("antes (espera a GPT-4)",) + await run(main, mock, latencies, False, "sin-hedge"),
+            ("ahora (hedged)",) + await run(main, mock, latencies, True, "hedge")]
+    # Los análisis tardíos terminan en segundo plano y se guardan en la caché
+    while main.analysis_hedge.stats()["pending"]:
+        await asyncio.sleep(0.05)
+    mock.state.latency = max(latencies)
+    rows.append(("hedged, segunda pasada",) + await run(main, mock, latencies, True, "hedge"))
+    return rows
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--deadline", type=float, default=1.0, help="plazo del modo hedged (s)")
+    args = parser.parse_args()
+
+    mock, port = start_mock()
+    os.environ.update(OPENAI_API_KEY_SECRET="sk-mock", OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1",
+                      ANALYSIS_HEDGE_DEADLINE=str(args.deadline),
+                      ANALYSIS_CACHE_PATH=os.path.join(tempfile.mkdtemp(), "analysis-cache.sqlite3"))
+    import main
+    main.print = lambda *a, **k: None
+
+    rng = random.Random(21)
+    # 90 % entre 0.1 y 0.5 s, 10 % entre 2 y 4 s
+    latencies = [rng.uniform(2, 4) if rng.random() < 0.1 else rng.uniform(0.1, 0.5) for _ in range(args.requests)]
+    rows = asyncio.run(benchmark(main, mock, latencies))
+
+    print(f"📊 Análisis GPT-4 ({args.requests} consultas, plazo hedged {args.deadline:g} s)")
+    print(f"  {'modo':<26} {'p50 s':>7} {'p99 s':>7} {'máx s':>7} {'GPT-4':>7}")
+    for label, elapsed, ai_powered in rows:
+        print(f"  {label:<26} {percentile(elapsed, 50):7.2f} {percentile(elapsed, 99):7.2f} "
+              f"{max(elapsed):7.2f} {ai_powered:>4}/{len(elapsed)}")
+    if rows[2][2] != args.requests:
+        raise SystemExit(f"❌ Algún análisis tardío no quedó en caché ({main.analysis_hedge.stats()})")
+    print(f"✅ Los {main.analysis_hedge.stats()['late_stored']} análisis tardíos quedaron en caché para la siguiente consulta")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Benchmark del análisis GPT-4 por SSE: tiempo hasta la primera puntuación en
+/test-exhaustive/stream vs esperar la respuesta completa (como /test-exhaustive).
+
+Un cliente OpenAI falso emite la respuesta JSON token a token al ritmo indicado,
+así el resultado no depende de la red ni de la cuenta. Antes de medir verifica el
+parser incremental contra objetos aleatorios partidos en fragmentos aleatorios:
+debe emitir las mismas secciones que el análisis completo y el mismo objeto final.
+
+Uso:
+    python benchmarks/bench_analysis_stream.py [--fuzz 20000] [--tokens-per-second 40]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import types
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+CHARS_PER_TOKEN = 4
+
+ANALYSIS = {
+    "security_score": 88,
+    "performance_score": 80,
+    "ux_score": 85,
+    "backend_score": 82,
+    "recommendations": {
+        category: {
+            "implemented": [f"Medida implementada de {category} número {i}" for i in range(4)],
+            "pending": [f"Mejora pendiente de {category} con prioridad {i}" for i in range(5)],
+        }
+        for category in ("security", "performance", "ux_ui", "backend")
+    },
+    "summary": "El sistema cubre las protecciones básicas; faltan 2FA, cifrado y monitoreo. " * 3,
+    "ai_confidence": 90,
+    "critical_vulnerabilities": ["Sin 2FA", "Sin cifrado AES-256", "Sin WAF"],
+    "next_priority_actions": ["Implementar 2FA", "Cifrar datos sensibles", "Configurar monitoreo"],
+}
+
+async def no_cache(*args):
+    """Reemplazo de AnalysisCache.get/put: la caché nunca tiene la entrada"""
+    return None
+
+def random_value(rng, depth):
+    roll = rng.random()
+    if depth < 3 and roll < 0.3:
+        return {f"k{i}\"\\{{": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+    if depth < 3 and roll < 0.5:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return rng.choice([1, -2.5e3, 0, 94, True, False, None, "", "a,}]", "x\\\"y", "ñ {[", "😀"])
+
+def check_parser(iterations: int):
+    rng = random.Random(16)
+    for _ in range(iterations):
+        analysis = {f"key{i}": random_value(rng, 1) for i in range(rng.randint(0, 6))}
+        text = json.dumps(analysis, ensure_ascii=rng.random() < 0.5, indent=rng.choice((None, 2)))
+        if rng.random() < 0.3:
+            text = f"```json\n{text}\n```"
+        parser = main.JSONSectionParser()
+        sections = []
+        position = 0
+        while position < len(text):
+            size = rng.randint(1, 12)
+            sections += parser.feed(text[position:position + size])
+            position += size
+        if sections != list(main.analysis_sections(analysis)) or parser.result() != analysis:
+            raise SystemExit(f"❌ Secciones distintas para {text!r}")
+    print(f"✅ Parser incremental: {iterations:,} objetos con las mismas secciones y resultado")
+
+class FakeStreamingClient:
+    """Cliente AsyncOpenAI mínimo que emite la respuesta como chunks de streaming"""
+
+    def __init__(self, text: str, tokens_per_second: float):
+        self.text = text
+        self.delay = 1 / tokens_per_second
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        if not kwargs.get("stream"):
+            await asyncio.sleep(self.delay * len(self.text) / CHARS_PER_TOKEN)
+            message = types.SimpleNamespace(content=self.text)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+        return FakeStream(self.chunks())
+
+    async def chunks(self):
+        for start in range(0, len(self.text), CHARS_PER_TOKEN):
+            await asyncio.sleep(self.delay)
+            delta = types.SimpleNamespace(content=self.text[start:start + CHARS_PER_TOKEN])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+class FakeStream:
+    """Como openai.AsyncStream: iterable asíncrono con close() para liberar la conexión"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks
+
+    async def close(self):
+        self.closed = True
+        await self._chunks.aclose()
+
+def start_server():
+    """uvicorn en un hilo de este proceso (el TestClient no entrega la respuesta por partes)"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+def measure_stream(base):
+    start = time.perf_counter()
+    marks = {}
+    with httpx.stream("GET", base + "/test-exhaustive/stream", timeout=None) as response:
+        buffer = ""
+        for text in response.iter_text():
+            buffer += text
+            while "\n\n" in buffer:
+                block, buffer = buffer.split("\n\n", 1)
+                event, data = (line.split(": ", 1)[1] for line in block.split("\n"))
+                path = json.loads(data).get("path", [None])[0] if event == "section" else event
+                marks.setdefault(path, time.perf_counter() - start)
+    if "fallback" in marks:
+        raise SystemExit("❌ El stream cambió al análisis simulado")
+    return marks
+
+def benchmark(tokens_per_second: float):
+    text = "```json\n" + json.dumps(ANALYSIS, ensure_ascii=False, indent=2) + "\n```"
+    main.OPENAI_AVAILABLE = True
+    main.openai_client = FakeStreamingClient(text, tokens_per_second)
+    main.print = lambda *a, **k: None
+    # Sin caché de análisis: ambas variantes deben esperar al modelo
+    main.analysis_cache.get = main.analysis_cache.put = no_cache
+    server, base = start_server()
+
+    tokens = len(text) / CHARS_PER_TOKEN
+    print(f"\n📊 Respuesta de {tokens:,.0f} tokens a {tokens_per_second:g} tokens/s")
+
+    start = time.perf_counter()
+    asyncio.run(main.gpt_seguridad_pruebas(main.RESUMEN_TECNICO_EXHAUSTIVO))
+    blocking = time.perf_counter() - start
+    print(f"  {'sin streaming: respuesta completa':<40} {blocking:8.2f} s")
+
+    marks = measure_stream(base)
+    server.should_exit = True
+    for label, key in (("SSE: security_score", "security_score"), ("SSE: backend_score", "backend_score"),
+                       ("SSE: recomendaciones", "recommendations"), ("SSE: reporte final", "done")):
+        print(f"  {label:<40} {marks[key]:8.2f} s")
+
+    parser = main.JSONSectionParser()
+    pieces = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+    start = time.perf_counter()
+    for piece in pieces:
+        parser.feed(piece)
+    print(f"  {'costo del parser por token':<40} {(time.perf_counter() - start) / len(pieces) * 1e6:8.1f} µs")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=20_000)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    args = parser.parse_args()
+    check_parser(args.fuzz)
+    benchmark(args.tokens_per_second)
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmark de POST /validate-data/bulk: registros por segundo y memoria máxima del
+proceso con archivos NDJSON y CSV de tamaño creciente.
+
+La app se invoca directamente por ASGI: el cuerpo se genera en fragmentos de 64 KiB
+y la respuesta solo se cuenta, sin guardarla, para que ninguno de los dos lados
+acumule datos. Si la memoria es constante el RSS máximo no crece con las filas.
+
+Uso:
+    python benchmarks/bench_bulk_validation.py [--rows 10000 100000 1000000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+RECORDS = [
+    {"nombre": "María José Rodríguez Vargas", "cedula": "1-0234-0567", "telefono": "8845-1234",
+     "direccion": "San José, Barrio Escalante, 200 m norte de la iglesia"},
+    {"nombre": "Carlos Mora", "cedula": "2-0456-0789", "telefono": "6012 3456",
+     "direccion": "Heredia, San Pablo, frente al parque"},
+    {"nombre": "X", "cedula": "123", "telefono": "5555", "direccion": "corta"},
+]
+
+def ndjson_lines(rows):
+    encoded = [json.dumps(record, ensure_ascii=False).encode() + b"\n" for record in RECORDS]
+    for i in range(rows):
+        yield encoded[i % len(encoded)]
+
+def csv_lines(rows):
+    yield b"nombre,cedula,telefono,direccion\n"
+    encoded = [
+        ",".join(f'"{record[key]}"' for key in ("nombre", "cedula", "telefono", "direccion")).encode() + b"\n"
+        for record in RECORDS
+    ]
+    for i in range(rows):
+        yield encoded[i % len(encoded)]
+
+def chunked(lines):
+    buffer = bytearray()
+    for line in lines:
+        buffer += line
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    yield bytes(buffer)
+
+async def run_bulk(lines, content_type, client_port):
+    chunks = chunked(lines)
+    pending = next(chunks)
+    received = {"bytes": 0, "lines": 0, "tail": b""}
+
+    async def receive():
+        nonlocal pending
+        current = pending
+        pending = next(chunks, None)
+        return {"type": "http.request", "body": current, "more_body": pending is not None}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            received["bytes"] += len(body)
+            received["lines"] += body.count(b"\n")
+            if body:
+                received["tail"] = body[-200:]
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/validate-data/bulk", "raw_path": b"/validate-data/bulk",
+        "query_string": b"", "root_path": "", "server": ("bench", 80),
+        "client": ("10.99.0.1", client_port),
+        "headers": [(b"host", b"bench"), (b"content-type", content_type.encode())],
+    }
+    await main.app(scope, receive, send)
+    return received
+
+def max_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    # El print por dirección rechazada no es parte de lo que se mide
+    main.print = lambda *a, **k: None
+
+    formats = (("NDJSON", "application/x-ndjson", ndjson_lines), ("CSV", "text/csv", csv_lines))
+    print(f"📊 RSS inicial {max_rss_mib():.1f} MiB")
+    print(f"  {'formato':<8} {'filas':>10} {'registros/s':>14} {'respuesta':>12} {'RSS máx':>10}")
+    port = 0
+    for rows in args.rows:
+        for label, content_type, lines in formats:
+            main.rate_limiter.clear()
+            port += 1
+            start = time.perf_counter()
+            received = asyncio.run(run_bulk(lines(rows), content_type, port))
+            elapsed = time.perf_counter() - start
+
+            summary = json.loads(received["tail"].splitlines()[-1])["summary"]
+            assert summary["total"] == rows, summary
+            print(f"  {label:<8} {rows:>10,} {rows / elapsed:>14,.0f} "
+                  f"{received['bytes'] / 1024 / 1024:>9.1f} MiB {max_rss_mib():>6.1f} MiB")
+
+if __name__ == "__main__":
+    main_bench()
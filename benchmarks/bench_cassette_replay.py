@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Prueba de carga offline de las rutas GPT-4 con el transporte cassette: graba una vez
+(OPENAI_TRANSPORT=record) y reproduce sin red (OPENAI_TRANSPORT=replay).
+
+La grabación se hace contra el servidor OpenAI simulado (mock_openai.py),
+que aquí ocupa el lugar de la API real; con una clave real y OPENAI_TRANSPORT=record
+en el servidor se graba igual contra OpenAI. Después el simulado deja de recibir
+tráfico y /test-exhaustive, /test-gpt4 y /test-system-complete se cargan en paralelo
+con la latencia de replay indicada. Verifica que ninguna consulta salga a la red,
+que no falte ninguna grabación y que las respuestas sigan siendo de GPT-4.
+
+Uso:
+    python benchmarks/bench_cassette_replay.py [--clients 20] [--latency lognormal:0.8,0.4]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from mock_openai import create_mock_openai_app  # noqa: E402
+
+ROUTES = [("POST", "/test-exhaustive"), ("GET", "/test-gpt4"), ("GET", "/test-system-complete")]
+
+async def no_cache(*args):
+    """Reemplazo de AnalysisCache.get/put: la caché nunca tiene la entrada"""
+    return None
+
+def start_mock(latency):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    mock = create_mock_openai_app(latency)
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return mock, port
+
+def gpt_powered(path, body):
+    """True si la respuesta de la ruta vino de GPT-4 (no de un fallback)"""
+    if path == "/test-exhaustive":
+        return bool(body["system_analysis"].get("ai_powered"))
+    if path == "/test-gpt4":
+        return "✅" in body["status"]
+    return all(test.get("ai_powered", True) and "PASS" in test["status"] for test in body["tests"].values())
+
+async def client(http, latencies, failures):
+    for method, path in ROUTES:
+        start = time.perf_counter()
+        response = await http.request(method, path)
+        latencies[path].append(time.perf_counter() - start)
+        if response.status_code != 200 or not gpt_powered(path, response.json()):
+            failures.append((path, response.text[:300]))
+
+async def run(main, transport, clients):
+    main.OPENAI_TRANSPORT = transport
+    latencies = {path: [] for _, path in ROUTES}
+    failures = []
+    asgi = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(transport=asgi, base_url="http://bench", timeout=120) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, latencies, failures) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        cassette = main.openai_cassette.stats()
+    return latencies, failures, elapsed, cassette
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20, help="clientes concurrentes en replay")
+    parser.add_argument("--latency", default="lognormal:0.8,0.4", help="OPENAI_REPLAY_LATENCY del replay")
+    args = parser.parse_args()
+
+    mock, port = start_mock(0.2)
+    cassettes = tempfile.mkdtemp(prefix="openai-cassettes-")
+    os.environ.update(OPENAI_API_KEY_SECRET="sk-mock", OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1",
+                      OPENAI_CASSETTE_DIR=cassettes, OPENAI_REPLAY_LATENCY=args.latency, OPENAI_REPLAY_SEED="24")
+    import main
+    main.print = lambda *a, **k: None
+    for _, path in ROUTES:
+        main.RATE_LIMIT_POLICIES[path] = (10**9, 1)
+    # Sin caché de análisis: cada request debe pasar por el transporte de OpenAI
+    main.analysis_cache.get = main.analysis_cache.put = no_cache
+
+    _, failures, _, cassette = asyncio.run(run(main, "record", 1))
+    if failures:
+        raise SystemExit(f"❌ La grabación falló: {failures[0]}")
+    print(f"🎞️ Grabadas {cassette['entries']} respuestas en {cassettes} ({mock.state.requests} consultas al OpenAI simulado)")
+
+    network_before = mock.state.requests
+    latencies, failures, elapsed, cassette = asyncio.run(run(main, "replay", args.clients))
+    print(f"📊 Replay sin red: {args.clients} clientes x {len(ROUTES)} rutas, latencia {args.latency}")
+    print(f"  {'ruta':<24} {'p50 s':>7} {'p95 s':>7} {'máx s':>7}")
+    for path, values in latencies.items():
+        p95 = statistics.quantiles(values, n=100, method="inclusive")[94] if len(values) > 1 else values[0]
+        print(f"  {path:<24} {statistics.median(values):7.2f} {p95:7.2f} {max(values):7.2f}")
+    print(f"  total {elapsed:.2f} s, {cassette['replayed']} respuestas reproducidas, {cassette['misses']} sin grabación")
+
+    if mock.state.requests != network_before:
+        raise SystemExit(f"❌ El replay salió a la red ({mock.state.requests - network_before} consultas)")
+    if failures or cassette["misses"]:
+        raise SystemExit(f"❌ Respuestas sin GPT-4 en replay: {failures[:1]} (sin grabación: {cassette['misses']})")
+    print("✅ Replay reproducible: todas las respuestas de GPT-4 desde las grabaciones, sin red")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Prueba de carga del chat: mensajes por segundo con POST /chat-guia y /chat (antes)
+vs WebSocket /ws/chat-guia y /ws/chat (después).
+
+Levanta uvicorn en un subproceso (sin el rate limiting de esas rutas) y simula
+clientes concurrentes que envían un mensaje, esperan la respuesta y envían el
+siguiente, como lo hace el navegador. Por HTTP cada cliente reutiliza su conexión
+(keep-alive), así que la diferencia es el costo por request de HTTP, CORS y los
+middlewares, no el handshake TCP.
+
+Uso:
+    python benchmarks/bench_chat_transport.py [--clients 1 10 50] [--messages 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+SERVER = """
+import sys, uvicorn
+sys.path.insert(0, {root!r})
+import main
+main.print = lambda *a, **k: None
+for path in ("/chat", "/chat-guia", "/ws/"):
+    main.RATE_LIMIT_POLICIES[path] = (10**9, 1)
+main.RATE_LIMIT_PREFIX_POLICIES[:] = [p for p in main.RATE_LIMIT_POLICIES if p.endswith("/")]
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning", ws="websockets")
+"""
+
+GUIA_MESSAGES = ["hola", "cuales son los requisitos?", "cuanto tiempo demora?", "gracias"]
+CHAT_MESSAGES = ["María José Vargas", "1-0234-0567", "8845-1234", "San José, Barrio Escalante, 200 m norte"]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port):
+    process = subprocess.Popen([sys.executable, "-c", SERVER.format(root=ROOT, port=port)])
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("❌ El servidor no arrancó")
+
+def payloads(kind, client, count):
+    """Mensajes de un cliente; en /chat cada 4 mensajes empieza una conversación nueva"""
+    for i in range(count):
+        if kind == "guia":
+            yield {"message": GUIA_MESSAGES[i % 4]}
+        else:
+            yield {"message": CHAT_MESSAGES[i % 4], "conversation_id": f"c{client}-{i // 4}"}
+
+async def http_client(base, kind, client, count):
+    path = "/chat-guia" if kind == "guia" else "/chat"
+    async with httpx.AsyncClient(base_url=base) as http:
+        for payload in payloads(kind, client, count):
+            response = await http.post(path, json=payload)
+            response.raise_for_status()
+
+async def ws_client(base, kind, client, count):
+    path = "/ws/chat-guia" if kind == "guia" else "/ws/chat"
+    async with websockets.connect(base.replace("http", "ws") + path) as ws:
+        for i, payload in enumerate(payloads(kind, client, count)):
+            await ws.send(json.dumps({**payload, "id": i}))
+            response = json.loads(await ws.recv())
+            if "error" in response:
+                raise SystemExit(f"❌ {response}")
+
+async def run(client_func, base, kind, clients, messages):
+    start = time.perf_counter()
+    await asyncio.gather(*(client_func(base, kind, c, messages) for c in range(clients)))
+    return clients * messages / (time.perf_counter() - start)
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--messages", type=int, default=200, help="mensajes por cliente")
+    args = parser.parse_args()
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = start_server(port)
+    try:
+        # Calentamiento: importaciones perezosas y primeras conexiones
+        asyncio.run(run(http_client, base, "guia", 2, 20))
+        asyncio.run(run(ws_client, base, "guia", 2, 20))
+
+        print(f"📊 mensajes/s ({args.messages} mensajes por cliente)")
+        print(f"  {'chat':<6} {'clientes':>8} {'POST':>10} {'WebSocket':>10} {'x':>7}")
+        for kind in ("guia", "chat"):
+            for clients in args.clients:
+                post = asyncio.run(run(http_client, base, kind, clients, args.messages))
+                ws = asyncio.run(run(ws_client, base, kind, clients, args.messages))
+                print(f"  {kind:<6} {clients:>8} {post:>10,.0f} {ws:>10,.0f} {ws / post:>7.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Análisis de seguridad con OpenAI caído: sin circuit breaker (antes) vs con plazo
+por llamada y circuit breaker (después).
+
+Levanta el servidor OpenAI simulado (mock_openai.py) en un hilo con una
+latencia mayor al plazo por llamada y consulta /test-security-analyzer en serie.
+Sin breaker cada consulta espera el plazo completo antes del fallback simulado; con
+breaker, tras OPENAI_CIRCUIT_FAILURES fallas las consultas responden de inmediato.
+Luego el OpenAI simulado se recupera y se verifica que la sonda half-open cierre el
+circuito y vuelvan los análisis reales.
+
+Uso:
+    python benchmarks/bench_circuit_breaker.py [--requests 20] [--deadline 0.5]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from mock_openai import create_mock_openai_app  # noqa: E402
+
+def start_mock(latency):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    mock = create_mock_openai_app(latency)
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return mock, port
+
+async def run(main, count):
+    """Latencias (ms) y método de análisis de `count` consultas en serie"""
+    latencies, methods = [], []
+    transport = httpx.ASGITransport(app=main.app)
+    # El lifespan de la app crea el cliente OpenAI (ASGITransport no lo ejecuta)
+    async with main.lifespan(main.app), httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for _ in range(count):
+            start = time.perf_counter()
+            response = await http.get("/test-security-analyzer")
+            latencies.append((time.perf_counter() - start) * 1000)
+            methods.append(response.json()["analysis_method"])
+    return latencies, methods
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--deadline", type=float, default=0.5, help="plazo por llamada (s)")
+    parser.add_argument("--failures", type=int, default=3, help="fallas seguidas que abren el circuito")
+    parser.add_argument("--reset", type=float, default=1.0, help="segundos hasta la sonda half-open")
+    args = parser.parse_args()
+
+    mock, port = start_mock(latency=args.deadline * 4)
+    os.environ.update(OPENAI_API_KEY_SECRET="sk-mock", OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1",
+                      OPENAI_CALL_DEADLINE=str(args.deadline), OPENAI_MAX_RETRIES="0")
+    import main
+    main.print = lambda *a, **k: None
+    main.RATE_LIMIT_POLICIES["/test-security-analyzer"] = (10**9, 1)
+
+    print(f"📊 /test-security-analyzer con OpenAI simulado de {mock.state.latency:g} s "
+          f"(plazo {args.deadline:g} s, {args.requests} consultas)")
+    print(f"  {'modo':<26} {'p50 ms':>8} {'máx ms':>8} {'total s':>8} {'OpenAI':>7}")
+    for label, failures in (("antes (sin breaker)", 10**9), ("ahora (circuit breaker)", args.failures)):
+        main.openai_breaker = main.CircuitBreaker(failures, args.reset)
+        mock.state.requests = 0
+        latencies, _ = asyncio.run(run(main, args.requests))
+        print(f"  {label:<26} {statistics.median(latencies):8.1f} {max(latencies):8.1f} "
+              f"{sum(latencies) / 1000:8.2f} {mock.state.requests:>7}")
+
+    mock.state.latency = 0
+    time.sleep(args.reset)
+    _, methods = asyncio.run(run(main, 3))
+    if main.openai_breaker.state != "closed" or methods[0] != "gpt-4":
+        raise SystemExit(f"❌ La sonda half-open no cerró el circuito ({main.openai_breaker.stats()})")
+    print("✅ OpenAI recuperado: la sonda half-open cerró el circuito y volvieron los análisis GPT-4")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Microbenchmark de clean_html: html.escape + re.sub + strip en cada llamada (antes) vs
+camino rápido para texto sin nada que escapar y patrones precompilados (después).
+
+Antes de medir compara ambas funciones sobre entradas aleatorias (fuzz diferencial):
+la salida debe ser idéntica carácter a carácter.
+
+Uso:
+    python benchmarks/bench_clean_html.py [--fuzz 200000]
+"""
+import argparse
+import html
+import os
+import random
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+def legacy_clean_html(text):
+    """Función simple para limpiar HTML básico"""
+    if not text:
+        return ""
+    # Escapar caracteres HTML básicos
+    text = html.escape(str(text))
+    # Remover caracteres de control
+    text = re.sub(r'[\x00-\x1F\x7F]', '', text)
+    return text.strip()
+
+# Caracteres que se escapan o eliminan, espacios Unicode que afectan a strip,
+# entidades ya escapadas y texto normal con y sin acentos
+FUZZ_PIECES = [
+    "&", "<", ">", '"', "'", "\x00", "\t", "\n", "\r", "\x1b", "\x1f", "\x7f", "\x80", "\x85", "\xa0",
+    " ", "　", " ", "  ", "&amp;", "&lt;", "&#x27;", "<script>", "a", "Z", "ñ", "é", "😀",
+    "hola", "Barrio Escalante", ";", "--", "=",
+]
+OTHER_INPUTS = [None, "", 0, 5, 3.5, True, False, [], ["<"], {"a": "<"}, b"<x>", "   ", "\n\t"]
+
+def differential_fuzz(iterations: int):
+    for value in OTHER_INPUTS:
+        if main.clean_html(value) != legacy_clean_html(value):
+            raise SystemExit(f"❌ Diferencia para {value!r}")
+
+    rng = random.Random(99)
+    for _ in range(iterations):
+        # Longitudes variadas: desde un solo carácter hasta textos con mucho marcado
+        text = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.choice((1, 4, 12, 40))))
+        expected = legacy_clean_html(text)
+        actual = main.clean_html(text)
+        if actual != expected:
+            raise SystemExit(f"❌ Diferencia para {text!r}: antes={expected!r}, ahora={actual!r}")
+    print(f"✅ Fuzz diferencial: {iterations + len(OTHER_INPUTS):,} entradas con salida idéntica")
+
+CASES = {
+    "nombre": "María José Rodríguez Vargas",
+    "dirección": "San José, Barrio Escalante, 200 m norte de la iglesia",
+    "chat (500)": ("Hola, ¿cuáles son los requisitos para la tarjeta de crédito? " * 9)[:500],
+    "dirección con comilla": "Calle O'Neil, casa 5, 200 m norte",
+    "chat con saltos": "Hola\nquisiera saber\nel límite de crédito\n",
+    "marcado denso (500)": ("<b>it's</b> & \"x\" " * 30)[:500],
+    "'<' x 100.000": "<" * 100_000,
+}
+
+def benchmark():
+    print(f"\n📊 ns por llamada (mejor de 5)")
+    print(f"  {'entrada':<24} {'antes':>12} {'ahora':>12} {'x':>7}")
+    for label, text in CASES.items():
+        number = 20 if len(text) > 10_000 else 20_000
+        before, after = (
+            min(timeit.repeat(lambda: func(text), number=number, repeat=5)) / number * 1e9
+            for func in (legacy_clean_html, main.clean_html)
+        )
+        print(f"  {label:<24} {before:12,.0f} {after:12,.0f} {before / after:7.2f}")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=200_000)
+    args = parser.parse_args()
+    differential_fuzz(args.fuzz)
+    benchmark()
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Benchmark de validación de UserData: registro a registro (validadores de pydantic)
+vs validación columnar con NumPy.
+
+Antes de medir compara ambos caminos sobre registros aleatorios (fuzz diferencial):
+máscaras, códigos de error y valores normalizados por campo, y también el resultado
+completo que devuelve /validate-data/bulk para cada registro.
+
+Uso:
+    python benchmarks/bench_columnar_validation.py [--fuzz 50000] [--rows 100000] [--batch 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+# Fragmentos por campo: valores reales, separadores, caracteres fuera de latin-1,
+# de control, NUL, comillas y disparadores del inspector de direcciones
+FUZZ_PIECES = {
+    "nombre": ["Ana", "María", "José", "Rodríguez", "Vargas", "O'Neil", "a", "B", " ", "  ", "\t", "\n",
+               "\xa0", "Ñ", "ü", "Zoë", "ſ", "İ", "&", "<b>", "\x00", "1", "-", "de", "x" * 60],
+    "cedula": ["1", "0234", "0567", "-", " ", "12345678", "9", "٣", "a", "'", ";", "\x00", "１", "²", "\n"],
+    "telefono": ["8845", "1234", "2", "6", "7", "8", "5", "-", " ", "\t", "٨", "０", "x", "+506", "\x00"],
+    "direccion": ["San José", ",", " ", "Barrio", "Escalante", "200 m norte", "'", '"', ";", "--", "<", ">",
+                  "script", "=", ":", "javascript", "onclick", "\n", "&", "\xa0", "ñ", "ſ", "\x00", "x" * 300],
+}
+
+# Fragmentos válidos por sí solos: la mitad de los valores se arma solo con ellos para
+# cubrir los bordes de las reglas (número de palabras, cantidad de dígitos, longitud)
+CLEAN_PIECES = {
+    "nombre": ["Ana", "María", "José", "Rodríguez", "Vargas", "de", "a", "B", " ", " ", "  "],
+    "cedula": ["1", "0234", "0567", "-", " ", "9", "12345678"],
+    "telefono": ["8845", "1234", "2", "6", "7", "8", "5", "-", " "],
+    "direccion": ["San José", ",", " ", "Barrio", "Escalante", "200 m norte", "ñ", "x"],
+}
+
+VALID_RECORDS = [
+    {"nombre": "María José Rodríguez Vargas", "cedula": "1-0234-0567", "telefono": "8845-1234",
+     "direccion": "San José, Barrio Escalante, 200 m norte de la iglesia"},
+    {"nombre": "Carlos Mora", "cedula": "204560789", "telefono": "6012 3456",
+     "direccion": "Heredia, San Pablo, frente al parque"},
+]
+
+def random_record(rng):
+    record = {}
+    for field, pieces in FUZZ_PIECES.items():
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        if roll < 0.15:
+            record[field] = None if roll < 0.125 else ""
+            continue
+        if rng.random() < 0.5:
+            pieces = CLEAN_PIECES[field]
+        record[field] = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 10)))
+    return record
+
+def scalar_fields(record):
+    """Por campo: (código de error, valor) con los validadores de UserData"""
+    try:
+        user = main.UserData(**record)
+    except main.ValidationError as e:
+        failed = {err["loc"][0]: err["msg"].removeprefix("Value error, ") for err in e.errors()}
+    else:
+        failed = {}
+        values = user.model_dump()
+    outcome = {}
+    for field in main.USER_DATA_FIELDS:
+        if field in failed:
+            outcome[field] = (main.USER_DATA_ERROR_MESSAGES[field].index(failed[field]) + 1, None)
+        elif not failed:
+            outcome[field] = (0, values[field])
+        else:
+            # Otro campo falló: el valor de este solo se compara si es válido por sí solo
+            outcome[field] = (0, main.UserData(**{field: record.get(field)}).model_dump()[field])
+    return outcome
+
+def differential_fuzz(iterations: int, batch: int):
+    rng = random.Random(2024)
+    records = VALID_RECORDS + [random_record(rng) for _ in range(iterations)]
+    main.print = lambda *a, **k: None  # las direcciones rechazadas imprimen una línea cada una
+
+    for start in range(0, len(records), batch):
+        chunk = records[start:start + batch]
+        columns = main.validate_user_columns(
+            {field: [record.get(field) for record in chunk] for field in main.USER_DATA_FIELDS}
+        )
+        for position, record in enumerate(chunk):
+            for field, (code, value) in scalar_fields(record).items():
+                column = columns[field]
+                actual = (int(column.errors[position]), column.values[position] if code == 0 else None)
+                if actual != (code, value) or bool(column.valid[position]) != (code == 0):
+                    raise SystemExit(f"❌ {field}: {record.get(field)!r} escalar={(code, value)} columnar={actual}")
+
+        items = [(index, record) for index, record in enumerate(chunk)]
+        expected = [main.bulk_result(index, main.USER_DATA_ADAPTER.validate_python, record) for index, record in items]
+        if main.validate_bulk_batch(items) != expected:
+            raise SystemExit(f"❌ Resultados de /validate-data/bulk distintos en el lote que empieza en {start}")
+
+    print(f"✅ Fuzz diferencial: {len(records):,} registros idénticos por campo y por resultado")
+
+def throughput(label, func, rows, baseline=None):
+    start = time.perf_counter()
+    func()
+    rate = rows / (time.perf_counter() - start)
+    speedup = f"{rate / baseline:7.1f}x" if baseline else ""
+    print(f"  {label:<40} {rate:12,.0f} registros/s {speedup}")
+    return rate
+
+def benchmark(rows: int, batch: int):
+    records = [dict(VALID_RECORDS[i % len(VALID_RECORDS)]) for i in range(rows)]
+    # Un 10% de registros con algún campo inválido
+    rng = random.Random(7)
+    for record in rng.sample(records, rows // 10):
+        field = rng.choice(main.USER_DATA_FIELDS)
+        record[field] = {"nombre": "X", "cedula": "12", "telefono": "1234", "direccion": "corta"}[field]
+
+    items = [(index, record) for index, record in enumerate(records)]
+    batches = [items[start:start + batch] for start in range(0, rows, batch)]
+
+    print(f"\n📊 {rows:,} registros, lotes de {batch}")
+
+    def scalar():
+        for line_number, record in items:
+            main.bulk_result(line_number, main.USER_DATA_ADAPTER.validate_python, record)
+
+    def columns_only():
+        for chunk in batches:
+            main.validate_user_columns({field: [record.get(field) for _, record in chunk]
+                                        for field in main.USER_DATA_FIELDS})
+
+    def bulk_batches():
+        for chunk in batches:
+            main.validate_bulk_batch(chunk)
+
+    baseline = throughput("escalar (bulk_result por registro)", scalar, rows)
+    throughput("validate_user_columns", columns_only, rows, baseline)
+    throughput("validate_bulk_batch (resultados completos)", bulk_batches, rows, baseline)
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=50_000)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=main.BULK_FLUSH_RECORDS)
+    args = parser.parse_args()
+    if main.np is None:
+        raise SystemExit("❌ NumPy no está instalado: la validación columnar no está disponible")
+    differential_fuzz(args.fuzz, args.batch)
+    benchmark(args.rows, args.batch)
+
+if __name__ == "__main__":
+    main_bench()
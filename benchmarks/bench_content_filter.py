@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Benchmark del filtro de contenido: 14 re.search por mensaje (antes) vs ContentInspector.
+
+Antes de medir compara ambos motores sobre entradas aleatorias (fuzz diferencial)
+para asegurar que bloquean exactamente los mismos textos. Luego mide mensajes
+normales y entradas patológicas a 500 caracteres (el máximo de un mensaje) y a
+longitudes mayores para mostrar el crecimiento lineal frente al cuadrático.
+
+Uso:
+    python benchmarks/bench_content_filter.py [--fuzz 20000] [--sizes 500 2000 8000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+LEGACY_CHAT_PATTERNS = [
+    r'<script.*?>.*?</script>',
+    r'javascript:',
+    r'on\w+\s*=',
+    r'<iframe.*?>',
+    r'eval\s*\(',
+    r'document\.',
+    r'window\.',
+    r'--.*?;',
+    r'\bunion\b.*?\bselect\b',
+    r'\bselect\b.*?\bfrom\b',
+    r'\binsert\b.*?\binto\b',
+    r'\bupdate\b.*?\bset\b',
+    r'\bdelete\b.*?\bfrom\b',
+    r'\bdrop\b.*?\btable\b'
+]
+
+LEGACY_DIRECCION_PATTERNS = [
+    r'<script.*?>',
+    r'javascript:',
+    r'on\w+\s*=',
+    r'<.*?>',
+    r'[;\'"\\].*?--'
+]
+
+def legacy_inspect(patterns, text):
+    for pattern in patterns:
+        if re.search(pattern, text, re.IGNORECASE):
+            return True
+    return False
+
+# Fragmentos que combinan los átomos de todas las reglas, en mayúsculas y minúsculas
+FUZZ_PIECES = [
+    "<", ">", "</script>", "<script", "<SCRIPT", "<iframe", "javascript:", "JavaScript:",
+    "on", "ON", "click", "x", "=", " ", "  ", "\n", "\t", "eval", "(", "document.", "window.",
+    "--", "-", ";", "'", '"', "\\", "union", "select", "SELECT", "from", "insert", "into",
+    "update", "set", "delete", "drop", "table", "a", "é", "_", "1", ".", ":", "&lt;", "&#x27;"
+]
+
+def differential_fuzz(iterations: int):
+    rng = random.Random(1234)
+    for patterns, inspector, label in (
+        (LEGACY_CHAT_PATTERNS, main.CHAT_CONTENT_INSPECTOR, "chat"),
+        (LEGACY_DIRECCION_PATTERNS, main.DIRECCION_CONTENT_INSPECTOR, "dirección"),
+    ):
+        blocked = 0
+        for _ in range(iterations):
+            text = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, 24)))
+            expected = legacy_inspect(patterns, text)
+            actual = inspector.inspect(text) is not None
+            if expected != actual:
+                raise SystemExit(f"❌ Diferencia en reglas de {label}: {text!r} (antes={expected}, ahora={actual})")
+            blocked += expected
+        print(f"✅ Fuzz diferencial {label}: {iterations:,} textos idénticos ({blocked:,} bloqueados)")
+
+def pathological_inputs(size: int):
+    def repeat(piece):
+        return (piece * (size // len(piece) + 1))[:size]
+    return {
+        "texto normal": repeat("quiero solicitar una tarjeta de credito, cual es el proceso? "),
+        "'<' repetido": repeat("<"),
+        "'<script' repetido": repeat("<script"),
+        "'select ' repetido": repeat("select "),
+        "'union ' repetido": repeat("union "),
+        "'on' repetido": repeat("on"),
+        "'-- ' repetido": repeat("-- "),
+        "'eval ' repetido": repeat("eval "),
+        "comillas + '-'": repeat("'-"),
+    }
+
+def timeit(func, text, min_time=0.2):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func(text)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs * 1e6
+
+def benchmark(sizes):
+    engines = (
+        ("chat", LEGACY_CHAT_PATTERNS, main.CHAT_CONTENT_INSPECTOR),
+        ("dirección", LEGACY_DIRECCION_PATTERNS, main.DIRECCION_CONTENT_INSPECTOR),
+    )
+    for size in sizes:
+        print(f"\n📊 Entradas de {size} caracteres (µs por texto)")
+        print(f"  {'entrada':<22} {'reglas':<10} {'antes':>10} {'ahora':>10} {'x':>7}")
+        for label, text in pathological_inputs(size).items():
+            for rules, patterns, inspector in engines:
+                before = timeit(lambda t: legacy_inspect(patterns, t), text)
+                after = timeit(inspector.inspect, text)
+                print(f"  {label:<22} {rules:<10} {before:10.1f} {after:10.1f} {before / after:7.1f}")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=20_000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000])
+    args = parser.parse_args()
+    differential_fuzz(args.fuzz)
+    benchmark(args.sizes)
+
+if __name__ == "__main__":
+    main_bench()
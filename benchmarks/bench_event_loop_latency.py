@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Latencia de /health mientras hay análisis exhaustivos en curso: cliente OpenAI
+síncrono dentro de rutas async (antes) vs AsyncOpenAI con cupo por ruta (después).
+
+Levanta el servidor OpenAI simulado (mock_openai.py) y la app en
+subprocesos, mide /health en reposo y luego mientras --analyses consultas a
+/test-exhaustive esperan al modelo. Con el cliente asíncrono la latencia no debe
+crecer; el modo "antes" reemplaza openai_chat por la llamada síncrona original.
+Termina con error si la latencia con carga del modo actual no se mantiene plana, o si
+algún modo respondió sin esperar al OpenAI simulado (caché o análisis de respaldo).
+
+Uso:
+    python benchmarks/bench_event_loop_latency.py [--analyses 10] [--latency 3]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+SERVER = """
+import sys, uvicorn
+sys.path.insert(0, {root!r})
+import main
+main.print = lambda *a, **k: None
+for path in ("/test-exhaustive", "/health"):
+    main.RATE_LIMIT_POLICIES[path] = (10**9, 1)
+if {legacy!r}:
+    # Como antes: cliente síncrono llamado desde la ruta async
+    from openai import OpenAI
+    sync_client = OpenAI(api_key=main.OPENAI_API_KEY_SECRET, base_url=main.OPENAI_BASE_URL)
+    async def blocking_openai_chat(route, choice, **kwargs):
+        return sync_client.chat.completions.create(model=choice.model, max_tokens=choice.max_tokens, **kwargs)
+    main.openai_chat = blocking_openai_chat
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+# La latencia con carga puede superar la de reposo en este margen (ms) y seguir siendo "plana"
+FLAT_MARGIN_MS = 25
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port, process):
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit(f"❌ El proceso en el puerto {port} no arrancó")
+
+def start_app(legacy, mock_port, analyses):
+    port = free_port()
+    # Caché de análisis propia de cada proceso: si no, el segundo modo respondería desde la del primero
+    env = dict(os.environ, OPENAI_API_KEY_SECRET="sk-mock", OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+               OPENAI_ROUTE_CONCURRENCY=str(analyses),
+               ANALYSIS_CACHE_PATH=os.path.join(tempfile.mkdtemp(), "analysis-cache.sqlite3"))
+    code = SERVER.format(root=ROOT, port=port, legacy=legacy)
+    process = subprocess.Popen([sys.executable, "-c", code], env=env, stdout=subprocess.DEVNULL)
+    wait_for_port(port, process)
+    return process, f"http://127.0.0.1:{port}"
+
+def sample_health(base, stop, samples, interval=0.02):
+    """Una consulta cada `interval` segundos. Si una respuesta se demora, cada consulta que
+    tocaba enviar mientras tanto cuenta como una muestra con la espera que habría tenido,
+    así un event loop bloqueado pesa en los percentiles según cuánto duró el bloqueo"""
+    with httpx.Client(base_url=base, timeout=60) as http:
+        scheduled = time.perf_counter()
+        while not stop.is_set():
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            http.get("/health").raise_for_status()
+            finished = time.perf_counter()
+            while scheduled <= finished:
+                samples.append((finished - scheduled) * 1000)
+                scheduled += interval
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+def mock_requests(mock_base):
+    return httpx.get(mock_base + "/mock/stats").json()["requests"]
+
+def measure(base, analyses, idle_seconds):
+    stop = threading.Event()
+    idle = []
+    sampler = threading.Thread(target=sample_health, args=(base, stop, idle))
+    sampler.start()
+    time.sleep(idle_seconds)
+    stop.set()
+    sampler.join()
+
+    stop = threading.Event()
+    loaded = []
+    sampler = threading.Thread(target=sample_health, args=(base, stop, loaded))
+    results = []
+
+    def analysis():
+        with httpx.Client(base_url=base, timeout=120) as http:
+            response = http.post("/test-exhaustive")
+            results.append(response.json()["system_analysis"].get("ai_powered"))
+
+    workers = [threading.Thread(target=analysis) for _ in range(analyses)]
+    start = time.perf_counter()
+    sampler.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    return idle, loaded, elapsed, results
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--analyses", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=3.0, help="segundos que tarda el OpenAI simulado")
+    parser.add_argument("--idle-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    mock_base = f"http://127.0.0.1:{mock_port}"
+    mock = subprocess.Popen([sys.executable, os.path.join(ROOT, "mock_openai.py"),
+                             "--port", str(mock_port), "--latency", str(args.latency)])
+    wait_for_port(mock_port, mock)
+
+    print(f"📊 /health (ms) con {args.analyses} análisis exhaustivos en curso, OpenAI simulado de {args.latency:g} s")
+    print(f"  {'modo':<34} {'p50':>7} {'p95':>7} {'máx':>8} {'muestras':>9} {'análisis':>9}")
+    failed = False
+    try:
+        for label, legacy in (("antes (cliente síncrono)", True), ("ahora (AsyncOpenAI)", False)):
+            app, base = start_app(legacy, mock_port, args.analyses)
+            upstream = mock_requests(mock_base)
+            try:
+                idle, loaded, elapsed, results = measure(base, args.analyses, args.idle_seconds)
+            finally:
+                app.terminate()
+                app.wait()
+            upstream = mock_requests(mock_base) - upstream
+            # ai_powered solo no alcanza: una respuesta desde la caché también lo trae
+            if not all(results) or upstream == 0 or elapsed < args.latency:
+                raise SystemExit(f"❌ {label}: los análisis no esperaron al OpenAI simulado "
+                                 f"({upstream} consultas recibidas, {elapsed:.1f} s)")
+            for phase, values in (("reposo", idle), ("con carga", loaded)):
+                print(f"  {label + ' ' + phase:<34} {percentile(values, 50):7.1f} {percentile(values, 95):7.1f} "
+                      f"{max(values):8.1f} {len(values):>9} {elapsed if phase == 'con carga' else 0:>8.1f}s")
+            if not legacy:
+                failed = percentile(loaded, 95) > percentile(idle, 95) + FLAT_MARGIN_MS
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if failed:
+        raise SystemExit(f"❌ La latencia p95 de /health creció más de {FLAT_MARGIN_MS} ms con análisis en curso")
+    print(f"✅ Latencia de /health plana (p95 con carga dentro de {FLAT_MARGIN_MS} ms de la de reposo)")
+
+if __name__ == "__main__":
+    main_bench()
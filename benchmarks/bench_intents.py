@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Benchmark de get_ai_response: búsqueda anidada de palabras clave (antes) vs
+IntentMatcher compilado (después).
+
+Verifica primero que ambas versiones eligen la misma respuesta para un corpus de
+mensajes del chat de guía y para mensajes aleatorios armados con fragmentos de las
+palabras clave (solapes, prefijos, acentos). La versión nueva quita los acentos, así
+que la anterior se evalúa sobre el mensaje ya sin acentos.
+
+Uso:
+    python benchmarks/bench_intents.py [--fuzz 100000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+def legacy_get_ai_response(message: str):
+    """Simula respuestas de IA para el chat de guía"""
+    knowledge_base = {name: response for name, _, response in main.GUIA_INTENTS[:7]}
+
+    # Buscar palabras clave en el mensaje
+    for key, response in knowledge_base.items():
+        if (key in message or
+            (key == 'formulario' and any(word in message for word in ['llenar', 'completar', 'formato'])) or
+            (key == 'requisitos' and 'requisito' in message) or
+            (key == 'documentos' and 'documento' in message) or
+            (key == 'validacion' and any(word in message for word in ['valida', 'proceso', 'verifica'])) or
+            (key == 'tiempo' and any(word in message for word in ['tiempo', 'demora', 'cuanto', 'cuando'])) or
+            (key == 'credito' and any(word in message for word in ['limite', 'monto', 'cantidad'])) or
+            (key == 'ayuda' and any(word in message for word in ['contacto', 'telefono', 'ayuda']))):
+            return response
+
+    responses = main.GUIA_RESPONSES
+    # Respuestas contextuales
+    if any(word in message for word in ['hola', 'buenos', 'buenas']):
+        return responses["saludo"]
+    if 'gracias' in message:
+        return responses["gracias"]
+    if any(word in message for word in ['problema', 'error', 'falla']):
+        return responses["problema"]
+    if any(word in message for word in ['nombre', 'completo']):
+        return responses["nombre"]
+    if any(word in message for word in ['cedula', 'identificacion']):
+        return responses["cedula"]
+    if any(word in message for word in ['telefono', 'numero']):
+        return responses["telefono"]
+    if any(word in message for word in ['direccion', 'entrega']):
+        return responses["direccion"]
+
+    # Respuesta por defecto
+    return main.GUIA_DEFAULT_RESPONSE
+
+# Mensajes típicos del chat de guía (como llegan al endpoint: sanitizados y en minúsculas)
+CORPUS = [
+    "hola", "buenas tardes", "buenos días, necesito ayuda", "gracias!", "muchas gracias por la info",
+    "¿cómo lleno el formulario?", "no sé cómo completar el formulario", "qué formato lleva la cédula?",
+    "cuáles son los requisitos para la tarjeta?", "que requisito piden para solicitar",
+    "qué documentos necesito llevar?", "necesito algún documento de ingresos?",
+    "cómo es el proceso de validación?", "cuánto tarda la verificación en ccss?", "¿cuánto tiempo demora?",
+    "cuándo me entregan la tarjeta", "cuál es el límite de crédito?", "qué monto me pueden aprobar",
+    "cantidad mínima de ingresos", "tienen un teléfono de contacto?", "número de atención al cliente",
+    "mi cédula tiene 9 dígitos, está bien?", "la identificación es de residente, sirve?",
+    "la dirección debe ser exacta?", "dónde hacen la entrega", "puse mal mi nombre completo",
+    "me sale un error al enviar", "la página falla cuando envío", "tengo un problema con el teléfono",
+    "quiero una tarjeta", "ok", "no entiendo", "¿aceptan pasaporte?", "vivo en cartago, aplica?",
+    "mi nombre tiene tres apellidos", "puedo pedir la tarjeta si soy independiente?",
+    "hola, quiero saber los requisitos y cuánto tiempo tarda el proceso de validación de mis documentos",
+    "buenas, me podrían ayudar con el número de teléfono que debo poner en el formulario? gracias",
+    "disculpe, escribí mal la dirección de entrega y ahora no sé cómo corregirla, qué hago?",
+    "¿el límite de crédito depende de mis ingresos o del historial? también quiero saber cuándo llega",
+]
+
+# Fragmentos de palabras clave para armar mensajes con solapes y prefijos
+FUZZ_PIECES = sorted({word for _, words, _ in main.GUIA_INTENTS for word in words}) + [
+    "vali", "dacion", "proce", "so", "cuan", "to", "do", "tele", "fono", "nume", "ro", "cé", "dula",
+    "dirección", "límite", "crédito", "identificación", "número", "teléfono", "á", "é", " ", "x", "?",
+]
+
+def legacy_on_folded(message):
+    return legacy_get_ai_response(message.lower().translate(main.ACCENT_FOLD_TABLE))
+
+def check_equivalence(iterations: int):
+    for message in CORPUS:
+        if main.get_ai_response(message) != legacy_on_folded(message):
+            raise SystemExit(f"❌ Respuesta distinta para {message!r}")
+
+    rng = random.Random(5)
+    for _ in range(iterations):
+        message = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(1, 6)))
+        if main.get_ai_response(message) != legacy_on_folded(message):
+            raise SystemExit(f"❌ Respuesta distinta para {message!r}")
+    print(f"✅ Mismas respuestas en {len(CORPUS)} mensajes del corpus y {iterations:,} aleatorios")
+
+def measure(func, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1e6
+
+def benchmark(repeat: int):
+    folded = [message.lower().translate(main.ACCENT_FOLD_TABLE) for message in CORPUS]
+    short = [message for message in folded if len(message) < 40]
+    long = [message for message in folded if len(message) >= 40]
+    default = ["ok", "no entiendo", "quiero una tarjeta", "vivo en cartago, aplica?"]
+
+    print(f"\n📊 µs por mensaje")
+    print(f"  {'mensajes':<28} {'antes':>8} {'ahora':>8} {'x':>7}")
+    for label, messages in (("corpus completo", folded), ("cortos (< 40)", short),
+                            ("largos (>= 40)", long), ("sin intención (por defecto)", default)):
+        before = measure(legacy_get_ai_response, messages, repeat)
+        after = measure(main.get_ai_response, messages, repeat)
+        print(f"  {label:<28} {before:8.2f} {after:8.2f} {before / after:7.2f}")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    check_equivalence(args.fuzz)
+    benchmark(args.repeat)
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Ruteo de modelos por presupuesto: todas las llamadas con gpt-4 (antes) vs modelo,
+max_tokens y timeout elegidos por ModelRouter según el presupuesto de cada llamada (después).
+
+Levanta el servidor OpenAI simulado (mock_openai.py) en un hilo con una
+latencia distinta por modelo y consulta /test-openai-quick, /test-gpt4 y
+/test-system-complete. Muestra la latencia de cada ruta, las llamadas por modelo y
+los histogramas de /metrics["model_latency"]. /test-system-complete no baja: corre
+la sonda en paralelo con los análisis, que siguen en gpt-4.
+
+Uso:
+    python benchmarks/bench_model_routing.py [--requests 10]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from mock_openai import create_mock_openai_app  # noqa: E402
+
+# Latencias simuladas (s) en la proporción de la tabla de modelos
+MODEL_LATENCY = {"gpt-4": 1.5, "gpt-4o": 0.6, "gpt-4o-mini": 0.15}
+ROUTES = ["/test-openai-quick", "/test-gpt4", "/test-system-complete"]
+
+def start_mock():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    mock = create_mock_openai_app(1.0, model_latency=MODEL_LATENCY)
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return port
+
+async def run(main, requests):
+    """Latencias por ruta y las métricas de ruteo al terminar"""
+    latencies = {route: [] for route in ROUTES}
+    asgi = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(transport=asgi, base_url="http://bench", timeout=120) as http:
+        for _ in range(requests):
+            for route in ROUTES:
+                start = time.perf_counter()
+                (await http.get(route)).raise_for_status()
+                latencies[route].append(time.perf_counter() - start)
+        metrics = (await http.get("/metrics")).json()
+    return latencies, metrics
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10, help="consultas por ruta")
+    args = parser.parse_args()
+
+    port = start_mock()
+    os.environ.update(OPENAI_API_KEY_SECRET="sk-mock", OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1",
+                      ANALYSIS_CACHE_PATH=os.path.join(tempfile.mkdtemp(), "analysis-cache.sqlite3"))
+    import main
+    main.print = lambda *a, **k: None
+    for route in ROUTES + ["/metrics"]:
+        main.RATE_LIMIT_POLICIES[route] = (10**9, 1)
+    table = main.DEFAULT_MODEL_TABLE
+
+    print(f"📊 {args.requests} consultas por ruta, OpenAI simulado: "
+          + ", ".join(f"{model} {latency:g} s" for model, latency in MODEL_LATENCY.items()))
+    print(f"  {'modo':<22} {'ruta':<22} {'p50 s':>7} {'máx s':>7}")
+    for label, router_table in (("antes (todo gpt-4)", table[:1]), ("ahora (por presupuesto)", table)):
+        main.model_router = main.ModelRouter(router_table)
+        main.model_latency = main.ModelLatency()
+        latencies, metrics = asyncio.run(run(main, args.requests))
+        for route, values in latencies.items():
+            print(f"  {label:<22} {route:<22} {statistics.median(values):7.2f} {max(values):7.2f}")
+        routed = metrics["model_routing"]["routed"]
+        print(f"  {'':<22} llamadas por modelo: {routed}")
+        for model, kinds in metrics["model_latency"].items():
+            completion = kinds.get("completion")
+            if completion:
+                print(f"  {'':<22} {model:<12} n={completion['count']:<4} p50≤{completion['p50']:g} s "
+                      f"p95≤{completion['p95']:g} s buckets={ {k: v for k, v in completion['buckets'].items() if v} }")
+
+    if "gpt-4o-mini" not in routed or routed.get("gpt-4", 0) == 0:
+        raise SystemExit(f"❌ Ruteo inesperado: {routed}")
+    print("✅ Las sondas usan el modelo económico y los análisis y /test-gpt4 siguen en gpt-4")
+
+if __name__ == "__main__":
+    main_bench()
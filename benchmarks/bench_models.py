@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Benchmark de validación por modelo: validadores estilo v1 (antes) vs field_validator,
+restricciones Annotated y TypeAdapters precompilados (después).
+
+Los modelos "antes" son copia de los de main.py previos al cambio. Antes de medir
+se comprueba que ambos aceptan y rechazan exactamente los mismos payloads.
+
+Uso:
+    python benchmarks/bench_models.py [--min-time 0.5]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import warnings
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from pydantic import BaseModel, ValidationError  # noqa: E402
+
+import main  # noqa: E402
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    from pydantic import validator
+
+    class LegacyChatMessage(BaseModel):
+        message: str
+        user_data: dict = {}
+        conversation_id: Optional[str] = None  # agregado después, con las sesiones del servidor
+
+        @validator('message')
+        def validate_message(cls, v):
+            return main.validate_chat_text(v)
+
+    class LegacyLocationData(BaseModel):
+        latitude: float
+        longitude: float
+        address_components: dict = {}
+
+        @validator('latitude')
+        def validate_latitude(cls, v):
+            if not -90 <= v <= 90:
+                raise ValueError('Latitud debe estar entre -90 y 90')
+            return v
+
+        @validator('longitude')
+        def validate_longitude(cls, v):
+            if not -180 <= v <= 180:
+                raise ValueError('Longitud debe estar entre -180 y 180')
+            return v
+
+    class LegacyUserData(BaseModel):
+        nombre: Optional[str] = None
+        cedula: Optional[str] = None
+        telefono: Optional[str] = None
+        direccion: Optional[str] = None
+
+        @validator('nombre', pre=True)
+        def validate_nombre(cls, v):
+            if not v:
+                return v
+            sanitized = main.clean_html(str(v).strip())
+            if not re.match(r'^[a-zA-ZáéíóúÁÉÍÓÚñÑ\s]{2,100}$', sanitized):
+                raise ValueError('Nombre contiene caracteres no válidos')
+            palabras = sanitized.split()
+            if not 2 <= len(palabras) <= 4:
+                raise ValueError('Nombre debe contener entre 2 y 4 palabras')
+            if not all(len(palabra) >= 2 for palabra in palabras):
+                raise ValueError('Cada palabra del nombre debe tener mínimo 2 caracteres')
+            return sanitized
+
+        @validator('cedula', pre=True)
+        def validate_cedula(cls, v):
+            if not v:
+                return v
+            sanitized = re.sub(r'[^\d-]', '', str(v))
+            digits_only = re.sub(r'[-\s]', '', sanitized)
+            if not digits_only.isdigit():
+                raise ValueError('Cédula debe contener solo números')
+            if not 9 <= len(digits_only) <= 10:
+                raise ValueError('Cédula debe tener entre 9 y 10 dígitos')
+            if re.search(r'[;\'"\\]', sanitized):
+                raise ValueError('Cédula contiene caracteres no válidos')
+            return digits_only
+
+        @validator('telefono', pre=True)
+        def validate_telefono(cls, v):
+            if not v:
+                return v
+            sanitized = re.sub(r'[^\d\s-]', '', str(v))
+            digits_only = re.sub(r'[\s-]', '', sanitized)
+            if not re.match(r'^[2678]\d{7}$', digits_only):
+                raise ValueError('Teléfono debe tener 8 dígitos y empezar con 2, 6, 7 u 8')
+            return digits_only
+
+        @validator('direccion', pre=True)
+        def validate_direccion(cls, v):
+            if not v:
+                return v
+            sanitized = main.clean_html(str(v).strip())
+            if len(sanitized) < 10:
+                raise ValueError('Dirección debe tener al menos 10 caracteres')
+            if main.DIRECCION_CONTENT_INSPECTOR.inspect(sanitized):
+                raise ValueError('Dirección contiene contenido no válido')
+            return sanitized
+
+USER_DATA = {
+    "nombre": "María José Rodríguez Vargas",
+    "cedula": "1-0234-0567",
+    "telefono": "8845-1234",
+    "direccion": "San José, Barrio Escalante, 200 m norte de la iglesia",
+}
+LOCATION_DATA = {"latitude": 9.9281, "longitude": -84.0907}
+CHAT_MESSAGE = {"message": "Hola, ¿cuáles son los requisitos para la tarjeta de crédito?"}
+
+# (nombre, modelo antes, modelo después, adapter, payload válido, payloads inválidos para la comparación)
+CASES = [
+    ("UserData", LegacyUserData, main.UserData, main.USER_DATA_ADAPTER, USER_DATA, [
+        {"nombre": "A"}, {"cedula": "12"}, {"telefono": "1234"}, {"direccion": "corta"},
+        {"direccion": "calle 5' -- x y más texto"}, {"nombre": 5}, {},
+    ]),
+    ("LocationData", LegacyLocationData, main.LocationData, main.LOCATION_DATA_ADAPTER, LOCATION_DATA, [
+        {"latitude": 90.5, "longitude": 0}, {"latitude": 0, "longitude": -181}, {"latitude": "x", "longitude": 0},
+        {"latitude": -90, "longitude": 180},
+    ]),
+    ("ChatMessage", LegacyChatMessage, main.ChatMessage, main.CHAT_MESSAGE_ADAPTER, CHAT_MESSAGE, [
+        {"message": "   "}, {"message": "x" * 600}, {"message": "select * from tarjetas"},
+    ]),
+]
+
+def accepts(model, payload):
+    try:
+        return model(**payload).model_dump()
+    except ValidationError:
+        return None
+
+def check_equivalence():
+    for name, legacy, current, _, valid, invalid in CASES:
+        for payload in [valid] + invalid:
+            if accepts(legacy, payload) != accepts(current, payload):
+                raise SystemExit(f"❌ {name}: resultados distintos para {payload!r}")
+    print("✅ Modelos antes/después aceptan y rechazan los mismos payloads")
+
+def throughput(func, min_time):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(100):
+            func()
+        runs += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return runs / elapsed
+
+def benchmark(min_time):
+    print(f"\n📊 Validaciones por segundo (payload válido)")
+    print(f"  {'modelo':<14} {'variante':<36} {'val/s':>12} {'x':>7}")
+    for name, legacy, current, adapter, valid, _ in CASES:
+        raw = json.dumps(valid)
+        variants = [
+            ("v1 @validator (antes)", lambda: legacy(**valid)),
+            ("field_validator Model(**data)", lambda: current(**valid)),
+            ("model_validate", lambda: current.model_validate(valid)),
+            ("TypeAdapter.validate_python", lambda: adapter.validate_python(valid)),
+            ("TypeAdapter.validate_json", lambda: adapter.validate_json(raw)),
+        ]
+        baseline = None
+        for label, func in variants:
+            rate = throughput(func, min_time)
+            baseline = baseline or rate
+            print(f"  {name:<14} {label:<36} {rate:12,.0f} {rate / baseline:7.2f}")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-time", type=float, default=0.5, help="segundos por medición")
+    args = parser.parse_args()
+    check_equivalence()
+    benchmark(args.min_time)
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Dimensionamiento del pool HTTP de OpenAI: latencia, conexiones abiertas, reutilización
+y uso del pool según la concurrencia de consultas.
+
+Levanta el servidor OpenAI simulado (mock_openai.py) en un hilo y, dentro
+del lifespan de la app, lanza rondas de consultas simultáneas por openai_chat. Cada
+fila muestra las métricas de /metrics["openai_http"] para esa ronda: con keep-alive
+las rondas siguientes reutilizan las conexiones y no abren nuevas mientras la
+concurrencia no supere OPENAI_POOL_MAX_KEEPALIVE. Al final verifica que un análisis
+por streaming libere su conexión.
+
+Uso:
+    python benchmarks/bench_openai_pool.py [--concurrency 1 4 16 32] [--rounds 5] [--max-connections 20]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from mock_openai import create_mock_openai_app  # noqa: E402
+
+async def no_cache(*args):
+    """Reemplazo de AnalysisCache.get/put: la caché nunca tiene la entrada"""
+    return None
+
+def start_mock(latency):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    mock = create_mock_openai_app(latency)
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return mock, port
+
+async def call(main):
+    start = time.perf_counter()
+    messages = [{"role": "user", "content": "ping"}]
+    await main.openai_chat("/bench", main.model_router.choose(main.PING_BUDGET, 10, messages), messages=messages)
+    return (time.perf_counter() - start) * 1000
+
+async def benchmark(main, levels, rounds):
+    async with main.lifespan(main.app):
+        pool = main.openai_http
+        print(f"  {'concurrencia':>12} {'p50 ms':>8} {'máx ms':>8} {'conexiones nuevas':>18} "
+              f"{'reutilización':>14} {'uso pico':>9} {'abiertas':>9}")
+        for concurrency in levels:
+            main.openai_limiters.clear()
+            main.OPENAI_ROUTE_CONCURRENCY = concurrency
+            pool.peak_in_flight = 0
+            requests, opened = pool.requests, pool.connections_opened
+            latencies = []
+            for _ in range(rounds):
+                latencies += await asyncio.gather(*(call(main) for _ in range(concurrency)))
+            new_connections = pool.connections_opened - opened
+            reuse = 1 - new_connections / (pool.requests - requests)
+            stats = pool.stats()
+            print(f"  {concurrency:>12} {statistics.median(latencies):8.1f} {max(latencies):8.1f} "
+                  f"{new_connections:>18} {reuse:>13.0%} {stats['peak_utilisation']:>8.0%} {stats['open_connections']:>9}")
+
+        # Un análisis por streaming devuelve su conexión al pool al terminar
+        events = [event async for event in main.stream_gpt_analysis(
+            "/bench", main.security_analysis_messages("pool"), 0.3, 2000, lambda analysis: analysis)]
+        if pool.stats()["in_flight"] != 0 or "fallback" in "".join(events):
+            raise SystemExit(f"❌ El stream no liberó su conexión: {pool.stats()}")
+        print(f"✅ Stream completo y conexión liberada (in_flight=0); versiones HTTP: {pool.stats()['http_versions']}")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-connections", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos que tarda el OpenAI simulado")
+    args = parser.parse_args()
+
+    mock, port = start_mock(args.latency)
+    os.environ.update(OPENAI_API_KEY_SECRET="sk-mock", OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1",
+                      OPENAI_POOL_MAX_CONNECTIONS=str(args.max_connections), OPENAI_MAX_RETRIES="0")
+    import main
+    main.print = lambda *a, **k: None
+    main.analysis_cache.get = no_cache  # que el stream consulte al OpenAI simulado
+
+    print(f"📊 Pool HTTP de OpenAI (máx {args.max_connections} conexiones, OpenAI simulado de "
+          f"{args.latency * 1000:g} ms, {args.rounds} rondas por nivel)")
+    asyncio.run(benchmark(main, args.concurrency, args.rounds))
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Microbenchmark del rate limiting: implementación anterior (lista) vs backends token bucket.
+
+Uso:
+    python benchmarks/bench_rate_limit.py [--sizes 10000 100000] [--hits 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+# Implementación anterior: lista de timestamps por IP, reconstruida en cada llamada
+legacy_counts = {}
+
+def legacy_check_rate_limit(client_ip: str) -> bool:
+    current_time = time.time()
+    if client_ip not in legacy_counts:
+        legacy_counts[client_ip] = []
+    legacy_counts[client_ip] = [
+        req_time for req_time in legacy_counts[client_ip]
+        if current_time - req_time < main.RATE_WINDOW
+    ]
+    if len(legacy_counts[client_ip]) >= main.RATE_LIMIT:
+        return False
+    legacy_counts[client_ip].append(current_time)
+    return True
+
+def build_workload(n_ips: int, hits: int):
+    """Secuencia barajada de requests: cada IP distinta aparece `hits` veces"""
+    ips = [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(n_ips)]
+    workload = ips * hits
+    random.Random(42).shuffle(workload)
+    return workload
+
+def run(name, check, state, workload):
+    # Primera pasada: tiempo; segunda pasada: memoria retenida (tracemalloc distorsiona el tiempo)
+    state.clear()
+    start = time.perf_counter()
+    for ip in workload:
+        check(ip)
+    elapsed = time.perf_counter() - start
+
+    state.clear()
+    tracemalloc.start()
+    for ip in workload:
+        check(ip)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ns_per_call = elapsed / len(workload) * 1e9
+    print(f"  {name:<14} {ns_per_call:9.0f} ns/llamada   {len(workload) / elapsed:12,.0f} llamadas/s   "
+          f"estado {current / 1024 / 1024:8.1f} MiB")
+    state.clear()
+
+def check_preload_fork(workers: int = 4, calls: int = 2000):
+    """Backend compartido creado antes del fork (gunicorn --preload): los workers hijos
+    no deben perder actualizaciones del mismo bucket"""
+    with tempfile.TemporaryDirectory() as tmp:
+        shm = main.SharedMemoryRateLimitBackend(os.path.join(tmp, "ratelimit"), slots=64, idle_ttl=60)
+        children = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                for _ in range(calls):
+                    shm.allow("10.0.0.1", 10**9, 10**9)
+                os._exit(0)
+            children.append(pid)
+        for pid in children:
+            os.waitpid(pid, 0)
+        offset = shm.HEADER.size + (shm._hash("10.0.0.1") % shm.slots) * shm.SLOT.size
+        consumed = round(10**9 - shm.SLOT.unpack_from(shm._map, offset)[1])
+    if consumed != workers * calls:
+        raise SystemExit(f"❌ Compartido tras fork: {consumed:,} de {workers * calls:,} requests contados")
+    print(f"✅ Compartido tras fork: {workers} workers, {consumed:,} requests contados sin pérdidas")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--hits", type=int, default=20, help="requests por IP")
+    args = parser.parse_args()
+
+    if main.fcntl is not None:
+        check_preload_fork()
+    for n_ips in args.sizes:
+        workload = build_workload(n_ips, args.hits)
+        print(f"📊 {n_ips:,} IPs distintas, {args.hits} requests por IP ({len(workload):,} llamadas)")
+        run("lista (antes)", legacy_check_rate_limit, legacy_counts, workload)
+
+        memory = main.MemoryRateLimitBackend(max_clients=n_ips, idle_ttl=main.RATE_WINDOW)
+        run("memoria", lambda ip: memory.allow(ip, main.RATE_LIMIT, main.RATE_WINDOW), memory, workload)
+
+        if main.fcntl is not None:
+            with tempfile.TemporaryDirectory() as tmp:
+                shm = main.SharedMemoryRateLimitBackend(
+                    os.path.join(tmp, "ratelimit"), slots=2 * n_ips, idle_ttl=main.RATE_WINDOW
+                )
+                run("compartido", lambda ip: shm.allow(ip, main.RATE_LIMIT, main.RATE_WINDOW), shm, workload)
+
+if __name__ == "__main__":
+    main_bench()
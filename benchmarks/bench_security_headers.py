@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Benchmark de requests/s en /health: headers de seguridad con BaseHTTPMiddleware
+(antes) vs middleware ASGI con headers precalculados (después).
+
+Cada variante monta una app mínima con solo /health y el middleware, y se mide
+en proceso con httpx sobre ASGI para aislar el costo del middleware.
+
+Uso:
+    python benchmarks/bench_security_headers.py [--requests 20000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+
+import main  # noqa: E402
+
+def build_legacy_app():
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def add_security_headers(request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        response.headers["Content-Security-Policy"] = (
+            "default-src 'self'; "
+            "script-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://cdn-icons-png.flaticon.com; "
+            "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+            "img-src 'self' data: https: blob:; "
+            "font-src 'self' https://fonts.gstatic.com; "
+            "connect-src 'self'"
+        )
+        return response
+
+    app.add_api_route("/health", main.health_check)
+    return app
+
+def build_asgi_app():
+    app = FastAPI()
+    app.add_middleware(main.SecurityHeadersMiddleware)
+    app.add_api_route("/health", main.health_check)
+    return app
+
+async def measure(app, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Calentamiento
+        for _ in range(200):
+            await client.get("/health")
+
+        remaining = total
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get("/health")
+                assert response.headers["x-frame-options"] == "DENY"
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+async def run(args):
+    results = {}
+    for name, factory in (("BaseHTTPMiddleware (antes)", build_legacy_app), ("ASGI precalculado", build_asgi_app)):
+        rps = [await measure(factory(), args.requests, args.concurrency) for _ in range(args.rounds)]
+        results[name] = max(rps)
+        print(f"  {name:<28} {results[name]:10,.0f} req/s (mejor de {args.rounds})")
+
+    before, after = results.values()
+    print(f"📈 Mejora: {(after / before - 1) * 100:+.1f}%")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    print(f"📊 GET /health: {args.requests:,} requests, concurrencia {args.concurrency}")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main_bench()
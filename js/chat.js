@@ -1,6 +1,85 @@
 // Chat mejorado para BCR Form
 let bcr_chat = null; // Variable global para acceso desde botones
 
+// Conexión WebSocket persistente para un chat; si no está disponible se usa el POST equivalente
+class ChatSocket {
+    constructor(path, fallbackUrl) {
+        this.path = path;
+        this.fallbackUrl = fallbackUrl;
+        this.socket = null;
+        this.opening = null;
+        this.pending = new Map();
+        this.nextId = 1;
+        this.disabled = !('WebSocket' in window);
+    }
+
+    connect() {
+        if (this.socket) {
+            return this.opening;
+        }
+        const scheme = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${scheme}//${window.location.host}${this.path}`);
+        let opened = false;
+        this.socket = socket;
+        this.opening = new Promise((resolve, reject) => {
+            socket.onopen = () => {
+                opened = true;
+                resolve(socket);
+            };
+            socket.onerror = () => reject(new Error('WebSocket no disponible'));
+        });
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            const request = this.pending.get(data.id);
+            if (request) {
+                this.pending.delete(data.id);
+                request.resolve(data);
+            }
+        };
+        socket.onclose = () => {
+            this.socket = null;
+            // Un handshake rechazado (proxy sin WebSocket, rate limiting) no se reintenta
+            if (!opened) {
+                this.disabled = true;
+            }
+            // Los mensajes ya escritos no se reenvían por POST: el servidor pudo haberlos
+            // procesado y repetirlos avanzaría el paso dos veces
+            this.pending.forEach(request => request.reject(new Error('WebSocket cerrado')));
+            this.pending.clear();
+        };
+        return this.opening;
+    }
+
+    async send(payload) {
+        let socket = null;
+        if (!this.disabled) {
+            try {
+                socket = await this.connect();
+            } catch (error) {
+                console.warn('⚠️ WebSocket no disponible, usando POST:', error.message);
+            }
+        }
+
+        // Solo se usa POST si el mensaje nunca llegó a escribirse en el socket
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            const id = this.nextId++;
+            return await new Promise((resolve, reject) => {
+                this.pending.set(id, { resolve, reject });
+                socket.send(JSON.stringify({ ...payload, id }));
+            });
+        }
+
+        const response = await fetch(this.fallbackUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(payload)
+        });
+        return await response.json();
+    }
+}
+
 class BCRChat {
     constructor() {
         console.log('🎯 Inicializando BCRChat...');
@@ -29,6 +108,7 @@ class BCRChat {
         this.isValidating = false;
         this.conversationId = this.generateId();
         this.waitingFor = 'nombre';
+        this.socket = new ChatSocket('/ws/chat', '/chat');
         
         this.init();
         console.log('✅ BCRChat inicializado correctamente');
@@ -364,24 +444,11 @@ class BCRChat {
     }
 
     async sendMessage(message) {
-        const payload = {
+        // El servidor guarda el paso y los datos de la conversación: solo viaja el mensaje nuevo
+        return await this.socket.send({
             message: message,
-            user_data: {
-                ...this.userData,
-                paso: this.currentStep,
-                conversation_id: this.conversationId
-            }
-        };
-
-        const response = await fetch('/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(payload)
+            conversation_id: this.conversationId
         });
-
-        return await response.json();
     }
 
     processResponse(response) {
@@ -769,19 +836,7 @@ class BCRChat {
         this.mostrarModalProgresoIA();
         
         try {
-            const response = await fetch('/test-exhaustive', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-Requested-With': 'XMLHttpRequest'
-                }
-            });
-            
-            if (!response.ok) {
-                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-            }
-            
-            const data = await response.json();
+            const data = await this.obtenerAnalisisExhaustivo();
             
             // Cerrar modal de progreso
             this.cerrarModalProgresoIA();
@@ -819,6 +874,73 @@ class BCRChat {
         }
     }
 
+    // Por SSE las puntuaciones aparecen en el modal a medida que GPT-4 las genera;
+    // sin EventSource, o si el stream se corta antes de terminar, se usa el POST
+    obtenerAnalisisExhaustivo() {
+        if (!('EventSource' in window)) {
+            return this.obtenerAnalisisExhaustivoPOST();
+        }
+        return new Promise((resolve, reject) => {
+            const source = new EventSource('/test-exhaustive/stream');
+            let finished = false;
+            source.addEventListener('section', (event) => this.mostrarSeccionIA(JSON.parse(event.data)));
+            source.addEventListener('fallback', () => {
+                const detail = document.getElementById('ai-progress-detail');
+                if (detail) {
+                    detail.textContent = 'GPT-4 no respondió: completando con el análisis simulado...';
+                }
+            });
+            source.addEventListener('done', (event) => {
+                finished = true;
+                source.close();
+                resolve(JSON.parse(event.data));
+            });
+            source.onerror = () => {
+                if (finished) return;
+                source.close();
+                this.obtenerAnalisisExhaustivoPOST().then(resolve, reject);
+            };
+        });
+    }
+
+    async obtenerAnalisisExhaustivoPOST() {
+        const response = await fetch('/test-exhaustive', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        
+        return await response.json();
+    }
+
+    mostrarSeccionIA(section) {
+        // Con datos reales se detiene la animación simulada del modal
+        if (window.aiProgressInterval) {
+            clearInterval(window.aiProgressInterval);
+            window.aiProgressInterval = null;
+            const text = document.getElementById('ai-progress-text');
+            if (text) text.textContent = 'Recibiendo análisis de GPT-4...';
+        }
+        const [key, subkey] = section.path;
+        if (key === 'security_score') {
+            const score = document.getElementById('security-score');
+            if (score) score.textContent = `${section.value}%`;
+        } else if (key === 'critical_vulnerabilities' && Array.isArray(section.value)) {
+            const count = document.getElementById('vuln-count');
+            if (count) count.textContent = section.value.length;
+        }
+        const detail = document.getElementById('ai-progress-detail');
+        if (detail) {
+            detail.textContent = `Análisis recibido: ${subkey ? `${key} › ${subkey}` : key}`;
+        }
+    }
+
     mostrarModalProgresoIA() {
         let modal = document.getElementById('pruebasExhaustivasModal');
         if (!modal) {
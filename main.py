@@ -1,10 +1,12 @@
-from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Form, HTTPException, WebSocket
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from starlette.requests import ClientDisconnect
+from starlette.websockets import WebSocketClose
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from pydantic import BaseModel, validator, ValidationError
+from pydantic import BaseModel, Field, TypeAdapter, field_validator, ValidationError
+from pydantic_core import from_json
 import os
 import json
 import random
@@ -15,7 +17,40 @@ import asyncio
 import html
 import secrets
 import hashlib
-from typing import Optional
+import sys
+import itertools
+import mmap
+import struct
+import tempfile
+import sqlite3
+import threading
+import math
+import gzip
+import csv
+import mimetypes
+import heapq
+import operator
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Annotated, Optional
+
+# fcntl solo existe en POSIX; sin él no hay backend de memoria compartida
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Brotli es opcional: sin él solo se precomprimen variantes gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# NumPy es opcional: sin él la validación masiva usa el validador registro a registro
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Imports para OpenAI y configuración
 from dotenv import load_dotenv
@@ -25,154 +60,1344 @@ load_dotenv()
 
 # Configuración OpenAI
 OPENAI_API_KEY_SECRET = os.getenv("OPENAI_API_KEY_SECRET")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # p. ej. un servidor OpenAI simulado en pruebas
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Llamadas simultáneas a OpenAI por ruta y espera máxima por un cupo libre
+OPENAI_ROUTE_CONCURRENCY = int(os.getenv("OPENAI_ROUTE_CONCURRENCY", "4"))
+OPENAI_QUEUE_TIMEOUT = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "10"))
+# Plazo máximo de cada llamada (reintentos incluidos; en streaming, entre chunks) y
+# circuit breaker: tras N fallas seguidas no se consulta OpenAI durante RESET segundos
+OPENAI_CALL_DEADLINE = float(os.getenv("OPENAI_CALL_DEADLINE", "45"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+OPENAI_CIRCUIT_FAILURES = int(os.getenv("OPENAI_CIRCUIT_FAILURES", "5"))
+OPENAI_CIRCUIT_RESET = float(os.getenv("OPENAI_CIRCUIT_RESET", "30"))
+# Tabla de modelos para el ruteo por presupuesto (JSON con la forma de DEFAULT_MODEL_TABLE)
+OPENAI_MODEL_TABLE = os.getenv("OPENAI_MODEL_TABLE")
 
-# Intentar importar OpenAI si está disponible
+# Cliente HTTP compartido hacia OpenAI: límites del pool, keep-alive, HTTP/2 opcional y timeouts.
+# OPENAI_TIMEOUT es el timeout de lectura; el pool debería cubrir la concurrencia de todas las rutas.
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_POOL_TIMEOUT = float(os.getenv("OPENAI_POOL_TIMEOUT", "10"))
+OPENAI_POOL_MAX_CONNECTIONS = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "20"))
+OPENAI_POOL_MAX_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "false").lower() in ("1", "true", "yes")
+# Transporte de las llamadas a OpenAI: "live" (red), "record" (red + graba cada par
+# request/response en OPENAI_CASSETTE_DIR), "replay" (sirve lo grabado, sin red) o "mock"
+# (servidor chat-completions simulado dentro del proceso, mock_openai.py).
+# La latencia de replay es "recorded" o una distribución: "fixed:S", "uniform:A,B", "lognormal:MEDIANA,SIGMA".
+OPENAI_TRANSPORT = os.getenv("OPENAI_TRANSPORT", "live").lower()
+OPENAI_CASSETTE_DIR = os.getenv("OPENAI_CASSETTE_DIR", "cassettes/openai")
+OPENAI_REPLAY_LATENCY = os.getenv("OPENAI_REPLAY_LATENCY", "recorded")
+OPENAI_REPLAY_SEED = os.getenv("OPENAI_REPLAY_SEED")
+OPENAI_MOCK_LATENCY = float(os.getenv("OPENAI_MOCK_LATENCY", "1"))
+
+# Intentar importar OpenAI si está disponible.
+# El cliente es asíncrono: una consulta a GPT-4 no detiene el event loop del worker.
+# Se crea en el lifespan de la app (open_openai_client), junto con su pool de conexiones.
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
     OPENAI_AVAILABLE = bool(OPENAI_API_KEY_SECRET and OPENAI_API_KEY_SECRET.startswith("sk-"))
-    if OPENAI_AVAILABLE:
-        openai_client = OpenAI(api_key=OPENAI_API_KEY_SECRET)
+    if OPENAI_TRANSPORT in ("replay", "mock"):
+        # Sin red: no hace falta una clave real
+        OPENAI_AVAILABLE = True
+        print(f"📡 OpenAI GPT-4 sin red: ✅ modo {OPENAI_TRANSPORT}")
+    elif OPENAI_AVAILABLE:
         print(f"📡 OpenAI GPT-4 configurado: ✅ Disponible para análisis IA real")
     else:
-        openai_client = None
         print(f"📡 OpenAI: ❌ Clave no válida, usando IA simulada")
 except ImportError:
+    httpx = None
     OPENAI_AVAILABLE = False
-    openai_client = None
     print("📡 OpenAI no instalado, usando IA simulada")
+openai_client = None
+openai_http = None
+
+# HTTP/2 es opcional: httpx lo necesita del paquete h2 (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class TrackedByteStream(httpx.AsyncByteStream if httpx else object):
+    """Cuerpo de una respuesta que avisa una sola vez cuando se cierra"""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self):
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+        await self._stream.aclose()
+
+class UpstreamHTTPPool(httpx.AsyncBaseTransport if httpx else object):
+    """Transporte httpx compartido hacia OpenAI con métricas de uso del pool: requests en
+    curso (hasta que se cierra la respuesta) y conexiones TCP nuevas vs reutilizadas"""
+
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry: float, http2: bool, wrap=None):
+        if http2 and not HTTP2_AVAILABLE:
+            print("⚠️ OPENAI_HTTP2 activado pero falta el paquete h2: se usa HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._network = httpx.AsyncHTTPTransport(limits=self.limits, http2=http2)
+        # wrap: transporte alternativo (cassette o mock) que recibe el de red
+        self._transport = wrap(self._network) if wrap else self._network
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self.http_versions = {}
+
+    async def handle_async_request(self, request):
+        request.extensions["trace"] = self._trace
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self.errors += 1
+            self.in_flight -= 1
+            raise
+        version = response.extensions.get("http_version", b"").decode() or "?"
+        self.http_versions[version] = self.http_versions.get(version, 0) + 1
+        response.stream = TrackedByteStream(response.stream, self._release)
+        return response
+
+    def _release(self):
+        self.in_flight -= 1
+
+    async def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def aclose(self):
+        if self._transport is not self._network:
+            await self._transport.aclose()
+        await self._network.aclose()
+
+    def stats(self) -> dict:
+        connections = getattr(getattr(self._network, "_pool", None), "connections", [])
+        active = sum(1 for connection in connections if not connection.is_idle())
+        reused = self.requests - self.connections_opened
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "open_connections": len(connections),
+            "active_connections": active,
+            "idle_connections": len(connections) - active,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            # Más de 1: hay requests esperando una conexión libre del pool
+            "utilisation": round(self.in_flight / self.limits.max_connections, 4),
+            "peak_utilisation": round(self.peak_in_flight / self.limits.max_connections, 4),
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections_opened": self.connections_opened,
+            "connection_reuse_ratio": round(max(reused, 0) / self.requests, 4) if self.requests else None,
+            "http_versions": self.http_versions
+        }
+
+class PacedByteStream(httpx.AsyncByteStream if httpx else object):
+    """Cuerpo SSE reproducido evento por evento, repartido en `duration` segundos"""
+
+    def __init__(self, body: bytes, duration: float):
+        self._events = [event + b"\n\n" for event in body.split(b"\n\n") if event.strip()]
+        self._delay = duration / len(self._events) if self._events else 0
+
+    async def __aiter__(self):
+        # Contra un horario fijo: las demoras de cada sleep no se acumulan
+        start = time.perf_counter()
+        for i, event in enumerate(self._events, 1):
+            delay = start + i * self._delay - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield event
+
+class CassetteTransport(httpx.AsyncBaseTransport if httpx else object):
+    """Graba pares request/response de OpenAI en un directorio (record) o los sirve sin red
+    (replay) con la latencia grabada o una distribución configurable. La clave es el hash de
+    método, ruta y cuerpo JSON, así la misma consulta de la app encuentra su grabación."""
+
+    def __init__(self, mode: str, directory: str, transport=None, latency: str = "recorded", seed=None):
+        self.mode = mode
+        self.directory = directory
+        self.latency = latency
+        self._transport = transport
+        self._entries = {}
+        self._sample = self._latency_sampler(latency, random.Random(seed))
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _latency_sampler(spec: str, rng: random.Random):
+        kind, _, params = spec.partition(":")
+        values = [float(value) for value in params.split(",") if value]
+        if kind == "recorded":
+            return None
+        if kind == "fixed":
+            return lambda: values[0]
+        if kind == "uniform":
+            return lambda: rng.uniform(values[0], values[1])
+        if kind == "lognormal":
+            return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+        raise ValueError(f"OPENAI_REPLAY_LATENCY desconocida: {spec}")
+
+    @staticmethod
+    def key(method: str, path: str, body: bytes) -> str:
+        try:
+            body = json.dumps(json.loads(body or b"null"), ensure_ascii=False, sort_keys=True)
+        except ValueError:
+            body = body.decode(errors="replace")
+        return hashlib.sha256(f"{method} {path} {body}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    async def handle_async_request(self, request):
+        body = await request.aread()
+        key = self.key(request.method, request.url.path, body)
+        if self.mode == "record":
+            return await self._record(request, body, key)
+        return await self._replay(request, key)
+
+    async def _record(self, request, body: bytes, key: str):
+        start = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        first_byte = time.perf_counter() - start
+        try:
+            content = await response.aread()  # ya sin content-encoding
+        finally:
+            await response.aclose()
+        entry = {
+            "request": {"method": request.method, "path": request.url.path, "body": json.loads(body or b"null")},
+            "response": {
+                "status_code": response.status_code,
+                "content_type": response.headers.get("content-type", "application/json"),
+                "body": content.decode()
+            },
+            "timing": {"first_byte_seconds": round(first_byte, 4),
+                       "body_seconds": round(time.perf_counter() - start - first_byte, 4)},
+            "recorded_at": datetime.now().isoformat()
+        }
+        with open(self._path(key), "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        self._entries[key] = entry
+        self.recorded += 1
+        return httpx.Response(response.status_code, headers={"content-type": entry["response"]["content_type"]},
+                              content=content, extensions=response.extensions)
+
+    def _load(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    entry = self._entries[key] = json.load(f)
+            except FileNotFoundError:
+                return None
+        return entry
+
+    async def _replay(self, request, key: str):
+        entry = self._load(key)
+        if entry is None:
+            self.misses += 1
+            # 404: el SDK no reintenta y la ruta usa su fallback
+            return httpx.Response(404, json={"error": {
+                "message": f"Sin grabación para {request.method} {request.url.path} ({key[:12]})",
+                "type": "cassette_miss"
+            }})
+        self.replayed += 1
+        timing = entry["timing"]
+        await asyncio.sleep(self._sample() if self._sample else timing["first_byte_seconds"])
+        content_type = entry["response"]["content_type"]
+        content = entry["response"]["body"].encode()
+        if content_type.startswith("text/event-stream"):
+            stream = PacedByteStream(content, timing["body_seconds"])
+            return httpx.Response(entry["response"]["status_code"], headers={"content-type": content_type}, stream=stream)
+        return httpx.Response(entry["response"]["status_code"], headers={"content-type": content_type}, content=content)
+
+    async def aclose(self):
+        if self._transport is not None:
+            await self._transport.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "directory": self.directory,
+            "latency": self.latency,
+            "entries": len([name for name in os.listdir(self.directory) if name.endswith(".json")]),
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses
+        }
+
+openai_cassette = None
+
+def openai_transport_wrapper():
+    """Función que envuelve el transporte de red según OPENAI_TRANSPORT (None: solo la red)"""
+    if OPENAI_TRANSPORT in ("record", "replay"):
+        def wrap(network):
+            global openai_cassette
+            openai_cassette = CassetteTransport(
+                OPENAI_TRANSPORT, OPENAI_CASSETTE_DIR, network if OPENAI_TRANSPORT == "record" else None,
+                OPENAI_REPLAY_LATENCY, OPENAI_REPLAY_SEED
+            )
+            return openai_cassette
+        return wrap
+    if OPENAI_TRANSPORT == "mock":
+        from mock_openai import create_mock_openai_app
+        return lambda network: httpx.ASGITransport(app=create_mock_openai_app(OPENAI_MOCK_LATENCY))
+    if OPENAI_TRANSPORT != "live":
+        print(f"⚠️ OPENAI_TRANSPORT desconocido '{OPENAI_TRANSPORT}', usando la red")
+    return None
+
+def open_openai_client():
+    """Crear el cliente OpenAI y su pool al arrancar. Un cliente ya asignado (p. ej. uno
+    falso en benchmarks) se respeta; devuelve el pool creado o None"""
+    global openai_client, openai_http
+    if not OPENAI_AVAILABLE or openai_client is not None:
+        return None
+    timeout = httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT, pool=OPENAI_POOL_TIMEOUT)
+    openai_http = UpstreamHTTPPool(OPENAI_POOL_MAX_CONNECTIONS, OPENAI_POOL_MAX_KEEPALIVE,
+                                   OPENAI_KEEPALIVE_EXPIRY, OPENAI_HTTP2, openai_transport_wrapper())
+    openai_client = AsyncOpenAI(
+        api_key=OPENAI_API_KEY_SECRET or "sk-offline",
+        base_url=OPENAI_BASE_URL,
+        timeout=timeout,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=DefaultAsyncHttpxClient(transport=openai_http, timeout=timeout)
+    )
+    # El SDK importa los recursos al primer acceso (~250 ms): mejor al arrancar que bloqueando un request
+    openai_client.chat.completions
+    print(f"🔌 Pool HTTP de OpenAI: hasta {OPENAI_POOL_MAX_CONNECTIONS} conexiones, "
+          f"{'HTTP/2' if openai_http.http2 else 'HTTP/1.1'}, transporte {OPENAI_TRANSPORT}")
+    return openai_http
+
+async def close_openai_client():
+    """Cerrar las conexiones del pool al apagar (solo si lo creó open_openai_client)"""
+    global openai_client, openai_http, openai_cassette
+    if openai_http is None:
+        return
+    await openai_client.close()
+    openai_client = None
+    openai_http = None
+    openai_cassette = None
+
+class ConcurrencyLimiter:
+    """Cupo de llamadas simultáneas a OpenAI de una ruta; si no se libera un lugar en
+    queue_timeout segundos la llamada falla y la ruta usa su fallback simulado"""
+
+    def __init__(self, limit: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise TimeoutError(f"Sin cupo para consultar OpenAI tras {self.queue_timeout:g} s")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+openai_limiters = {}
+
+def openai_limiter(route: str) -> ConcurrencyLimiter:
+    limiter = openai_limiters.get(route)
+    if limiter is None:
+        limiter = openai_limiters[route] = ConcurrencyLimiter(OPENAI_ROUTE_CONCURRENCY, OPENAI_QUEUE_TIMEOUT)
+    return limiter
+
+class CircuitOpenError(Exception):
+    """OpenAI no se consulta: el circuito está abierto o ya hay una sonda en curso"""
+
+class CircuitBreaker:
+    """Circuit breaker de OpenAI: closed -> open tras failure_threshold fallas seguidas;
+    pasados reset_timeout segundos deja pasar una única sonda (half_open) que lo cierra
+    si responde o lo vuelve a abrir si falla"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error = None
+
+    def is_open(self) -> bool:
+        """True si una llamada ahora fallaría de inmediato"""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self.state == "half_open" and self.probe_in_flight
+
+    def before_call(self):
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.is_open():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuito de OpenAI abierto ({self.last_error})")
+        if self.state == "half_open":
+            self.probe_in_flight = True
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.state = "closed"
+
+    def record_failure(self, error: Exception):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        self.last_error = f"{type(error).__name__}: {error}"[:200]
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"⚡ Circuito de OpenAI abierto por {self.reset_timeout:g} s: {self.last_error}")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """Llamada cancelada (p. ej. cliente desconectado): no dice nada sobre OpenAI"""
+        self.probe_in_flight = False
+
+    @staticmethod
+    def trips(error: Exception) -> bool:
+        """Si el error cuenta como falla de OpenAI: timeouts, errores de red y 5xx. Un 4xx
+        (request inválido, sin grabación en el cassette) es culpa de la llamada, salvo 408 y 429"""
+        status = getattr(error, "status_code", None)
+        return not (isinstance(status, int) and 400 <= status < 500 and status not in (408, 429))
+
+    def stats(self) -> dict:
+        retry_in = self.reset_timeout - (time.monotonic() - self.opened_at) if self.state == "open" else 0
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_in_seconds": round(max(retry_in, 0), 1),
+            "call_deadline_seconds": OPENAI_CALL_DEADLINE,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+            "last_error": self.last_error
+        }
+
+openai_breaker = CircuitBreaker(OPENAI_CIRCUIT_FAILURES, OPENAI_CIRCUIT_RESET)
+
+@asynccontextmanager
+async def openai_call(route: str):
+    """Cupo de la ruta + circuit breaker alrededor de una llamada a openai_client"""
+    async with openai_limiter(route).slot():
+        openai_breaker.before_call()
+        try:
+            yield
+        except Exception as e:
+            if openai_breaker.trips(e):
+                openai_breaker.record_failure(e)
+            else:
+                openai_breaker.abandon()
+            raise
+        except BaseException:
+            openai_breaker.abandon()
+            raise
+        openai_breaker.record_success()
+
+async def openai_deadline(awaitable, timeout: float = OPENAI_CALL_DEADLINE):
+    """Espera a OpenAI como máximo `timeout` segundos"""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"OpenAI no respondió en {timeout:g} s") from None
+
+# Modelos del más capaz al más económico: latencia p95 esperada (s), costo por 1K tokens
+# (USD, salida), tope de max_tokens y timeout propio. /metrics["model_latency"] muestra
+# la latencia real de cada uno para ajustar esta tabla.
+DEFAULT_MODEL_TABLE = [
+    {"model": "gpt-4", "latency_p95": 30, "cost_per_1k_tokens": 0.06, "max_tokens": 2000, "timeout": 45},
+    {"model": "gpt-4o", "latency_p95": 12, "cost_per_1k_tokens": 0.01, "max_tokens": 2000, "timeout": 30},
+    {"model": "gpt-4o-mini", "latency_p95": 3, "cost_per_1k_tokens": 0.0006, "max_tokens": 1000, "timeout": 10},
+]
+
+class ModelBudget:
+    """Presupuesto que declara cada llamada a OpenAI: latencia máxima (s) y costo máximo (USD)"""
+    __slots__ = ("latency", "cost")
+
+    def __init__(self, latency: float, cost: float):
+        self.latency = latency
+        self.cost = cost
+
+class ModelChoice:
+    """Modelo, max_tokens y timeout elegidos por el router para una llamada"""
+    __slots__ = ("model", "max_tokens", "timeout")
+
+    def __init__(self, model: str, max_tokens: int, timeout: float):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+
+class ModelRouter:
+    """Elige el modelo más capaz de la tabla cuya latencia p95 y costo estimado entran en el
+    presupuesto; si ninguno entra, el más económico"""
+
+    def __init__(self, table: list):
+        self.table = table
+        self.routed = {}
+
+    def choose(self, budget: ModelBudget, max_tokens: int, messages: list) -> ModelChoice:
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        for spec in self.table:
+            tokens = min(max_tokens, spec["max_tokens"])
+            cost = (prompt_tokens + tokens) / 1000 * spec["cost_per_1k_tokens"]
+            if spec["latency_p95"] <= budget.latency and cost <= budget.cost:
+                break
+        timeout = min(spec["timeout"], budget.latency, OPENAI_CALL_DEADLINE)
+        self.routed[spec["model"]] = self.routed.get(spec["model"], 0) + 1
+        return ModelChoice(spec["model"], tokens, timeout)
+
+    def stats(self) -> dict:
+        return {"table": self.table, "routed": self.routed}
+
+# Campos numéricos de cada modelo de la tabla y los tipos aceptados
+MODEL_TABLE_NUMBERS = {"latency_p95": (int, float), "cost_per_1k_tokens": (int, float),
+                       "max_tokens": int, "timeout": (int, float)}
+
+def model_table_errors(table) -> list:
+    """Problemas de forma de una tabla de modelos; vacía si ModelRouter puede usarla"""
+    if not isinstance(table, list) or not table:
+        return ["debe ser una lista no vacía"]
+    errors = []
+    for i, spec in enumerate(table):
+        if not isinstance(spec, dict):
+            errors.append(f"[{i}] no es un objeto")
+            continue
+        if not isinstance(spec.get("model"), str) or not spec["model"]:
+            errors.append(f"[{i}].model debe ser un texto")
+        for key, kind in MODEL_TABLE_NUMBERS.items():
+            value = spec.get(key)
+            if isinstance(value, bool) or not isinstance(value, kind) or value < 0:
+                errors.append(f"[{i}].{key} debe ser {'un entero' if kind is int else 'un número'} no negativo")
+    return errors
+
+def load_model_table() -> list:
+    if not OPENAI_MODEL_TABLE:
+        return DEFAULT_MODEL_TABLE
+    try:
+        table = json.loads(OPENAI_MODEL_TABLE)
+    except ValueError as e:
+        print(f"⚠️ OPENAI_MODEL_TABLE no es JSON válido ({e}), usando la tabla por defecto")
+        return DEFAULT_MODEL_TABLE
+    errors = model_table_errors(table)
+    if errors:
+        print(f"⚠️ OPENAI_MODEL_TABLE inválida ({'; '.join(errors[:5])}), usando la tabla por defecto")
+        return DEFAULT_MODEL_TABLE
+    return table
+
+model_router = ModelRouter(load_model_table())
+
+# Presupuestos de las llamadas a OpenAI
+ANALYSIS_BUDGET = ModelBudget(latency=60, cost=0.25)  # análisis de seguridad completos (~0.16 USD en gpt-4)
+GPT4_TEST_BUDGET = ModelBudget(latency=45, cost=0.01)  # /test-gpt4 verifica el modelo principal
+PING_BUDGET = ModelBudget(latency=5, cost=0.001)  # "Responde solo: OK"
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets fijos (segundos) y percentiles aproximados"""
+    BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 45, 60)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)  # el último: más de 60 s
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        index = 0
+        while index < len(self.BUCKETS) and seconds > self.BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float):
+        """Límite superior del bucket donde cae el percentil q (0-1)"""
+        if not self.count:
+            return None
+        cumulative = 0
+        for bound, count in zip(self.BUCKETS + (self.max,), self.counts):
+            cumulative += count
+            if cumulative >= q * self.count:
+                return round(min(bound, self.max), 3)
+
+    def stats(self) -> dict:
+        labels = [f"le_{bound:g}" for bound in self.BUCKETS] + ["le_inf"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+class ModelLatency:
+    """Histogramas de latencia por modelo: respuesta completa y primer token en streaming"""
+
+    def __init__(self):
+        self.histograms = {}  # (modelo, tipo) -> LatencyHistogram
+        self.errors = {}
+
+    def observe(self, model: str, kind: str, seconds: float):
+        histogram = self.histograms.get((model, kind))
+        if histogram is None:
+            histogram = self.histograms[(model, kind)] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def error(self, model: str):
+        self.errors[model] = self.errors.get(model, 0) + 1
+
+    def stats(self) -> dict:
+        models = {}
+        for (model, kind), histogram in self.histograms.items():
+            models.setdefault(model, {})[kind] = histogram.stats()
+        for model, errors in self.errors.items():
+            models.setdefault(model, {})["errors"] = errors
+        return models
+
+model_latency = ModelLatency()
+
+async def openai_chat(route: str, choice: ModelChoice, **kwargs):
+    """chat.completions.create asíncrono con el modelo, max_tokens y timeout elegidos por el
+    router, dentro del cupo de la ruta y el circuit breaker"""
+    async with openai_call(route):
+        start = time.perf_counter()
+        try:
+            response = await openai_deadline(
+                openai_client.chat.completions.create(model=choice.model, max_tokens=choice.max_tokens, **kwargs),
+                choice.timeout
+            )
+        except Exception:
+            model_latency.error(choice.model)
+            raise
+        model_latency.observe(choice.model, "completion", time.perf_counter() - start)
+        return response
 
 # Función de sanitización simple como alternativa a bleach
+# Caracteres que html.escape reemplaza o que se eliminan por ser de control
+HTML_UNSAFE_PATTERN = re.compile(r'[&<>"\'\x00-\x1F\x7F]')
+HTML_CONTROL_PATTERN = re.compile(r'[\x00-\x1F\x7F]')
+
 def clean_html(text):
     """Función simple para limpiar HTML básico"""
     if not text:
         return ""
-    # Escapar caracteres HTML básicos
-    text = html.escape(str(text))
-    # Remover caracteres de control
-    text = re.sub(r'[\x00-\x1F\x7F]', '', text)
-    return text.strip()
+    text = str(text)
 
-app = FastAPI(title="BCR Form", description="Formulario BCR con Chat Inteligente")
+    # Camino rápido: la mayoría de los textos no tiene nada que escapar ni eliminar
+    if HTML_UNSAFE_PATTERN.search(text) is None:
+        return text.strip()
 
-# Configurar CORS y middlewares de seguridad
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # En producción, especificar dominios exactos
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    # Escapar caracteres HTML básicos y remover caracteres de control
+    return HTML_CONTROL_PATTERN.sub('', html.escape(text)).strip()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Ciclo de vida de la aplicación: cliente OpenAI y tareas de mantenimiento en segundo plano"""
+    asset_cache.reload()
+    open_openai_client()
+    sweeper = asyncio.create_task(sweep_client_state())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        try:
+            await sweeper
+        except asyncio.CancelledError:
+            pass
+        await close_openai_client()
+
+app = FastAPI(title="BCR Form", description="Formulario BCR con Chat Inteligente", lifespan=lifespan)
+
+# Middlewares de seguridad (CORS se registra después del rate limiting, ver más abajo)
 # Middleware para hosts confiables
 app.add_middleware(
     TrustedHostMiddleware, 
     allowed_hosts=["*"]  # En producción, especificar hosts específicos
 )
 
-# Rate limiting simple en memoria (para producción usar Redis)
-request_counts = {}
+# Rate limiting en memoria con token bucket por IP (para producción usar Redis)
 RATE_LIMIT = 100  # requests por minuto
 RATE_WINDOW = 60  # segundos
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+# Un bucket inactivo durante RATE_WINDOW ya está lleno: descartarlo no cambia el resultado
+RATE_LIMIT_IDLE_TTL = float(os.getenv("RATE_LIMIT_IDLE_TTL", str(RATE_WINDOW)))
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "30"))
+# Backend: "memory" (por proceso) o "shm" (compartido entre workers del mismo host)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SHM_PATH = os.getenv(
+    "RATE_LIMIT_SHM_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "bcr-form-ratelimit")
+)
+RATE_LIMIT_SHM_SLOTS = int(os.getenv("RATE_LIMIT_SHM_SLOTS", "131072"))
 
-def check_rate_limit(client_ip: str) -> bool:
-    """Verificar rate limiting básico"""
-    current_time = time.time()
-    
-    if client_ip not in request_counts:
-        request_counts[client_ip] = []
-    
-    # Limpiar requests antiguos
-    request_counts[client_ip] = [
-        req_time for req_time in request_counts[client_ip] 
-        if current_time - req_time < RATE_WINDOW
-    ]
-    
-    # Verificar límite
-    if len(request_counts[client_ip]) >= RATE_LIMIT:
-        return False
-    
-    request_counts[client_ip].append(current_time)
-    return True
+class TokenBucket:
+    """Estado de rate limiting de un cliente: tokens disponibles y última recarga"""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class ClientStateStore:
+    """Tabla acotada de estado por cliente con expulsión LRU y por inactividad.
+
+    Las entradas se mantienen ordenadas de la menos a la más reciente; cada valor
+    debe exponer `updated` (time.monotonic del último acceso).
+    """
+
+    def __init__(self, max_size: int, idle_ttl: float):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()
+        self.evictions = 0  # expulsados por capacidad (LRU)
+        self.expirations = 0  # expulsados por inactividad
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Obtener el estado de un cliente y marcarlo como el más reciente"""
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Guardar el estado de un cliente, expulsando el menos reciente si se llena"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Expulsar clientes inactivos; se detiene en el primero que sigue activo"""
+        deadline = (time.monotonic() if now is None else now) - self.idle_ttl
+        expired = 0
+        while self._entries:
+            key, value = next(iter(self._entries.items()))
+            if value.updated > deadline:
+                break
+            del self._entries[key]
+            expired += 1
+        self.expirations += expired
+        return expired
+
+    def clear(self):
+        self._entries.clear()
+
+    def memory_bytes(self, sample: int = 64) -> int:
+        """Estimar la memoria de la tabla a partir de una muestra de entradas recientes"""
+        if not self._entries:
+            return sys.getsizeof(self._entries)
+        recent = list(itertools.islice(reversed(self._entries.items()), sample))
+        per_entry = sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in recent) / len(recent)
+        return int(sys.getsizeof(self._entries) + per_entry * len(self._entries))
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "memory_bytes": self.memory_bytes()
+        }
+
+def refill_tokens(tokens: float, updated: float, now: float, limit: int, window: float) -> float:
+    """Tokens disponibles tras recargar según el tiempo transcurrido, sin superar la capacidad"""
+    elapsed = now - updated
+    if elapsed < 0:  # reloj de otro arranque (memoria compartida persistente)
+        return float(limit)
+    return min(limit, tokens + elapsed * (limit / window))
+
+class MemoryRateLimitBackend:
+    """Backend por proceso: token buckets en una ClientStateStore acotada"""
+    name = "memory"
+
+    def __init__(self, max_clients: int, idle_ttl: float):
+        self.store = ClientStateStore(max_clients, idle_ttl)
+
+    def allow(self, key: str, limit: int, window: float) -> bool:
+        current_time = time.monotonic()
+        bucket = self.store.get(key)
+
+        if bucket is None:
+            self.store.put(key, TokenBucket(limit - 1, current_time))
+            return True
+
+        bucket.tokens = refill_tokens(bucket.tokens, bucket.updated, current_time, limit, window)
+        bucket.updated = current_time
+
+        if bucket.tokens < 1:
+            return False
+
+        bucket.tokens -= 1
+        return True
+
+    def sweep(self) -> int:
+        return self.store.sweep()
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.store.stats()}
+
+class SharedMemoryRateLimitBackend:
+    """Backend compartido entre workers del mismo host: tabla de slots de tamaño fijo
+    en un archivo mapeado en memoria, protegida con flock.
+
+    Cada slot guarda (hash de la clave, tokens, última recarga). Una clave se busca
+    en una ventana corta de slots consecutivos; si no hay slot libre se reutiliza el
+    más antiguo, así que la memoria queda fija en RATE_LIMIT_SHM_SLOTS.
+    """
+    name = "shm"
+    HEADER = struct.Struct("<8sQQQ")  # magic, slots, expulsiones, expiraciones
+    SLOT = struct.Struct("<Qdd")  # hash de la clave, tokens, última recarga
+    MAGIC = b"BCRRL001"
+    PROBES = 8
+
+    def __init__(self, path: str, slots: int, idle_ttl: float):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # Reutilizar la tabla si otro worker ya la creó con un formato válido
+            size = os.fstat(self._fd).st_size
+            if size >= self.HEADER.size:
+                magic, existing, _, _ = self.HEADER.unpack(os.pread(self._fd, self.HEADER.size, 0))
+                if magic == self.MAGIC and size == self.HEADER.size + existing * self.SLOT.size:
+                    slots = existing
+                else:
+                    size = 0
+            if size < self.HEADER.size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.HEADER.size + slots * self.SLOT.size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, slots, 0, 0), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.slots = slots
+        self._map = mmap.mmap(self._fd, self.HEADER.size + slots * self.SLOT.size)
+        self._pid = os.getpid()
+
+    def _lock_fd(self) -> int:
+        """fd de este proceso para flock. El lock pertenece a la descripción del archivo
+        abierto, que un fork comparte: si el módulo se importó antes de crear los workers
+        (gunicorn --preload) cada uno reabre el archivo para que el lock los excluya"""
+        if self._pid != os.getpid():
+            inherited = self._fd
+            self._fd = os.open(self.path, os.O_RDWR)
+            self._pid = os.getpid()
+            os.close(inherited)
+        return self._fd
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # hash() de Python cambia entre procesos; blake2b es estable y 0 marca slot libre
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def _bump_counter(self, field: int):
+        offset = 8 + 8 * field
+        value, = struct.unpack_from("<Q", self._map, offset)
+        struct.pack_into("<Q", self._map, offset, value + 1)
+
+    def allow(self, key: str, limit: int, window: float) -> bool:
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+        fd = self._lock_fd()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            current_time = time.monotonic()
+            target = free = oldest = None
+            oldest_updated = float("inf")
+            for probe in range(self.PROBES):
+                offset = self.HEADER.size + ((start + probe) % self.slots) * self.SLOT.size
+                slot_hash, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+                if slot_hash == key_hash:
+                    target = offset
+                    break
+                if slot_hash == 0:
+                    if free is None:
+                        free = offset
+                elif updated < oldest_updated:
+                    oldest, oldest_updated = offset, updated
+
+            if target is not None:
+                tokens = refill_tokens(tokens, updated, current_time, limit, window)
+            else:
+                if free is not None:
+                    target = free
+                else:
+                    # Ventana llena: reutilizar el slot menos reciente
+                    target = oldest
+                    self._bump_counter(2 if current_time - oldest_updated >= self.idle_ttl else 1)
+                tokens = float(limit)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.SLOT.pack_into(self._map, target, key_hash, tokens, current_time)
+            return allowed
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def sweep(self) -> int:
+        # Los slots inactivos se reutilizan al insertar; no hay nada que barrer
+        return 0
+
+    def clear(self):
+        fd = self._lock_fd()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            self._map[self.HEADER.size:] = bytes(self.slots * self.SLOT.size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        _, slots, evictions, expirations = self.HEADER.unpack_from(self._map, 0)
+        used = sum(
+            1 for slot_hash, _, _ in self.SLOT.iter_unpack(memoryview(self._map)[self.HEADER.size:])
+            if slot_hash
+        )
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "size": used,
+            "max_size": slots,
+            "evictions": evictions,
+            "expirations": expirations,
+            "memory_bytes": len(self._map)
+        }
+
+def create_rate_limit_backend():
+    """Crear el backend de rate limiting configurado en RATE_LIMIT_BACKEND"""
+    if RATE_LIMIT_BACKEND == "shm":
+        if fcntl is None:
+            print("⚠️ Rate limiting: memoria compartida no soportada en esta plataforma, usando backend en memoria")
+        else:
+            try:
+                backend = SharedMemoryRateLimitBackend(RATE_LIMIT_SHM_PATH, RATE_LIMIT_SHM_SLOTS, RATE_LIMIT_IDLE_TTL)
+                print(f"🔗 Rate limiting compartido entre workers: {RATE_LIMIT_SHM_PATH} ({backend.slots} slots)")
+                return backend
+            except OSError as e:
+                print(f"⚠️ Rate limiting: no se pudo abrir {RATE_LIMIT_SHM_PATH} ({e}), usando backend en memoria")
+    elif RATE_LIMIT_BACKEND != "memory":
+        print(f"⚠️ Rate limiting: backend desconocido '{RATE_LIMIT_BACKEND}', usando backend en memoria")
+    return MemoryRateLimitBackend(RATE_LIMIT_MAX_CLIENTS, RATE_LIMIT_IDLE_TTL)
+
+rate_limiter = create_rate_limit_backend()
+
+# Políticas de rate limiting por ruta: (requests, ventana en segundos).
+# Las claves que terminan en "/" aplican a todo el prefijo; el resto de rutas
+# comparte la política por defecto.
+RATE_LIMIT_POLICIES = {
+    "/test-exhaustive": (5, 60),
+    "/test-system-complete": (5, 60),
+    "/test-security-analyzer": (5, 60),
+    "/test-exhaustive/stream": (5, 60),
+    "/test-security-analyzer/stream": (5, 60),
+    "/test-system-complete/stream": (5, 60),
+    "/test-gpt4": (10, 60),
+    "/test-openai-quick": (10, 60),
+    "/test-automated": (30, 60),
+    "/test-quick": (30, 60),
+    "/validate-data/bulk": (5, 60),
+    "/ws/": (30, 60),  # handshakes; cada mensaje consume la política de su ruta POST
+    "/health": (600, 60),
+    "/css/": (300, 60),
+    "/js/": (300, 60),
+}
+RATE_LIMIT_PREFIX_POLICIES = [prefix for prefix in RATE_LIMIT_POLICIES if prefix.endswith("/")]
+
+def resolve_rate_limit_policy(path: str):
+    """Obtener (nombre, límite, ventana) de la política que aplica a una ruta"""
+    policy = RATE_LIMIT_POLICIES.get(path)
+    if policy is not None:
+        return path, policy[0], policy[1]
+    for prefix in RATE_LIMIT_PREFIX_POLICIES:
+        if path.startswith(prefix):
+            limit, window = RATE_LIMIT_POLICIES[prefix]
+            return prefix, limit, window
+    return "*", RATE_LIMIT, RATE_WINDOW
+
+def check_rate_limit(client_ip: str, path: str = "/") -> bool:
+    """Verificar rate limiting con la política de la ruta (token bucket, O(1) por request)"""
+    policy_name, limit, window = resolve_rate_limit_policy(path)
+    return rate_limiter.allow(f"{policy_name}|{client_ip}", limit, window)
+
+class RateLimitMiddleware:
+    """Control de admisión: aplica el rate limiting una sola vez, antes de ejecutar la ruta"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        # Los preflight OPTIONS no consumen el presupuesto (CORS los responde antes de llegar aquí)
+        if scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        path = scope["path"]
+        if not check_rate_limit(client_ip, path):
+            if scope["type"] == "websocket":
+                # Rechazar el handshake: el cliente recibe 403 y puede volver a POST
+                await WebSocketClose(code=WS_CLOSE_TRY_AGAIN_LATER)(scope, receive, send)
+                return
+            _, limit, window = resolve_rate_limit_policy(path)
+            response = JSONResponse(
+                content={"detail": "Demasiadas solicitudes"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(window / limit))}
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+app.add_middleware(RateLimitMiddleware)
+
+# Configurar CORS. Se registra después del rate limiting para envolverlo: las respuestas 429
+# llevan Access-Control-Allow-Origin (si no, el navegador las ve como error de red opaco)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # En producción, especificar dominios exactos
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+async def sweep_client_state():
+    """Tarea periódica que expulsa clientes inactivos del rate limiting y sesiones de chat expiradas"""
+    while True:
+        await asyncio.sleep(RATE_LIMIT_SWEEP_INTERVAL)
+        expired = rate_limiter.sweep()
+        if expired:
+            print(f"🧹 Rate limiting: {expired} clientes inactivos expulsados")
+        expired = chat_sessions.sweep()
+        if expired:
+            print(f"🧹 Chat: {expired} sesiones expiradas")
+
+# Motor de inspección de contenido: todas las reglas se evalúan con un único escáner compilado.
+#
+# Cada regla es una secuencia de átomos que deben aparecer en orden y en la misma
+# línea (equivale a unirlos con `.*?`). El escáner recorre el texto una sola vez
+# y cada token se reconoce en tiempo acotado, así que el costo es lineal en la
+# longitud del mensaje, también con entradas patológicas.
+#
+# Tokens: (nombre, primeros caracteres posibles, regex, átomos que aporta como
+# (átomo, desplazamiento, longitud)).
+# Las palabras con puntuación (javascript:, document., window.) se reconocen en la
+# puntuación con un lookbehind fijo, y las etiquetas solo consumen el "<", para que
+# el escáner no se salte palabras que otras reglas necesitan ver.
+CONTENT_TOKENS = [
+    ("script_close", "<", r"<(?=/script>)", [("script_close", 0, 9), ("lt", 0, 1)]),
+    ("script_open", "<", r"<(?=script)", [("script_open", 0, 7), ("lt", 0, 1)]),
+    ("iframe_open", "<", r"<(?=iframe)", [("iframe_open", 0, 7), ("lt", 0, 1)]),
+    ("lt", "<", r"<", [("lt", 0, 1)]),
+    ("gt", ">", r">", [("gt", 0, 1)]),
+    ("semicolon", ";", r";", [("semicolon", 0, 1), ("quote_like", 0, 1)]),
+    ("quote_like", "'\"\\", r"['\"\\]", [("quote_like", 0, 1)]),
+    ("dashes", "-", r"--", [("dashes", 0, 2)]),
+    ("newline", "\n", r"\n", []),
+    ("javascript_uri", ":", r":(?<=javascript:)", [("javascript_uri", -10, 11)]),
+    ("dom_document", ".", r"\.(?<=document\.)", [("dom_document", -8, 9)]),
+    ("dom_window", ".", r"\.(?<=window\.)", [("dom_window", -6, 7)]),
+    # `eval\s*\(` y `on\w+\s*=` se confirman hacia atrás desde "(" y "=" (ver CONTENT_TOKEN_CHECKS)
+    ("eval_call", "(", r"\(", [("eval_call", 0, 1)]),
+    ("event_handler", "=", r"=", [("event_handler", 0, 1)]),
+]
+
+# Palabras SQL (`\bpalabra\b`): escáner aparte, sus coincidencias nunca se solapan con las de puntuación
+CONTENT_SQL_WORDS = ["union", "select", "from", "insert", "into", "update", "set", "delete", "drop", "table"]
+
+_EVAL_WORD = re.compile(r"eval", re.IGNORECASE)
+_ON_WORD = re.compile(r"on", re.IGNORECASE)
+
+def _is_word_char(char: str) -> bool:
+    # Mismo criterio que \w en patrones str
+    return char.isalnum() or char == "_"
+
+def _eval_before_paren(text: str, position: int) -> bool:
+    r"""`eval\s*\(`: el "(" va precedido de espacios opcionales y de "eval" """
+    start = position
+    while start > 0 and text[start - 1].isspace():
+        start -= 1
+    return start >= 4 and _EVAL_WORD.match(text, start - 4, start) is not None
+
+def _event_handler_before_equals(text: str, position: int) -> bool:
+    r"""`on\w+\s*=`: el "=" va precedido de espacios opcionales y de una palabra que
+    contiene "on" seguido de al menos un carácter más"""
+    end = position
+    while end > 0 and text[end - 1].isspace():
+        end -= 1
+    start = end
+    while start > 0 and _is_word_char(text[start - 1]):
+        start -= 1
+    return end - start >= 3 and _ON_WORD.search(text, start, end - 1) is not None
+
+# Los espacios o palabras recorridos hacia atrás desde dos "(" o "=" distintos no se
+# solapan, así que la verificación total sigue siendo lineal
+CONTENT_TOKEN_CHECKS = {
+    "eval_call": _eval_before_paren,
+    "event_handler": _event_handler_before_equals,
+}
+
+# Reglas para mensajes de chat (antes: 14 patrones re.search por mensaje)
+CHAT_CONTENT_RULES = [
+    ("script_tag", ["script_open", "gt", "script_close"]),
+    ("javascript_uri", ["javascript_uri"]),
+    ("event_handler", ["event_handler"]),
+    ("iframe_tag", ["iframe_open", "gt"]),
+    ("eval_call", ["eval_call"]),
+    ("dom_document", ["dom_document"]),
+    ("dom_window", ["dom_window"]),
+    ("sql_comment", ["dashes", "semicolon"]),
+    ("sql_union_select", ["sql_union", "sql_select"]),
+    ("sql_select_from", ["sql_select", "sql_from"]),
+    ("sql_insert_into", ["sql_insert", "sql_into"]),
+    ("sql_update_set", ["sql_update", "sql_set"]),
+    ("sql_delete_from", ["sql_delete", "sql_from"]),
+    ("sql_drop_table", ["sql_drop", "sql_table"]),
+]
+
+# Reglas para direcciones
+DIRECCION_CONTENT_RULES = [
+    ("script_tag", ["script_open", "gt"]),
+    ("javascript_uri", ["javascript_uri"]),
+    ("event_handler", ["event_handler"]),
+    ("html_tag", ["lt", "gt"]),
+    ("quote_comment", ["quote_like", "dashes"]),
+]
+
+_match_start = operator.methodcaller("start")
+
+class ContentInspector:
+    """Evalúa un conjunto de reglas con una sola pasada de un escáner precompilado"""
+
+    def __init__(self, rules, tokens=CONTENT_TOKENS, sql_words=CONTENT_SQL_WORDS):
+        self.rule_names = [name for name, _ in rules]
+        self.rule_lengths = [len(atoms) for _, atoms in rules]
+
+        # Átomo -> [(índice de regla, paso de la secuencia)]
+        self.listeners = {}
+        for rule_index, (_, atoms) in enumerate(rules):
+            for step, atom in enumerate(atoms):
+                self.listeners.setdefault(atom, []).append((rule_index, step))
+        first_atoms = {atoms[0] for _, atoms in rules}
+
+        # Solo se compilan los tokens que aportan átomos usados por alguna regla
+        used = [
+            (name, first, pattern, emits) for name, first, pattern, emits in tokens
+            if name == "newline" or any(atom in self.listeners for atom, _, _ in emits)
+        ]
+        self.emits = {
+            name: [(atom, offset, length) for atom, offset, length in emits if atom in self.listeners]
+            for name, _, _, emits in used
+        }
+        words = [word for word in sql_words if f"sql_{word}" in self.listeners]
+        for word in words:
+            self.emits[f"sql_{word}"] = [(f"sql_{word}", 0, len(word))]
+
+        # Mientras ninguna regla está a medio camino solo interesan los tokens que
+        # inician alguna; el resto (">", "--", ...) se salta sin salir de C
+        start_tokens = [token for token in used if any(atom in first_atoms for atom, _, _ in self.emits[token[0]])]
+        start_words = [word for word in words if f"sql_{word}" in first_atoms]
+        self.full_scanners = self._compile(used, words)
+        self.start_scanners = self._compile(start_tokens, start_words)
+        # Un texto latin-1 sin ninguno de estos caracteres no puede activar ninguna regla
+        # (fuera de latin-1 IGNORECASE agrega variantes como 'ſ' o 'İ')
+        self.start_chars = frozenset(
+            variant
+            for char in itertools.chain((char for _, first, _, _ in start_tokens for char in first),
+                                        (word[0] for word in start_words))
+            for variant in (char, char.lower(), char.upper())
+        )
+        self.checks = {name: check for name, check in CONTENT_TOKEN_CHECKS.items() if name in self.emits}
+
+    @staticmethod
+    def _compile(tokens, words):
+        """Escáner de puntuación y escáner de palabras SQL (None si no hay palabras)"""
+        # El lookahead con los primeros caracteres descarta en C las posiciones que no
+        # pueden iniciar un token antes de probar las ramas una por una
+        gate = "".join(sorted({re.escape(char) for _, first, _, _ in tokens for char in first}))
+        branches = "|".join(f"(?P<{name}>{pattern})" for name, _, pattern, _ in tokens)
+        scanner = re.compile(f"(?=[{gate}])(?:{branches})", re.IGNORECASE) if tokens else None
+
+        word_scanner = None
+        if words:
+            initials = "".join(sorted({re.escape(word[0]) for word in words}))
+            branches = "|".join(f"(?P<sql_{word}>{word})" for word in words)
+            word_scanner = re.compile(f"\\b(?=[{initials}])(?:{branches})\\b", re.IGNORECASE)
+        return scanner, word_scanner
+
+    @staticmethod
+    def _matches(scanners, text: str, position: int):
+        """Tokens desde `position` en orden; los dos escáneres nunca se solapan"""
+        scanner, word_scanner = scanners
+        if word_scanner is None:
+            return scanner.finditer(text, position) if scanner is not None else iter(())
+        words = word_scanner.finditer(text, position)
+        if scanner is None:
+            return words
+        return heapq.merge(scanner.finditer(text, position), words, key=_match_start)
+
+    def inspect(self, text: str) -> Optional[str]:
+        """Devolver el nombre de la primera regla que se cumple, o None si el texto es seguro"""
+        steps = [0] * len(self.rule_names)
+        ready = [0] * len(self.rule_names)  # posición desde la que puede aparecer el siguiente átomo
+        active = False  # alguna regla avanzó en la línea actual
+        position = 0
+
+        while True:
+            for match in self._matches(self.full_scanners if active else self.start_scanners, text, position):
+                token = match.lastgroup
+                if token == "newline":
+                    # `.` no cruza saltos de línea: las secuencias empiezan de nuevo
+                    steps = [0] * len(self.rule_names)
+                    active = False
+                    position = match.end()
+                    break
+
+                start = match.start()
+                check = self.checks.get(token)
+                if check is not None and not check(text, start):
+                    continue
+
+                advanced = False
+                for atom, offset, length in self.emits[token]:
+                    atom_position = start + offset
+                    for rule_index, step in self.listeners[atom]:
+                        if steps[rule_index] == step and atom_position >= ready[rule_index]:
+                            steps[rule_index] = step + 1
+                            ready[rule_index] = atom_position + length
+                            advanced = True
+                            if step + 1 == self.rule_lengths[rule_index]:
+                                return self.rule_names[rule_index]
+                if advanced and not active:
+                    # Cambiar al escáner completo a partir de este token
+                    active = True
+                    position = match.end()
+                    break
+            else:
+                return None
+
+CHAT_CONTENT_INSPECTOR = ContentInspector(CHAT_CONTENT_RULES)
+DIRECCION_CONTENT_INSPECTOR = ContentInspector(DIRECCION_CONTENT_RULES)
+
+def validate_chat_text(v: str) -> str:
+    """Validación común de los mensajes de chat: vacío, longitud y contenido peligroso"""
+    if not v or len(v.strip()) == 0:
+        raise ValueError('Mensaje no puede estar vacío')
+
+    # Sanitizar mensaje
+    sanitized = clean_html(v.strip())
+
+    # Verificar longitud
+    if len(sanitized) > 500:
+        raise ValueError('Mensaje demasiado largo')
+
+    # Verificar patrones peligrosos
+    rule = CHAT_CONTENT_INSPECTOR.inspect(sanitized)
+    if rule:
+        print(f"🛡️ Mensaje bloqueado por la regla de contenido '{rule}'")
+        raise ValueError('Contenido no permitido detectado')
+
+    return sanitized
+
+# Patrones de validación de datos del solicitante, compilados una sola vez
+NOMBRE_PATTERN = re.compile(r'^[a-zA-ZáéíóúÁÉÍÓÚñÑ\s]{2,100}$')
+CEDULA_STRIP_PATTERN = re.compile(r'[^\d-]')
+TELEFONO_STRIP_PATTERN = re.compile(r'[^\d\s-]')
+SEPARATORS_PATTERN = re.compile(r'[\s-]')
+UNSAFE_QUOTES_PATTERN = re.compile(r'[;\'"\\]')
+TELEFONO_PATTERN = re.compile(r'^[2678]\d{7}$')
+
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
 
 # Modelos para el chat con validaciones estrictas
 class ChatMessage(BaseModel):
     message: str
     user_data: dict = {}
+    # Con conversation_id el estado vive en el servidor y user_data se ignora
+    conversation_id: Optional[str] = Field(default=None, pattern=r'^[A-Za-z0-9_-]{1,64}$')
     
-    @validator('message')
+    @field_validator('message')
+    @classmethod
     def validate_message(cls, v):
-        if not v or len(v.strip()) == 0:
-            raise ValueError('Mensaje no puede estar vacío')
-        
-        # Sanitizar mensaje
-        sanitized = clean_html(v.strip())
-        
-        # Verificar longitud
-        if len(sanitized) > 500:
-            raise ValueError('Mensaje demasiado largo')
-        
-        # Verificar patrones peligrosos
-        dangerous_patterns = [
-            r'<script.*?>.*?</script>',
-            r'javascript:',
-            r'on\w+\s*=',
-            r'<iframe.*?>',
-            r'eval\s*\(',
-            r'document\.',
-            r'window\.',
-            r'--.*?;',
-            r'\bunion\b.*?\bselect\b',
-            r'\bselect\b.*?\bfrom\b',
-            r'\binsert\b.*?\binto\b',
-            r'\bupdate\b.*?\bset\b',
-            r'\bdelete\b.*?\bfrom\b',
-            r'\bdrop\b.*?\btable\b'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, sanitized, re.IGNORECASE):
-                raise ValueError('Contenido no permitido detectado')
-        
-        return sanitized
+        return validate_chat_text(v)
 
 class GuiaChatMessage(BaseModel):
     message: str
     
-    @validator('message')
+    @field_validator('message')
+    @classmethod
     def validate_message(cls, v):
-        if not v or len(v.strip()) == 0:
-            raise ValueError('Mensaje no puede estar vacío')
-        
-        # Sanitizar mensaje
-        sanitized = clean_html(v.strip())
-        
-        # Verificar longitud
-        if len(sanitized) > 500:
-            raise ValueError('Mensaje demasiado largo')
-        
-        # Verificar patrones peligrosos
-        dangerous_patterns = [
-            r'<script.*?>.*?</script>',
-            r'javascript:',
-            r'on\w+\s*=',
-            r'<iframe.*?>',
-            r'eval\s*\(',
-            r'document\.',
-            r'window\.',
-            r'--.*?;',
-            r'\bunion\b.*?\bselect\b',
-            r'\bselect\b.*?\bfrom\b',
-            r'\binsert\b.*?\binto\b',
-            r'\bupdate\b.*?\bset\b',
-            r'\bdelete\b.*?\bfrom\b',
-            r'\bdrop\b.*?\btable\b'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, sanitized, re.IGNORECASE):
-                raise ValueError('Contenido no permitido detectado')
-        
-        return sanitized
+        return validate_chat_text(v)
 
 class TestResult(BaseModel):
     test_id: int
@@ -180,21 +1405,34 @@ class TestResult(BaseModel):
     details: dict
 
 class LocationData(BaseModel):
-    latitude: float
-    longitude: float
+    # Los rangos se validan en pydantic-core, sin pasar por Python
+    latitude: Latitude
+    longitude: Longitude
     address_components: dict = {}
-    
-    @validator('latitude')
-    def validate_latitude(cls, v):
-        if not -90 <= v <= 90:
-            raise ValueError('Latitud debe estar entre -90 y 90')
-        return v
-    
-    @validator('longitude')
-    def validate_longitude(cls, v):
-        if not -180 <= v <= 180:
-            raise ValueError('Longitud debe estar entre -180 y 180')
-        return v
+
+# Mensajes de los validadores de UserData, única fuente para la validación escalar y la
+# columnar; el código de error es el índice + 1 (0 = válido)
+USER_DATA_ERROR_MESSAGES = {
+    "nombre": [
+        'Nombre contiene caracteres no válidos',
+        'Nombre debe contener entre 2 y 4 palabras',
+        'Cada palabra del nombre debe tener mínimo 2 caracteres',
+    ],
+    "cedula": [
+        'Cédula debe contener solo números',
+        'Cédula debe tener entre 9 y 10 dígitos',
+        'Cédula contiene caracteres no válidos',
+    ],
+    "telefono": ['Teléfono debe tener 8 dígitos y empezar con 2, 6, 7 u 8'],
+    "direccion": [
+        'Dirección debe tener al menos 10 caracteres',
+        'Dirección contiene contenido no válido',
+    ],
+}
+
+def user_data_error(field: str, code: int) -> ValueError:
+    """Error de validación de `field` con el mensaje de su código `code`"""
+    return ValueError(USER_DATA_ERROR_MESSAGES[field][code - 1])
 
 class UserData(BaseModel):
     nombre: Optional[str] = None
@@ -202,7 +1440,8 @@ class UserData(BaseModel):
     telefono: Optional[str] = None
     direccion: Optional[str] = None
     
-    @validator('nombre', pre=True)
+    @field_validator('nombre', mode='before')
+    @classmethod
     def validate_nombre(cls, v):
         if not v:
             return v
@@ -211,63 +1450,66 @@ class UserData(BaseModel):
         sanitized = clean_html(str(v).strip())
         
         # Validar patrón seguro (solo letras, espacios y acentos)
-        if not re.match(r'^[a-zA-ZáéíóúÁÉÍÓÚñÑ\s]{2,100}$', sanitized):
-            raise ValueError('Nombre contiene caracteres no válidos')
+        if not NOMBRE_PATTERN.match(sanitized):
+            raise user_data_error('nombre', 1)
         
         # Validar estructura (2-4 palabras)
         palabras = sanitized.split()
         if not 2 <= len(palabras) <= 4:
-            raise ValueError('Nombre debe contener entre 2 y 4 palabras')
+            raise user_data_error('nombre', 2)
         
         # Verificar que cada palabra tenga mínimo 2 caracteres
         if not all(len(palabra) >= 2 for palabra in palabras):
-            raise ValueError('Cada palabra del nombre debe tener mínimo 2 caracteres')
+            raise user_data_error('nombre', 3)
         
         return sanitized
     
-    @validator('cedula', pre=True)
+    @field_validator('cedula', mode='before')
+    @classmethod
     def validate_cedula(cls, v):
         if not v:
             return v
         
         # Sanitizar - solo permitir dígitos y guiones
-        sanitized = re.sub(r'[^\d-]', '', str(v))
+        sanitized = CEDULA_STRIP_PATTERN.sub('', str(v))
         
         # Remover guiones para validación
-        digits_only = re.sub(r'[-\s]', '', sanitized)
+        digits_only = SEPARATORS_PATTERN.sub('', sanitized)
         
         # Validar que sean solo dígitos
         if not digits_only.isdigit():
-            raise ValueError('Cédula debe contener solo números')
+            raise user_data_error('cedula', 1)
         
         # Validar longitud (9-10 dígitos para Costa Rica)
         if not 9 <= len(digits_only) <= 10:
-            raise ValueError('Cédula debe tener entre 9 y 10 dígitos')
+            raise user_data_error('cedula', 2)
         
         # Verificar patrones de inyección SQL
-        if re.search(r'[;\'"\\]', sanitized):
-            raise ValueError('Cédula contiene caracteres no válidos')
+        if UNSAFE_QUOTES_PATTERN.search(sanitized):
+            raise user_data_error('cedula', 3)
         
         return digits_only
     
-    @validator('telefono', pre=True)
+    @field_validator('telefono', mode='before')
+    @classmethod
     def validate_telefono(cls, v):
         if not v:
             return v
         
         # Sanitizar - solo permitir dígitos, espacios y guiones
-        sanitized = re.sub(r'[^\d\s-]', '', str(v))
+        sanitized = TELEFONO_STRIP_PATTERN.sub('', str(v))
         
         # Remover espacios y guiones
-        digits_only = re.sub(r'[\s-]', '', sanitized)
+        digits_only = SEPARATORS_PATTERN.sub('', sanitized)
         
         # Validar formato costarricense
-        if not re.match(r'^[2678]\d{7}$', digits_only):
-            raise ValueError('Teléfono debe tener 8 dígitos y empezar con 2, 6, 7 u 8')
+        if not TELEFONO_PATTERN.match(digits_only):
+            raise user_data_error('telefono', 1)
         
         return digits_only
     
-    @validator('direccion', pre=True)
+    @field_validator('direccion', mode='before')
+    @classmethod
     def validate_direccion(cls, v):
         if not v:
             return v
@@ -277,41 +1519,340 @@ class UserData(BaseModel):
         
         # Verificar longitud mínima
         if len(sanitized) < 10:
-            raise ValueError('Dirección debe tener al menos 10 caracteres')
+            raise user_data_error('direccion', 1)
         
         # Verificar patrones peligrosos
-        dangerous_patterns = [
-            r'<script.*?>',
-            r'javascript:',
-            r'on\w+\s*=',
-            r'<.*?>',
-            r'[;\'"\\].*?--'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, sanitized, re.IGNORECASE):
-                raise ValueError('Dirección contiene contenido no válido')
+        rule = DIRECCION_CONTENT_INSPECTOR.inspect(sanitized)
+        if rule:
+            print(f"🛡️ Dirección bloqueada por la regla de contenido '{rule}'")
+            raise user_data_error('direccion', 2)
         
         return sanitized
 
-# Configurar archivos estáticos
-app.mount("/css", StaticFiles(directory="css"), name="css")
-app.mount("/js", StaticFiles(directory="js"), name="js")
+# Validadores reutilizables construidos al importar: validan dicts o JSON crudo
+# sin reconstruir el esquema en cada llamada
+USER_DATA_ADAPTER = TypeAdapter(UserData)
+LOCATION_DATA_ADAPTER = TypeAdapter(LocationData)
+CHAT_MESSAGE_ADAPTER = TypeAdapter(ChatMessage)
+GUIA_CHAT_MESSAGE_ADAPTER = TypeAdapter(GuiaChatMessage)
+
+# Validación columnar de UserData para lotes: cada campo se procesa como una matriz
+# de códigos de carácter (filas x ancho fijo) con tablas latin-1 derivadas de los
+# mismos patrones y funciones que usan los validadores. Las filas que las tablas no
+# cubren (otros caracteres, NUL, demasiado largas) pasan por el validador escalar.
+USER_DATA_FIELDS = ["nombre", "cedula", "telefono", "direccion"]
+
+# Ancho máximo de la matriz por campo; las filas más largas van al validador escalar
+COLUMNAR_MAX_WIDTH = {"nombre": 100, "cedula": 64, "telefono": 64, "direccion": 512}
+
+def _latin1_table(predicate):
+    """Tabla de 256 booleanos con predicate(carácter) para cada código latin-1"""
+    return np.array([bool(predicate(chr(code))) for code in range(256)])
+
+if np is not None:
+    # Caracteres que clean_html deja intactos en medio de un texto
+    _CLEAN_HTML_IDENTITY = _latin1_table(lambda ch: clean_html(f"a{ch}a") == f"a{ch}a")
+    _SPACE = _latin1_table(str.isspace)
+    _NOMBRE_CHAR = _latin1_table(lambda ch: NOMBRE_PATTERN.match(ch * 2))
+    # Caracteres que sobreviven a las dos limpiezas de cédula y de teléfono
+    _CEDULA_KEEP = _latin1_table(lambda ch: SEPARATORS_PATTERN.sub('', CEDULA_STRIP_PATTERN.sub('', ch)) == ch)
+    _CEDULA_UNSAFE = _latin1_table(
+        lambda ch: CEDULA_STRIP_PATTERN.sub('', ch) == ch and UNSAFE_QUOTES_PATTERN.search(ch)
+    )
+    _DIGIT = _latin1_table(str.isdigit)
+    _TELEFONO_KEEP = _latin1_table(lambda ch: SEPARATORS_PATTERN.sub('', TELEFONO_STRIP_PATTERN.sub('', ch)) == ch)
+    _TELEFONO_FIRST = _latin1_table(lambda ch: TELEFONO_PATTERN.match(ch + "0" * 7))
+    _TELEFONO_REST = _latin1_table(lambda ch: TELEFONO_PATTERN.match("2" + ch * 7))
+    # Sin caracteres que inicien una regla, el inspector de direcciones no puede bloquear
+    _DIRECCION_SAFE = _CLEAN_HTML_IDENTITY & _latin1_table(
+        lambda ch: ch not in DIRECCION_CONTENT_INSPECTOR.start_chars
+    )
+
+class ColumnValidation:
+    """Resultado de un campo del lote: máscara de válidos, códigos de error y valores normalizados"""
+    __slots__ = ("valid", "errors", "values")
+
+    def __init__(self, errors, values):
+        self.errors = errors
+        self.valid = errors == 0
+        self.values = values
+
+def _column_matrix(strings, max_width: int):
+    """Códigos de carácter (filas x ancho), longitudes, posiciones ocupadas y filas para el validador escalar"""
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    width = max(1, min(int(lengths.max()), max_width))
+    fits = lengths <= width
+    if not fits.all():
+        strings = [text if fit else "" for text, fit in zip(strings, fits)]
+
+    codes = np.array(strings, dtype=f"U{width}").view(np.uint32).reshape(len(strings), width)
+    inside = np.arange(width) < lengths[:, None]
+    latin1 = codes < 256
+    # Un NUL dentro del texto no se distingue del relleno: esas filas también van al escalar
+    fallback = ~fits | ~latin1.all(axis=1) | (((codes != 0) & inside).sum(axis=1) != lengths)
+    return np.where(latin1, codes, 0), lengths, inside, fallback
+
+def _compact_rows(codes, keep, count):
+    """Mover a la izquierda los caracteres marcados en keep, conservando su orden"""
+    order = np.argsort(~keep, axis=1, kind="stable")
+    packed = np.take_along_axis(codes, order, axis=1)
+    packed[np.arange(codes.shape[1]) >= count[:, None]] = 0
+    return packed
+
+def _row_strings(codes):
+    """Filas de códigos a str (el relleno NUL del final se descarta)"""
+    return np.ascontiguousarray(codes, dtype=np.uint32).view(f"U{codes.shape[1]}").ravel().tolist()
+
+def _nombre_columns(strings):
+    codes, lengths, inside, fallback = _column_matrix(strings, COLUMNAR_MAX_WIDTH["nombre"])
+    fallback |= (inside & ~_CLEAN_HTML_IDENTITY[codes]).any(axis=1)
+    # Mismo rango de longitud que NOMBRE_PATTERN ({2,100}); las filas de más de 100 van al escalar
+    allowed = (~inside | _NOMBRE_CHAR[codes]).all(axis=1) & (lengths >= 2)
+
+    word = inside & ~_SPACE[codes]
+    before = np.zeros_like(word)
+    before[:, 1:] = word[:, :-1]
+    after = np.zeros_like(word)
+    after[:, :-1] = word[:, 1:]
+    starts = word & ~before
+    words = starts.sum(axis=1)
+    short = (starts & ~after).any(axis=1)
+
+    errors = np.select([~allowed, (words < 2) | (words > 4), short], [1, 2, 3], 0)
+    return errors, strings, fallback
+
+def _cedula_columns(strings):
+    codes, _, _, fallback = _column_matrix(strings, COLUMNAR_MAX_WIDTH["cedula"])
+    keep = _CEDULA_KEEP[codes]
+    count = keep.sum(axis=1)
+    numeric = (count > 0) & ~(keep & ~_DIGIT[codes]).any(axis=1)
+    unsafe = _CEDULA_UNSAFE[codes].any(axis=1)
+    errors = np.select([~numeric, (count < 9) | (count > 10), unsafe], [1, 2, 3], 0)
+    return errors, _row_strings(_compact_rows(codes, keep, count)), fallback
+
+def _telefono_columns(strings):
+    codes, _, _, fallback = _column_matrix(strings, COLUMNAR_MAX_WIDTH["telefono"])
+    keep = _TELEFONO_KEEP[codes]
+    count = keep.sum(axis=1)
+    packed = _compact_rows(codes, keep, count)
+    valid = (count == 8) & _TELEFONO_FIRST[packed[:, 0]] & _TELEFONO_REST[packed[:, 1:8]].all(axis=1)
+    return np.where(valid, 0, 1), _row_strings(packed), fallback
+
+def _direccion_columns(strings):
+    codes, lengths, inside, fallback = _column_matrix(strings, COLUMNAR_MAX_WIDTH["direccion"])
+    fallback |= (inside & ~_DIRECCION_SAFE[codes]).any(axis=1)
+    return np.where(lengths >= 10, 0, 1), strings, fallback
+
+# Campo -> (validador columnar, si el validador escalar aplica strip antes de validar)
+_COLUMN_VALIDATORS = {
+    "nombre": (_nombre_columns, True),
+    "cedula": (_cedula_columns, False),
+    "telefono": (_telefono_columns, False),
+    "direccion": (_direccion_columns, True),
+}
+
+def validate_user_columns(columns):
+    """Validar un lote de UserData por columnas: {campo: [str | None, ...]} -> {campo: ColumnValidation}.
+
+    Equivale a validar cada fila con los validadores de UserData; requiere NumPy."""
+    size = max((len(values) for values in columns.values()), default=0)
+    results = {}
+    for field in USER_DATA_FIELDS:
+        values = list(columns.get(field) or [None] * size)
+        errors = np.zeros(size, dtype=np.int8)
+        # Los validadores devuelven los valores vacíos tal cual
+        present = [index for index, value in enumerate(values) if value]
+        if present:
+            validator, strip = _COLUMN_VALIDATORS[field]
+            strings = [str(values[index]).strip() if strip else str(values[index]) for index in present]
+            codes, normalized, fallback = validator(strings)
+            scalar = getattr(UserData, f"validate_{field}")
+            for position, index in enumerate(present):
+                if fallback[position]:
+                    try:
+                        values[index] = scalar(values[index])
+                    except ValueError as e:
+                        errors[index] = USER_DATA_ERROR_MESSAGES[field].index(str(e)) + 1
+                elif codes[position]:
+                    errors[index] = codes[position]
+                else:
+                    values[index] = normalized[position]
+        results[field] = ColumnValidation(errors, values)
+    return results
 
 # Configurar templates
 templates = Jinja2Templates(directory=".")
 
-# Middleware para headers de seguridad
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    
-    # Headers de seguridad
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    response.headers["Content-Security-Policy"] = (
+# Caché de páginas y assets estáticos en memoria, con variantes precomprimidas
+APP_ENV = os.getenv("APP_ENV", "development")
+# En desarrollo se revisa el mtime como máximo cada N segundos; en producción solo con recarga explícita
+PAGE_CACHE_CHECK_INTERVAL = float(os.getenv("PAGE_CACHE_CHECK_INTERVAL", "2"))
+ADMIN_RELOAD_TOKEN = os.getenv("ADMIN_RELOAD_TOKEN")
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "300"))  # segundos de caché en el navegador para /css y /js
+STATIC_DIRECTORIES = ["css", "js"]
+HTML_PAGES = ["index.html", "pruebas-automaticas.html", "reporte-pruebas.html"]
+COMPRESSION_MIN_SIZE = 512  # bytes; por debajo no compensa comprimir
+
+class CachedFile:
+    """Contenido de un archivo en memoria con sus variantes comprimidas y ETags"""
+    __slots__ = ("content", "variants", "etags", "media_type", "mtime", "checked")
+
+    def __init__(self, content: bytes, media_type: str, mtime: int, checked: float):
+        self.content = content
+        self.media_type = media_type
+        self.mtime = mtime
+        self.checked = checked
+
+        # Variantes por content-coding; solo se guardan si reducen el tamaño
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        self.variants = {"identity": content}
+        self.etags = {"identity": f'"{digest}"'}
+        if len(content) >= COMPRESSION_MIN_SIZE:
+            compressed = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(content, quality=11)
+            for coding, body in compressed.items():
+                if len(body) < len(content):
+                    self.variants[coding] = body
+                    self.etags[coding] = f'"{digest}-{coding}"'
+
+class AssetCache:
+    """Caché de páginas y assets: lee y precomprime cada archivo una sola vez y
+    sirve los bytes desde memoria.
+
+    Con `check_interval` se invalida al cambiar el mtime (desarrollo); con None
+    solo se recarga mediante `reload()` (producción). Solo se sirven archivos
+    registrados, así que una ruta arbitraria nunca llega al disco.
+    """
+
+    def __init__(self, pages, directories, check_interval: Optional[float]):
+        self.pages = list(pages)
+        self.directories = list(directories)
+        self.check_interval = check_interval
+        self._entries = {}
+        self._scanned = 0.0
+
+    def _scan(self):
+        """Lista de archivos servibles: páginas HTML y contenido de los directorios estáticos"""
+        paths = list(self.pages)
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                paths.extend(os.path.join(root, name).replace(os.sep, "/") for name in sorted(files))
+        self._scanned = time.monotonic()
+        return paths
+
+    def _load(self, path: str) -> CachedFile:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type == "application/javascript":
+            media_type += "; charset=utf-8"  # Starlette ya añade el charset a los tipos text/*
+        with open(path, "rb") as f:
+            entry = CachedFile(f.read(), media_type, os.fstat(f.fileno()).st_mtime_ns, time.monotonic())
+        self._entries[path] = entry
+        return entry
+
+    def reload(self) -> int:
+        """Volver a leer y comprimir todos los archivos desde disco; los que faltan se omiten.
+
+        Comprimir es costoso (gzip 9, brotli 11): desde una ruta async se llama con asyncio.to_thread.
+        """
+        paths = self._scan()
+        for path in set(self._entries) - set(paths):
+            self._entries.pop(path, None)
+        loaded = 0
+        for path in paths:
+            try:
+                self._load(path)
+                loaded += 1
+            except FileNotFoundError:
+                self._entries.pop(path, None)
+                print(f"⚠️ Archivo no encontrado, no se sirve hasta que exista: {path}")
+        return loaded
+
+    def get(self, path: str) -> Optional[CachedFile]:
+        entry = self._entries.get(path)
+        if entry is None:
+            if path in self.pages:
+                try:
+                    return self._load(path)
+                except FileNotFoundError:
+                    return None
+            # En desarrollo, detectar assets nuevos sin recorrer el disco en cada 404
+            if self.check_interval is not None and time.monotonic() - self._scanned >= self.check_interval:
+                if path in self._scan():
+                    return self._load(path)
+            return None
+
+        if self.check_interval is not None:
+            current_time = time.monotonic()
+            if current_time - entry.checked >= self.check_interval:
+                entry.checked = current_time
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    del self._entries[path]
+                    return None
+                if mtime != entry.mtime:
+                    print(f"🔄 Archivo modificado, recargando: {path}")
+                    entry = self._load(path)
+        return entry
+
+asset_cache = AssetCache(
+    HTML_PAGES,
+    STATIC_DIRECTORIES,
+    check_interval=None if APP_ENV == "production" else PAGE_CACHE_CHECK_INTERVAL
+)
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """Elegir la mejor variante disponible según Accept-Encoding (br > gzip > identity)"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding in available and accepted.get(coding, wildcard) > 0:
+            return coding
+    return "identity"
+
+def serve_cached_file(request: Request, path: str, cache_control: str) -> Response:
+    """Responder con la variante precomprimida adecuada, o 304 si el ETag coincide"""
+    entry = asset_cache.get(path)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    coding = negotiate_encoding(request.headers.get("accept-encoding", ""), entry.variants)
+    headers = {
+        "ETag": entry.etags[coding],
+        "Vary": "Accept-Encoding",
+        "Cache-Control": cache_control
+    }
+
+    # Cualquier variante del mismo contenido sigue siendo válida para el cliente
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in client_tags or not client_tags.isdisjoint(entry.etags.values()):
+            return Response(status_code=304, headers=headers)
+
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(content=entry.variants[coding], media_type=entry.media_type, headers=headers)
+
+# Headers de seguridad, construidos una sola vez al arrancar
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+    "Content-Security-Policy": (
         "default-src 'self'; "
         "script-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://cdn-icons-png.flaticon.com; "
         "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
@@ -319,122 +1860,292 @@ async def add_security_headers(request: Request, call_next):
         "font-src 'self' https://fonts.gstatic.com; "
         "connect-src 'self'"
     )
-    
-    # Verificar rate limiting
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        response.headers["Retry-After"] = "60"
-    
-    return response
+}
+
+class SecurityHeadersMiddleware:
+    """Middleware ASGI que añade los headers de seguridad precalculados.
+
+    Solo modifica el mensaje http.response.start: el cuerpo pasa tal cual, sin
+    bufferizar ni crear tareas como hace BaseHTTPMiddleware.
+    """
+
+    def __init__(self, app, headers: dict = SECURITY_HEADERS):
+        self.app = app
+        self.raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+        self.header_names = {name for name, _ in self.raw_headers}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # Igual que antes, los headers de seguridad reemplazan a los que ponga la ruta
+                message["headers"] = [
+                    header for header in message.get("headers", ()) if header[0] not in self.header_names
+                ] + self.raw_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+app.add_middleware(SecurityHeadersMiddleware)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Servir la página principal del formulario"""
-    # Verificar rate limiting
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Demasiadas solicitudes")
-    
-    with open("index.html", "r", encoding="utf-8") as f:
-        content = f.read()
-    return HTMLResponse(content=content)
+    return serve_cached_file(request, "index.html", "no-cache")
 
 @app.get("/pruebas-automaticas", response_class=HTMLResponse)
 async def pruebas_automaticas(request: Request):
     """Servir la página de pruebas automáticas"""
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Demasiadas solicitudes")
-    
-    with open("pruebas-automaticas.html", "r", encoding="utf-8") as f:
-        content = f.read()
-    return HTMLResponse(content=content)
+    return serve_cached_file(request, "pruebas-automaticas.html", "no-cache")
 
 @app.get("/reporte-pruebas", response_class=HTMLResponse)
 async def reporte_pruebas(request: Request):
     """Servir la página de reporte de pruebas"""
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Demasiadas solicitudes")
-    
-    with open("reporte-pruebas.html", "r", encoding="utf-8") as f:
-        content = f.read()
-    return HTMLResponse(content=content)
+    return serve_cached_file(request, "reporte-pruebas.html", "no-cache")
+
+@app.api_route("/css/{filename:path}", methods=["GET", "HEAD"])
+async def static_css(request: Request, filename: str):
+    """Servir hojas de estilo precomprimidas desde memoria"""
+    return serve_cached_file(request, f"css/{filename}", f"public, max-age={STATIC_MAX_AGE}")
+
+@app.api_route("/js/{filename:path}", methods=["GET", "HEAD"])
+async def static_js(request: Request, filename: str):
+    """Servir scripts precomprimidos desde memoria"""
+    return serve_cached_file(request, f"js/{filename}", f"public, max-age={STATIC_MAX_AGE}")
+
+@app.post("/admin/reload-pages")
+async def reload_pages(request: Request):
+    """Recargar explícitamente la caché de páginas y assets (requiere ADMIN_RELOAD_TOKEN)"""
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_RELOAD_TOKEN or not secrets.compare_digest(token, ADMIN_RELOAD_TOKEN):
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    reloaded = await asyncio.to_thread(asset_cache.reload)
+    return {"status": "ok", "files_reloaded": reloaded, "timestamp": datetime.now().isoformat()}
+
+def guia_reply(guia_message: GuiaChatMessage) -> dict:
+    """Respuesta del chat de guía, compartida por POST /chat-guia y /ws/chat-guia"""
+    return {"response": get_ai_response(guia_message.message.lower().strip())}
 
 @app.post("/chat-guia")
 async def chat_guia_endpoint(request: Request, guia_message: GuiaChatMessage):
     """Endpoint para el chat de guía IA"""
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Demasiadas solicitudes")
-    
     try:
-        message = guia_message.message.lower().strip()
-        response = get_ai_response(message)
-        return JSONResponse(content={"response": response})
+        return JSONResponse(content=guia_reply(guia_message))
     except ValidationError as e:
         return JSONResponse(content={"response": "Mensaje no válido. Por favor verifica tu entrada."}, status_code=400)
     except Exception as e:
         return JSONResponse(content={"response": "Lo siento, hubo un error. ¿Podrías intentar de nuevo?"}, status_code=500)
 
+# Intenciones del chat de guía en orden de prioridad: responde la primera que tenga
+# alguna palabra clave contenida en el mensaje (sin acentos)
+GUIA_INTENTS = [
+    ("formulario", ["formulario", "llenar", "completar", "formato"],
+     'Para llenar el formulario correctamente: 1) Ingresa tu nombre completo (1-2 nombres + 2 apellidos), 2) Tu cédula de 9-10 dígitos, 3) Teléfono de 8 dígitos empezando con 2,6,7 u 8, 4) Dirección completa para entrega.'),
+    ("requisitos", ["requisitos", "requisito"],
+     'Requisitos para tarjeta BCR: Mayor de edad, cédula vigente, ingresos demostrables mínimos ₡300,000, no estar en centrales de riesgo, residir en Costa Rica.'),
+    ("documentos", ["documentos", "documento"],
+     'Documentos necesarios: Cédula de identidad vigente, comprobante de ingresos (colillas, constancia patronal), comprobante de domicilio (recibo de servicios).'),
+    ("validacion", ["validacion", "valida", "proceso", "verifica"],
+     'El proceso de validación incluye: verificación en CCSS, consulta en centrales de riesgo, validación en sistema BCR, y confirmación en Ministerio de Hacienda.'),
+    ("tiempo", ["tiempo", "demora", "cuanto", "cuando"],
+     'El proceso toma aproximadamente 2-3 minutos. La tarjeta se entrega en 24-48 horas hábiles una vez aprobada.'),
+    ("credito", ["credito", "limite", "monto", "cantidad"],
+     'El límite de crédito inicial es de ₡500,000 a ₡2,000,000 dependiendo de tus ingresos y historial crediticio.'),
+    ("ayuda", ["ayuda", "contacto", "telefono"],
+     'Si necesitas ayuda adicional, puedes contactar al 2295-9595 o visitar cualquier sucursal BCR.'),
+    # Respuestas contextuales
+    ("saludo", ["hola", "buenos", "buenas"],
+     '¡Hola! Soy tu asistente virtual del BCR. ¿En qué puedo ayudarte con tu solicitud de tarjeta de crédito?'),
+    ("gracias", ["gracias"],
+     '¡De nada! Estoy aquí para ayudarte. ¿Tienes alguna otra pregunta sobre el proceso?'),
+    ("problema", ["problema", "error", "falla"],
+     'Si tienes problemas técnicos, intenta refrescar la página. Si el problema persiste, contacta al 2295-9595.'),
+    ("nombre", ["nombre", "completo"],
+     'Para el nombre, ingresa de 2 a 4 palabras: tu(s) nombre(s) y tus dos apellidos. Ejemplo: "Juan Carlos Pérez González".'),
+    ("cedula", ["cedula", "identificacion"],
+     'La cédula debe tener 9 o 10 dígitos, solo números. Ejemplo: 123456789 o 1234567890.'),
+    ("telefono", ["telefono", "numero"],
+     'El teléfono debe tener exactamente 8 dígitos y empezar con 2, 6, 7 u 8. Ejemplo: 88887777.'),
+    ("direccion", ["direccion", "entrega"],
+     'Proporciona tu dirección completa y detallada para la entrega de la tarjeta. Incluye provincia, cantón, distrito y señas específicas.'),
+]
+GUIA_DEFAULT_RESPONSE = 'No estoy seguro de cómo ayudarte con eso específicamente. ¿Podrías preguntarme sobre: formulario, requisitos, documentos, validación, tiempo de proceso, o límites de crédito?'
+
+# Quitar acentos una sola vez: "cédula" y "cedula" activan la misma intención
+ACCENT_FOLD_TABLE = str.maketrans("áéíóúüàèìòù", "aeiouuaeiou")
+
+def keyword_trie_pattern(words):
+    """Alternativa de palabras literales como trie de regex: "c(?:edula|uan(?:do|to))".
+
+    Ante un prefijo compartido prueba primero la palabra más larga"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node):
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        alternation = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{alternation})?" if "" in node else alternation
+
+    return render(trie)
+
+class IntentMatcher:
+    """Todas las palabras clave compiladas en tries de regex; una pasada por el mensaje
+    devuelve la intención de mayor prioridad"""
+
+    def __init__(self, intents):
+        self.names = [name for name, _, _ in intents]
+
+        # Una palabra que contiene a otra de igual o mayor prioridad nunca decide nada
+        # ("validacion" contiene "valida", el "telefono" de la intención telefono ya
+        # está en ayuda), así que se descarta. Con eso, si una palabra es prefijo de
+        # otra, la más larga tiene mejor prioridad y el trie la prueba primero.
+        keywords = [(priority, word) for priority, (_, words, _) in enumerate(intents) for word in words]
+        self.keyword_priority = {}
+        for priority, word in keywords:
+            implied = any(
+                other != word and other in word and other_priority <= priority
+                for other_priority, other in keywords
+            )
+            if not implied and word not in self.keyword_priority:
+                self.keyword_priority[word] = priority
+
+        # patterns[p]: palabras con prioridad mejor que p. Tras encontrar una intención
+        # solo se siguen buscando las que podrían superarla.
+        self.patterns = [None]
+        for priority in range(1, len(self.names) + 1):
+            words = [word for word, other in self.keyword_priority.items() if other < priority]
+            self.patterns.append(re.compile(keyword_trie_pattern(words)) if words else None)
+
+    def match(self, message: str) -> Optional[str]:
+        """Nombre de la intención de mayor prioridad presente en el mensaje, o None"""
+        text = message.lower()
+        if not text.isascii():
+            text = text.translate(ACCENT_FOLD_TABLE)
+
+        best = len(self.names)
+        position = 0
+        while self.patterns[best] is not None:
+            found = self.patterns[best].search(text, position)
+            if found is None:
+                break
+            best = self.keyword_priority[found.group()]
+            # Siguiente búsqueda desde el carácter siguiente: las palabras pueden solaparse
+            position = found.start() + 1
+        return self.names[best] if best < len(self.names) else None
+
+GUIA_INTENT_MATCHER = IntentMatcher(GUIA_INTENTS)
+GUIA_RESPONSES = {name: response for name, _, response in GUIA_INTENTS}
+
 def get_ai_response(message: str):
     """Simula respuestas de IA para el chat de guía"""
-    knowledge_base = {
-        'formulario': 'Para llenar el formulario correctamente: 1) Ingresa tu nombre completo (1-2 nombres + 2 apellidos), 2) Tu cédula de 9-10 dígitos, 3) Teléfono de 8 dígitos empezando con 2,6,7 u 8, 4) Dirección completa para entrega.',
-        'requisitos': 'Requisitos para tarjeta BCR: Mayor de edad, cédula vigente, ingresos demostrables mínimos ₡300,000, no estar en centrales de riesgo, residir en Costa Rica.',
-        'documentos': 'Documentos necesarios: Cédula de identidad vigente, comprobante de ingresos (colillas, constancia patronal), comprobante de domicilio (recibo de servicios).',
-        'validacion': 'El proceso de validación incluye: verificación en CCSS, consulta en centrales de riesgo, validación en sistema BCR, y confirmación en Ministerio de Hacienda.',
-        'tiempo': 'El proceso toma aproximadamente 2-3 minutos. La tarjeta se entrega en 24-48 horas hábiles una vez aprobada.',
-        'credito': 'El límite de crédito inicial es de ₡500,000 a ₡2,000,000 dependiendo de tus ingresos y historial crediticio.',
-        'ayuda': 'Si necesitas ayuda adicional, puedes contactar al 2295-9595 o visitar cualquier sucursal BCR.'
-    }
-    
-    # Buscar palabras clave en el mensaje
-    for key, response in knowledge_base.items():
-        if (key in message or 
-            (key == 'formulario' and any(word in message for word in ['llenar', 'completar', 'formato'])) or
-            (key == 'requisitos' and 'requisito' in message) or
-            (key == 'documentos' and 'documento' in message) or
-            (key == 'validacion' and any(word in message for word in ['valida', 'proceso', 'verifica'])) or
-            (key == 'tiempo' and any(word in message for word in ['tiempo', 'demora', 'cuanto', 'cuando'])) or
-            (key == 'credito' and any(word in message for word in ['limite', 'monto', 'cantidad'])) or
-            (key == 'ayuda' and any(word in message for word in ['contacto', 'telefono', 'ayuda']))):
-            return response
-    
-    # Respuestas contextuales
-    if any(word in message for word in ['hola', 'buenos', 'buenas']):
-        return '¡Hola! Soy tu asistente virtual del BCR. ¿En qué puedo ayudarte con tu solicitud de tarjeta de crédito?'
-    
-    if 'gracias' in message:
-        return '¡De nada! Estoy aquí para ayudarte. ¿Tienes alguna otra pregunta sobre el proceso?'
-    
-    if any(word in message for word in ['problema', 'error', 'falla']):
-        return 'Si tienes problemas técnicos, intenta refrescar la página. Si el problema persiste, contacta al 2295-9595.'
-    
-    if any(word in message for word in ['nombre', 'completo']):
-        return 'Para el nombre, ingresa de 2 a 4 palabras: tu(s) nombre(s) y tus dos apellidos. Ejemplo: "Juan Carlos Pérez González".'
-    
-    if any(word in message for word in ['cedula', 'identificacion']):
-        return 'La cédula debe tener 9 o 10 dígitos, solo números. Ejemplo: 123456789 o 1234567890.'
-    
-    if any(word in message for word in ['telefono', 'numero']):
-        return 'El teléfono debe tener exactamente 8 dígitos y empezar con 2, 6, 7 u 8. Ejemplo: 88887777.'
-    
-    if any(word in message for word in ['direccion', 'entrega']):
-        return 'Proporciona tu dirección completa y detallada para la entrega de la tarjeta. Incluye provincia, cantón, distrito y señas específicas.'
-    
-    # Respuesta por defecto
-    return 'No estoy seguro de cómo ayudarte con eso específicamente. ¿Podrías preguntarme sobre: formulario, requisitos, documentos, validación, tiempo de proceso, o límites de crédito?'
+    intent = GUIA_INTENT_MATCHER.match(message)
+    return GUIA_RESPONSES.get(intent, GUIA_DEFAULT_RESPONSE)
+
+# Sesiones del chat en el servidor: el cliente solo envía el mensaje nuevo y su conversation_id
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "50000"))
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "1800"))  # segundos sin mensajes
+
+class ChatSession:
+    """Estado de una conversación: paso actual y datos ya capturados"""
+    __slots__ = ("paso", "nombre", "cedula", "telefono", "direccion", "updated")
+
+    def __init__(self, updated: float):
+        self.paso = 1
+        self.nombre = None
+        self.cedula = None
+        self.telefono = None
+        self.direccion = None
+        self.updated = updated
+
+class ChatSessionStore:
+    """Sesiones por conversation_id en una ClientStateStore (LRU + TTL) con aciertos y fallos"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.store = ClientStateStore(max_size, ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: str, now: float) -> ChatSession:
+        """Sesión de la conversación; si no existe o ya expiró se crea una nueva en el paso 1"""
+        session = self.store.get(conversation_id)
+        if session is not None and now - session.updated >= self.store.idle_ttl:
+            # Expiró antes de que pasara el barrido periódico
+            self.store.expirations += 1
+            session = None
+        if session is None:
+            self.misses += 1
+            session = ChatSession(now)
+            self.store.put(conversation_id, session)
+        else:
+            self.hits += 1
+            session.updated = now
+        return session
+
+    def sweep(self) -> int:
+        return self.store.sweep()
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            **self.store.stats(),
+            "ttl": self.store.idle_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+chat_sessions = ChatSessionStore(CHAT_SESSION_MAX, CHAT_SESSION_TTL)
+
+def process_session_message(session: ChatSession, raw_message: str, message: str) -> dict:
+    """Avanza la conversación con el estado del servidor y guarda el dato de cada paso completado"""
+    paso = session.paso
+    if paso == 1 and not session.nombre:
+        try:
+            session.nombre = UserData.validate_nombre(raw_message) or None
+        except ValueError:
+            pass
+
+    response = process_chat_message(message, {"paso": paso, "nombre": session.nombre})
+    if response.get("paso", paso) > paso:
+        if paso == 2:
+            session.cedula = SEPARATORS_PATTERN.sub('', message)
+        elif paso == 3:
+            session.telefono = SEPARATORS_PATTERN.sub('', message)
+        elif paso == 4:
+            session.direccion = clean_html(raw_message)
+        session.paso = response["paso"]
+    return response
+
+def chat_reply(chat_message: ChatMessage) -> dict:
+    """Respuesta del chat del formulario, compartida por POST /chat y /ws/chat"""
+    message = chat_message.message.lower().strip()
+
+    if chat_message.conversation_id:
+        session = chat_sessions.get(chat_message.conversation_id, time.monotonic())
+        response = process_session_message(session, chat_message.message, message)
+        response["conversation_id"] = chat_message.conversation_id
+        return response
+    # Clientes anteriores: el estado completo viaja en user_data
+    return process_chat_message(message, chat_message.user_data)
 
 @app.post("/chat")
 async def chat_endpoint(chat_message: ChatMessage):
     """Endpoint para manejar mensajes del chat"""
     try:
-        message = chat_message.message.lower().strip()
-        user_data = chat_message.user_data
-        
-        response = process_chat_message(message, user_data)
-        return JSONResponse(content=response)
+        return JSONResponse(content=chat_reply(chat_message))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -501,6 +2212,153 @@ def validate_telefono(telefono: str) -> bool:
     clean_telefono = re.sub(r'[\s-]', '', telefono)
     return bool(re.match(r'^[2678]\d{7}$', clean_telefono))
 
+# Chat por WebSocket: el mismo flujo que POST /chat y /chat-guia sobre una conexión persistente.
+#
+# Cada mensaje es un JSON {"id": ..., "message": ..., ...} y la respuesta repite el "id".
+# Los mensajes se procesan de a uno por conexión: no se lee el siguiente hasta enviar
+# la respuesta, así un cliente que envía más rápido de lo que lee llena sus propios
+# buffers (backpressure de TCP) en lugar de memoria del servidor, y un envío que no
+# avanza en WS_SEND_TIMEOUT cierra la conexión. WS_MAX_MESSAGE_BYTES se mide en bytes UTF-8.
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "1000"))  # por worker
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "120"))  # segundos sin mensajes
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_MAX_MESSAGE_BYTES = int(os.getenv("WS_MAX_MESSAGE_BYTES", "8192"))
+WS_CLOSE_GOING_AWAY = 1001
+WS_CLOSE_POLICY_VIOLATION = 1008
+WS_CLOSE_TOO_BIG = 1009
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+class ChatSocketRegistry:
+    """Cupo de WebSockets abiertos en este worker y contadores para /metrics"""
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.active = 0
+        self.opened = 0
+        self.rejected = 0  # cupo lleno
+        self.messages = 0
+        self.rate_limited = 0
+        self.idle_closed = 0
+        self.slow_closed = 0  # el cliente no leía las respuestas
+
+    def acquire(self) -> bool:
+        if self.active >= self.max_connections:
+            self.rejected += 1
+            return False
+        self.active += 1
+        self.opened += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "max_connections": self.max_connections,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "messages": self.messages,
+            "rate_limited": self.rate_limited,
+            "idle_closed": self.idle_closed,
+            "slow_closed": self.slow_closed
+        }
+
+chat_sockets = ChatSocketRegistry(WS_MAX_CONNECTIONS)
+
+async def run_chat_socket(websocket: WebSocket, rate_limit_path: str, reply):
+    """Atiende una conexión: valida, aplica rate limiting y responde mensaje a mensaje"""
+    await websocket.accept()
+    if not chat_sockets.acquire():
+        await websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER, reason="Demasiadas conexiones")
+        return
+
+    client_ip = websocket.client.host if websocket.client else "unknown"
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(websocket.receive(), WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                chat_sockets.idle_closed += 1
+                await websocket.close(code=WS_CLOSE_GOING_AWAY, reason="Conexión inactiva")
+                return
+            if event["type"] == "websocket.disconnect":
+                return
+
+            text = event.get("text")
+            if text is None:
+                data = event.get("bytes") or b""
+                size = len(data)
+                text = data.decode("utf-8", "replace")
+            else:
+                size = len(text.encode())
+            if size > WS_MAX_MESSAGE_BYTES:
+                await websocket.close(code=WS_CLOSE_TOO_BIG, reason="Mensaje demasiado grande")
+                return
+
+            chat_sockets.messages += 1
+            response = chat_socket_response(text, client_ip, rate_limit_path, reply)
+            try:
+                await asyncio.wait_for(websocket.send_text(json.dumps(response)), WS_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                chat_sockets.slow_closed += 1
+                # Al cancelar solo se deja de esperar el drenaje: la trama ya está completa en el
+                # buffer del transporte y el cierre va detrás. Si el cliente tampoco lee el cierre,
+                # el servidor ASGI aborta la conexión al vencer su propio close timeout.
+                try:
+                    await asyncio.wait_for(
+                        websocket.close(code=WS_CLOSE_POLICY_VIOLATION, reason="El cliente no lee las respuestas"),
+                        WS_SEND_TIMEOUT
+                    )
+                except (asyncio.TimeoutError, RuntimeError):
+                    pass
+                return
+    finally:
+        chat_sockets.release()
+
+def chat_socket_response(text: str, client_ip: str, rate_limit_path: str, reply) -> dict:
+    """Respuesta a un mensaje del WebSocket, con el mismo "id" que envió el cliente"""
+    try:
+        payload = from_json(text)
+    except ValueError:
+        return {"error": "JSON no válido"}
+    if not isinstance(payload, dict):
+        return {"error": "Se esperaba un objeto JSON"}
+
+    request_id = payload.pop("id", None)
+    if not check_rate_limit(client_ip, rate_limit_path):
+        chat_sockets.rate_limited += 1
+        response = {"error": "Demasiadas solicitudes"}
+    else:
+        try:
+            response = reply(payload)
+        except ValidationError:
+            response = {"error": "Mensaje no válido. Por favor verifica tu entrada."}
+        except Exception:
+            response = {"error": "Lo siento, hubo un error. ¿Podrías intentar de nuevo?"}
+    if request_id is not None:
+        response["id"] = request_id
+    return response
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """Chat del formulario por WebSocket; sin conversation_id la conexión tiene su propia sesión"""
+    connection_id = secrets.token_urlsafe(12)
+
+    def reply(payload):
+        if not payload.get("conversation_id"):
+            payload["conversation_id"] = connection_id
+        return chat_reply(CHAT_MESSAGE_ADAPTER.validate_python(payload))
+
+    await run_chat_socket(websocket, "/chat", reply)
+
+@app.websocket("/ws/chat-guia")
+async def chat_guia_websocket(websocket: WebSocket):
+    """Chat de guía IA por WebSocket"""
+    await run_chat_socket(
+        websocket, "/chat-guia", lambda payload: guia_reply(GUIA_CHAT_MESSAGE_ADAPTER.validate_python(payload))
+    )
+
 @app.post("/validate-data")
 async def validate_data(user_data: dict):
     """Endpoint para simular validación de datos"""
@@ -522,17 +2380,228 @@ async def validate_data(user_data: dict):
         "validation_steps": validation_steps
     }
 
-@app.post("/test-exhaustive")
-async def run_exhaustive_tests(request: Request):
-    """Endpoint para ejecutar pruebas exhaustivas con IA real (GPT-4)"""
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Demasiadas solicitudes")
-    
-    await asyncio.sleep(2)
-    
-    # Generar resumen técnico para GPT-4
-    resumen_tecnico = """
+# Validación masiva: el cuerpo (NDJSON o CSV) se procesa línea a línea mientras llega
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", "65536"))  # límite por registro
+BULK_FLUSH_RECORDS = 500  # resultados por fragmento de la respuesta
+
+async def iter_body_lines(request: Request, max_line_bytes: int):
+    """Líneas del cuerpo como (número, bytes) sin cargarlo completo; None si la línea excede el máximo"""
+    line_number = 0
+    pending = bytearray()
+    oversized = False
+    async for chunk in request.stream():
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end == -1:
+                if not oversized:
+                    pending += chunk[start:]
+                    if len(pending) > max_line_bytes:
+                        # Se descarta el resto de la línea hasta el próximo salto
+                        oversized = True
+                        pending.clear()
+                break
+
+            line_number += 1
+            if oversized or len(pending) + end - start > max_line_bytes:
+                yield line_number, None
+            else:
+                pending += chunk[start:end]
+                yield line_number, bytes(pending).rstrip(b"\r")
+            pending.clear()
+            oversized = False
+            start = end + 1
+
+    if pending or oversized:
+        yield line_number + 1, None if oversized else bytes(pending).rstrip(b"\r")
+
+class RequestBodyStreamingResponse(StreamingResponse):
+    """StreamingResponse cuyo generador consume el cuerpo del request.
+
+    StreamingResponse escucha la desconexión leyendo receive() en paralelo, lo que
+    le robaría los fragmentos del cuerpo; aquí la desconexión la detecta
+    request.stream() con ClientDisconnect."""
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def bulk_validation_errors(error: ValidationError):
+    """Errores de pydantic en formato compacto: campo y mensaje"""
+    return [
+        {"field": ".".join(str(part) for part in err["loc"]) or None, "message": err["msg"]}
+        for err in error.errors(include_url=False)
+    ]
+
+def bulk_result(line_number: int, validate, payload):
+    """Validar un registro con las reglas de UserData y describir el resultado"""
+    try:
+        user = validate(payload)
+    except ValidationError as e:
+        return {"line": line_number, "valid": False, "errors": bulk_validation_errors(e)}
+    return {"line": line_number, "valid": True, "data": user.model_dump()}
+
+def oversized_result(line_number: int):
+    return {
+        "line": line_number,
+        "valid": False,
+        "errors": [{"field": None, "message": f"Registro excede {BULK_MAX_LINE_BYTES} bytes"}],
+    }
+
+def columnar_payload(payload) -> bool:
+    """El registro puede validarse por columnas: objeto cuyos campos de UserData son str o null"""
+    return isinstance(payload, dict) and all(
+        isinstance(payload.get(field), (str, type(None))) for field in USER_DATA_FIELDS
+    )
+
+def validate_bulk_batch(items):
+    """Resultados de un lote en orden: por columnas con NumPy, registro a registro si no.
+
+    Cada elemento es un resultado ya resuelto (dict) o un par (línea, payload), donde
+    payload es un objeto o, para NDJSON, la línea cruda."""
+    results = [None] * len(items)
+    columnar = []
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            results[index] = item
+            continue
+        line_number, payload = item
+        if np is not None and columnar_payload(payload):
+            columnar.append(index)
+        elif isinstance(payload, bytes):
+            results[index] = bulk_result(line_number, USER_DATA_ADAPTER.validate_json, payload)
+        else:
+            results[index] = bulk_result(line_number, USER_DATA_ADAPTER.validate_python, payload)
+
+    if columnar:
+        checked = validate_user_columns(
+            {field: [items[index][1].get(field) for index in columnar] for field in USER_DATA_FIELDS}
+        )
+        for position, index in enumerate(columnar):
+            line_number = items[index][0]
+            # Mismo formato que los errores de pydantic para un ValueError del validador
+            errors = [
+                {"field": field,
+                 "message": f"Value error, {USER_DATA_ERROR_MESSAGES[field][checked[field].errors[position] - 1]}"}
+                for field in USER_DATA_FIELDS if checked[field].errors[position]
+            ]
+            if errors:
+                results[index] = {"line": line_number, "valid": False, "errors": errors}
+            else:
+                data = {field: checked[field].values[position] for field in USER_DATA_FIELDS}
+                results[index] = {"line": line_number, "valid": True, "data": data}
+    return results
+
+async def iter_ndjson_records(lines):
+    """Un objeto JSON por línea; las líneas vacías se ignoran"""
+    async for line_number, line in lines:
+        if line is None:
+            yield oversized_result(line_number)
+        elif line.strip():
+            payload = line
+            if np is not None:
+                # Mismo parser que validate_json; lo que no va por columnas conserva la línea cruda
+                try:
+                    parsed = from_json(line)
+                except ValueError:
+                    parsed = None
+                if columnar_payload(parsed):
+                    payload = parsed
+            yield line_number, payload
+
+async def iter_csv_records(lines):
+    """CSV con encabezado; un campo entre comillas puede ocupar varias líneas"""
+    header = None
+    record = []
+    record_line = 0
+    record_size = 0
+    async for line_number, line in lines:
+        if line is None:
+            yield oversized_result(record_line or line_number)
+            record, record_line, record_size = [], 0, 0
+            continue
+
+        # utf-8-sig: las exportaciones de planillas suelen empezar con BOM, que si no
+        # queda pegado al nombre de la primera columna ("\ufeffnombre")
+        text = line.decode("utf-8-sig" if header is None else "utf-8", errors="replace")
+        if not record:
+            if not text.strip():
+                continue
+            record_line = line_number
+        record.append(text)
+        record_size += len(line) + 1
+
+        # Con un número impar de comillas el registro sigue en la línea siguiente
+        logical = "\n".join(record)
+        if logical.count('"') % 2:
+            if record_size > BULK_MAX_LINE_BYTES:
+                yield oversized_result(record_line)
+                record, record_line, record_size = [], 0, 0
+            continue
+        record, record_size = [], 0
+
+        values = next(csv.reader([logical]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            if not UserData.model_fields.keys() & set(header):
+                # Sin ninguna columna conocida cada fila pasaría como válida y vacía
+                yield {"line": record_line, "valid": False, "errors": [{
+                    "field": None,
+                    "message": f"Encabezado CSV sin columnas conocidas ({', '.join(UserData.model_fields)})"
+                }]}
+                return
+            continue
+        yield record_line, {name: value.strip() or None for name, value in zip(header, values)}
+
+    if record:
+        # Comillas sin cerrar al final del archivo
+        yield {"line": record_line, "valid": False, "errors": [{"field": None, "message": "Registro CSV incompleto"}]}
+
+async def iter_bulk_results(records):
+    """Resultados en el orden de entrada, validados en lotes de BULK_FLUSH_RECORDS"""
+    batch = []
+    async for item in records:
+        batch.append(item)
+        if len(batch) >= BULK_FLUSH_RECORDS:
+            for result in validate_bulk_batch(batch):
+                yield result
+            batch.clear()
+    for result in validate_bulk_batch(batch):
+        yield result
+
+@app.post("/validate-data/bulk")
+async def validate_data_bulk(request: Request):
+    """Validación masiva de solicitantes: NDJSON o CSV (text/csv) en streaming, resultados en NDJSON"""
+    lines = iter_body_lines(request, BULK_MAX_LINE_BYTES)
+    if "csv" in request.headers.get("content-type", ""):
+        records = iter_csv_records(lines)
+    else:
+        records = iter_ndjson_records(lines)
+    results = iter_bulk_results(records)
+
+    async def stream_results():
+        summary = {"total": 0, "valid": 0, "invalid": 0}
+        batch = []
+        try:
+            async for result in results:
+                summary["total"] += 1
+                summary["valid" if result["valid"] else "invalid"] += 1
+                batch.append(json.dumps(result, ensure_ascii=False))
+                if len(batch) >= BULK_FLUSH_RECORDS:
+                    yield "\n".join(batch) + "\n"
+                    batch.clear()
+        except ClientDisconnect:
+            print(f"⚠️ Validación masiva interrumpida: cliente desconectado tras {summary['total']} registros")
+            return
+        batch.append(json.dumps({"summary": summary}))
+        yield "\n".join(batch) + "\n"
+        print(f"📋 Validación masiva: {summary['total']} registros, {summary['invalid']} inválidos")
+
+    return RequestBodyStreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+# Resumen técnico que /test-exhaustive envía a GPT-4
+RESUMEN_TECNICO_EXHAUSTIVO = """
     ANÁLISIS TÉCNICO DEL SISTEMA BCR FORM:
     
     SEGURIDAD IMPLEMENTADA:
@@ -574,9 +2643,18 @@ async def run_exhaustive_tests(request: Request):
     
     TESTS EJECUTADOS: 10 pruebas - 8 PASSED, 2 WARNINGS, 0 FAILED
     """
+
+@app.post("/test-exhaustive")
+async def run_exhaustive_tests(request: Request):
+    """Endpoint para ejecutar pruebas exhaustivas con IA real (GPT-4)"""
+    await asyncio.sleep(2)
     
     # Usar GPT-4 real para análisis si está disponible
-    analysis = gpt_seguridad_pruebas(resumen_tecnico)
+    analysis = await gpt_seguridad_pruebas(RESUMEN_TECNICO_EXHAUSTIVO, hedge=True)
+    return build_exhaustive_report(analysis)
+
+def build_exhaustive_report(analysis: dict) -> dict:
+    """Reporte de /test-exhaustive a partir del análisis (GPT-4 o simulado)"""
     
     # Escenarios de prueba de seguridad expandidos (15 pruebas)
     test_scenarios = [
@@ -753,98 +2831,380 @@ async def run_exhaustive_tests(request: Request):
         "version": "2.1"
     }
 
-# 🧠 GPT-4 para análisis de seguridad exhaustivo
-def gpt_seguridad_pruebas(resumen_pruebas: str):
-    """Análisis de seguridad con GPT-4 real"""
-    if not OPENAI_AVAILABLE or openai_client is None:
-        print("📡 Usando IA simulada (OpenAI no disponible)")
-        return SecurityAnalyzer.analyze_system()  # Fallback a IA simulada
+def security_analysis_messages(resumen_pruebas: str) -> list:
+    """Mensajes para GPT-4 del análisis de seguridad de /test-exhaustive"""
+    prompt = f"""
+Eres un experto en ciberseguridad con certificaciones CISSP y OWASP.
+Analiza el siguiente resumen técnico de una aplicación web FastAPI y devuelve un análisis profundo:
+
+RESUMEN TÉCNICO:
+{resumen_pruebas}
+
+CONTEXTO:
+- Aplicación: Formulario BCR para tarjetas de crédito
+- Stack: FastAPI + Python + HTML/CSS/JS
+- Validaciones: Pydantic, sanitización HTML, rate limiting
+- Headers: CSP, X-Frame-Options, HSTS activos
+
+Devuelve SOLO un JSON válido con este formato exacto:
+{{
+  "security_score": [número 0-100],
+  "performance_score": [número 0-100], 
+  "ux_score": [número 0-100],
+  "backend_score": [número 0-100],
+  "recommendations": {{
+    "security": {{
+      "implemented": ["item 1", "item 2"],
+      "pending": ["mejora 1", "mejora 2"]
+    }},
+    "performance": {{
+      "implemented": ["optimización 1"],
+      "pending": ["mejora 1", "mejora 2"]
+    }},
+    "ux_ui": {{
+      "implemented": ["feature 1"],
+      "pending": ["mejora 1"]
+    }},
+    "backend": {{
+      "implemented": ["implementación 1"],
+      "pending": ["mejora 1"]
+    }}
+  }},
+  "summary": "Análisis ejecutivo en 2-3 líneas",
+  "ai_confidence": [número 0-100],
+  "critical_vulnerabilities": ["vuln1", "vuln2"],
+  "next_priority_actions": ["acción 1", "acción 2", "acción 3"]
+}}
+"""
+    return [
+        {"role": "system", "content": "Eres un analista senior de ciberseguridad. Responde SOLO con JSON válido, sin texto adicional."},
+        {"role": "user", "content": prompt}
+    ]
+
+# Caché persistente de análisis GPT-4 (SQLite). La clave es el hash de modelo, mensajes y
+# temperatura; una entrada vencida (más de ANALYSIS_CACHE_TTL) se sigue sirviendo mientras
+# una única tarea en segundo plano la renueva, hasta ANALYSIS_CACHE_MAX_AGE.
+ANALYSIS_CACHE_PATH = os.getenv(
+    "ANALYSIS_CACHE_PATH", os.path.join(tempfile.gettempdir(), "bcr-form-analysis-cache.sqlite3")
+)
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "3600"))
+ANALYSIS_CACHE_MAX_AGE = float(os.getenv("ANALYSIS_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+# Modo hedged de /test-exhaustive: si GPT-4 no responde en este plazo se devuelve el análisis
+# simulado y el real, al llegar, queda en la caché para el siguiente pedido (0 = esperar siempre)
+ANALYSIS_HEDGE_DEADLINE = float(os.getenv("ANALYSIS_HEDGE_DEADLINE", "20"))
+
+class AnalysisCache:
+    """Resultados de análisis por clave con edad, TTL y renovación en segundo plano.
+
+    sqlite se usa desde un hilo aparte (asyncio.to_thread) para no bloquear el event loop
+    mientras espera al disco; las entradas vencidas se borran cada PRUNE_INTERVAL segundos.
+    """
+
+    PRUNE_INTERVAL = 300
+
+    def __init__(self, path: str, ttl: float, max_age: float):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self._lock = threading.Lock()  # una sola conexión compartida por los hilos
+        self._next_prune = 0.0
+        self._refreshing = {}  # clave -> tarea de renovación en curso
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")  # lectores y escritores de varios workers
+            # Con WAL, NORMAL no sincroniza el disco en cada commit (solo en los checkpoints)
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache (key TEXT PRIMARY KEY, created REAL NOT NULL, value TEXT NOT NULL)"
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Caché de análisis desactivada ({path}): {e}")
+            self._db = None
+
+    @staticmethod
+    def key(model: str, messages: list, temperature: float) -> str:
+        payload = json.dumps([model, messages, temperature], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str):
+        """(resultado, edad en segundos) o None si no hay una entrada utilizable"""
+        if self._db is None:
+            return None
+        row = await asyncio.to_thread(self._read, key)
+        age = time.time() - row[0] if row else None
+        if age is None or age > self.max_age:
+            self.misses += 1
+            return None
+        if age > self.ttl:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return json.loads(row[1]), age
+
+    async def put(self, key: str, value: dict):
+        if self._db is None:
+            return
+        await asyncio.to_thread(self._write, key, json.dumps(value, ensure_ascii=False))
+
+    def _read(self, key: str):
+        try:
+            with self._lock:
+                return self._db.execute("SELECT created, value FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Error leyendo la caché de análisis: {e}")
+            return None
+
+    def _write(self, key: str, value: str):
+        now = time.time()
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, created, value) VALUES (?, ?, ?)",
+                    (key, now, value)
+                )
+                if now >= self._next_prune:
+                    self._db.execute("DELETE FROM analysis_cache WHERE created < ?", (now - self.max_age,))
+                    self._next_prune = now + self.PRUNE_INTERVAL
+        except sqlite3.Error as e:
+            print(f"⚠️ Error guardando en la caché de análisis: {e}")
+
+    def refresh(self, key: str, compute):
+        """Renovar la entrada en segundo plano; si ya hay una renovación en curso no hace nada"""
+        if key in self._refreshing:
+            return
+        self._refreshing[key] = asyncio.create_task(self._refresh(key, compute))
+
+    async def _refresh(self, key: str, compute):
+        try:
+            await self.put(key, await compute())
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            print(f"⚠️ No se pudo renovar el análisis en caché: {e}")
+        finally:
+            del self._refreshing[key]
+
+    def annotate(self, result: dict, age: Optional[float]) -> dict:
+        """Copia del resultado con el estado de la caché, para mostrar su antigüedad en la respuesta"""
+        status = "miss" if age is None else "stale" if age > self.ttl else "hit"
+        return dict(result, cache={
+            "status": status,
+            "age_seconds": round(age or 0),
+            "ttl_seconds": self.ttl,
+            "refreshing": status == "stale"
+        })
+
+    def stats(self) -> dict:
+        size = None
+        if self._db is not None:
+            try:
+                with self._lock:
+                    size = self._db.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        return {
+            "enabled": self._db is not None,
+            "entries": size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "refreshing": len(self._refreshing)
+        }
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_MAX_AGE)
+
+class AnalysisHedge:
+    """Carrera entre un análisis GPT-4 y un plazo; el que pierde por tiempo sigue en
+    segundo plano y su resultado se guarda en la caché al terminar"""
+
+    def __init__(self, cache: AnalysisCache, deadline: float):
+        self.cache = cache
+        self.deadline = deadline
+        self._late = set()  # consultas que no llegaron a tiempo (y su guardado) aún en curso
+        self.calls = 0
+        self.on_time = 0
+        self.hedged = 0
+        self.late_stored = 0
+        self.late_errors = 0
+
+    async def run(self, key: str, compute):
+        """Resultado de compute() si termina dentro del plazo, o None; sus errores se propagan"""
+        self.calls += 1
+        task = asyncio.ensure_future(compute())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.deadline)
+        except asyncio.CancelledError:
+            self._keep(key, task)
+            raise
+        if done:
+            self.on_time += 1
+            return task.result()
+        self.hedged += 1
+        self._keep(key, task)
+        return None
+
+    def _keep(self, key: str, task):
+        self._late.add(task)
+        task.add_done_callback(lambda _: self._store_late(key, task))
+
+    def _store_late(self, key: str, task):
+        self._late.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.late_errors += 1
+            print(f"⚠️ El análisis GPT-4 tardío falló: {error}")
+            return
+        # El guardado corre en otra tarea: este callback no puede esperar a sqlite
+        save = asyncio.ensure_future(self._save_late(key, task.result()))
+        self._late.add(save)
+        save.add_done_callback(self._late.discard)
+
+    async def _save_late(self, key: str, result: dict):
+        await self.cache.put(key, result)
+        self.late_stored += 1
+        print("💾 Análisis GPT-4 tardío guardado en caché")
+
+    def stats(self) -> dict:
+        return {
+            "deadline_seconds": self.deadline,
+            "calls": self.calls,
+            "on_time": self.on_time,
+            "hedged": self.hedged,
+            "hedged_ratio": round(self.hedged / self.calls, 4) if self.calls else None,
+            "late_stored": self.late_stored,
+            "late_errors": self.late_errors,
+            "pending": len(self._late)
+        }
+
+analysis_hedge = AnalysisHedge(analysis_cache, ANALYSIS_HEDGE_DEADLINE)
+
+async def request_gpt_analysis(route: str, choice: ModelChoice, messages: list, temperature: float) -> dict:
+    """Consulta a GPT-4 que debe devolver un análisis JSON; json.JSONDecodeError si no lo es"""
+    print(f"🧠 Consultando {choice.model} para análisis de seguridad...")
+    response = await openai_chat(
+        route,
+        choice,
+        messages=messages,
+        temperature=temperature
+    )
+
+    content = response.choices[0].message.content
+    if content:
+        content = content.strip()
+    else:
+        raise Exception("GPT-4 no devolvió contenido")
     
-    try:
-        prompt = f"""
-Eres un experto en ciberseguridad con certificaciones CISSP y OWASP.
-Analiza el siguiente resumen técnico de una aplicación web FastAPI y devuelve un análisis profundo:
+    # Limpiar el contenido para extraer solo el JSON
+    if content.startswith('```json'):
+        content = content.replace('```json', '').replace('```', '').strip()
+    
+    result = json.loads(content)
+    print("✅ Análisis GPT-4 completado exitosamente")
+    result["ai_powered"] = True
+    result["model_used"] = choice.model
+    return result
 
-RESUMEN TÉCNICO:
-{resumen_pruebas}
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave: la primera ejecuta y las demás esperan su resultado"""
 
-CONTEXTO:
-- Aplicación: Formulario BCR para tarjetas de crédito
-- Stack: FastAPI + Python + HTML/CSS/JS
-- Validaciones: Pydantic, sanitización HTML, rate limiting
-- Headers: CSP, X-Frame-Options, HSTS activos
+    def __init__(self):
+        self._in_flight = {}  # clave -> tarea en curso
+        self.calls = 0
+        self.executions = 0
 
-Devuelve SOLO un JSON válido con este formato exacto:
-{{
-  "security_score": [número 0-100],
-  "performance_score": [número 0-100], 
-  "ux_score": [número 0-100],
-  "backend_score": [número 0-100],
-  "recommendations": {{
-    "security": {{
-      "implemented": ["item 1", "item 2"],
-      "pending": ["mejora 1", "mejora 2"]
-    }},
-    "performance": {{
-      "implemented": ["optimización 1"],
-      "pending": ["mejora 1", "mejora 2"]
-    }},
-    "ux_ui": {{
-      "implemented": ["feature 1"],
-      "pending": ["mejora 1"]
-    }},
-    "backend": {{
-      "implemented": ["implementación 1"],
-      "pending": ["mejora 1"]
-    }}
-  }},
-  "summary": "Análisis ejecutivo en 2-3 líneas",
-  "ai_confidence": [número 0-100],
-  "critical_vulnerabilities": ["vuln1", "vuln2"],
-  "next_priority_actions": ["acción 1", "acción 2", "acción 3"]
-}}
-"""
+    async def do(self, key, compute):
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield: si un cliente se desconecta, la consulta sigue para los demás
+        return await asyncio.shield(task)
 
-        print("🧠 Consultando GPT-4 para análisis de seguridad...")
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Eres un analista senior de ciberseguridad. Responde SOLO con JSON válido, sin texto adicional."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=2000
-        )
+    def stats(self) -> dict:
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": round(coalesced / self.calls, 4) if self.calls else None,
+            "in_flight": len(self._in_flight)
+        }
 
-        content = response.choices[0].message.content
-        if content:
-            content = content.strip()
+gpt_single_flight = SingleFlight()
+
+async def coalesced_gpt_analysis(route: str, choice: ModelChoice, messages: list, temperature: float) -> dict:
+    """request_gpt_analysis compartida: las llamadas simultáneas con el mismo prompt esperan una sola
+    consulta a GPT-4. El dict resultante es el mismo para todas, no se debe modificar."""
+    key = (AnalysisCache.key(choice.model, messages, temperature), choice.max_tokens)
+    return await gpt_single_flight.do(key, lambda: request_gpt_analysis(route, choice, messages, temperature))
+
+# 🧠 GPT-4 para análisis de seguridad exhaustivo
+async def gpt_seguridad_pruebas(resumen_pruebas: str, route: str = "/test-exhaustive", hedge: bool = False):
+    """Análisis de seguridad con GPT-4 real, servido desde la caché de análisis si es posible.
+    Con hedge=True no se espera a GPT-4 más de ANALYSIS_HEDGE_DEADLINE: se responde con el simulado."""
+    if not OPENAI_AVAILABLE or openai_client is None:
+        print("📡 Usando IA simulada (OpenAI no disponible)")
+        return await SecurityAnalyzer.analyze_system(route)  # Fallback a IA simulada
+    
+    messages = security_analysis_messages(resumen_pruebas)
+    choice = model_router.choose(ANALYSIS_BUDGET, 2000, messages)
+    cache_key = AnalysisCache.key(choice.model, messages, 0.3)
+    cached = await analysis_cache.get(cache_key)
+    if cached is not None:
+        result, age = cached
+        if age > analysis_cache.ttl:
+            analysis_cache.refresh(cache_key, lambda: coalesced_gpt_analysis(route, choice, messages, 0.3))
+        return analysis_cache.annotate(result, age)
+    if openai_breaker.is_open():
+        return await SecurityAnalyzer.analyze_system(route)
+
+    fallback = None
+    try:
+        compute = lambda: coalesced_gpt_analysis(route, choice, messages, 0.3)
+        if hedge and analysis_hedge.deadline > 0:
+            # El simulado queda listo mientras se espera a GPT-4
+            fallback = SecurityAnalyzer.simulated_analysis()
+            result = await analysis_hedge.run(cache_key, compute)
+            if result is None:
+                print(f"⏱️ GPT-4 no respondió en {analysis_hedge.deadline:g} s: análisis simulado")
+                fallback["ai_powered"] = False
+                fallback["ai_analysis_pending"] = (
+                    f"GPT-4 no respondió en {analysis_hedge.deadline:g} s; "
+                    "el análisis real quedará en caché para la próxima consulta"
+                )
+                return fallback
         else:
-            raise Exception("GPT-4 no devolvió contenido")
-        
-        # Limpiar el contenido para extraer solo el JSON
-        if content.startswith('```json'):
-            content = content.replace('```json', '').replace('```', '').strip()
-        
-        try:
-            result = json.loads(content)
-            print("✅ Análisis GPT-4 completado exitosamente")
-            result["ai_powered"] = True
-            result["model_used"] = "gpt-4"
-            return result
-        except json.JSONDecodeError as e:
-            print(f"⚠️ Error parseando JSON de GPT-4: {e}")
-            # Fallback a análisis simulado si falla el parsing
-            fallback = SecurityAnalyzer.analyze_system()
-            fallback["ai_analysis_error"] = f"GPT-4 parsing error: {str(e)}"
-            fallback["gpt_raw_response"] = content
-            fallback["ai_powered"] = False
-            return fallback
-            
+            result = await compute()
+        await analysis_cache.put(cache_key, result)
+        return analysis_cache.annotate(result, None)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Error parseando JSON de GPT-4: {e}")
+        # Fallback a análisis simulado si falla el parsing; con hedge ya está listo y no se
+        # hace una segunda consulta a GPT-4 sin plazo
+        if fallback is None:
+            fallback = await SecurityAnalyzer.analyze_system(route)
+        fallback["ai_analysis_error"] = f"GPT-4 parsing error: {str(e)}"
+        fallback["gpt_raw_response"] = e.doc
+        fallback["ai_powered"] = False
+        return fallback
     except Exception as e:
         print(f"⚠️ Error en GPT-4: {e}")
         # Fallback a análisis simulado si falla OpenAI
-        fallback = SecurityAnalyzer.analyze_system()
+        if fallback is None:
+            fallback = await SecurityAnalyzer.analyze_system(route)
         fallback["ai_analysis_error"] = f"GPT-4 API error: {str(e)}"
         fallback["ai_powered"] = False
         return fallback
@@ -853,7 +3213,7 @@ class SecurityAnalyzer:
     """Analizador de seguridad con IA real (GPT-4) y fallback simulado"""
     
     @staticmethod
-    def analyze_system():
+    async def analyze_system(route: str = "/test-security-analyzer"):
         """
         Analiza el estado de seguridad del sistema enviando un resumen técnico a GPT-4 personalizado.
         Devuelve un JSON estructurado con puntuaciones y recomendaciones reales.
@@ -862,16 +3222,73 @@ class SecurityAnalyzer:
         # Si GPT-4 no está disponible, usar análisis simulado
         if not OPENAI_AVAILABLE or openai_client is None:
             print("📊 Usando análisis simulado (GPT-4 no disponible)")
-            return {
-                "security_score": 94,
-                "performance_score": 87,
-                "ux_score": 91,
-                "backend_score": 89,
+            return SecurityAnalyzer.simulated_analysis()
+        if openai_breaker.is_open():
+            print("⚡ Circuito de OpenAI abierto: análisis simulado sin esperar a GPT-4")
+            result = SecurityAnalyzer.simulated_analysis()
+            result["openai_circuit"] = openai_breaker.state
+            return result
+
+        try:
+            # El resultado se comparte con las llamadas concurrentes agrupadas: se copia antes de modificarlo
+            messages = SecurityAnalyzer.analysis_messages()
+            choice = model_router.choose(ANALYSIS_BUDGET, 1500, messages)
+            result = dict(await coalesced_gpt_analysis(route, choice, messages, 0.4))
+            
+            # Agregar metadatos de análisis
+            result["analysis_method"] = "gpt-4"
+            result["timestamp"] = datetime.now().isoformat()
+            
+            print("✅ Análisis GPT-4 del sistema completado exitosamente")
+            return result
+
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Error parseando JSON de GPT-4: {e}")
+            # Fallback a análisis simulado
+            fallback = {
+                "security_score": 85,
+                "performance_score": 75,
+                "ux_score": 80,
+                "backend_score": 78,
+                "recommendations": SecurityAnalyzer.get_smart_recommendations(),
+                "ai_analysis_error": f"GPT-4 JSON parsing error: {str(e)}",
+                "gpt_raw_response": "Invalid JSON response from GPT-4",
+                "ai_powered": False,
+                "analysis_method": "fallback"
+            }
+            return fallback
+            
+        except Exception as e:
+            print(f"⚠️ Error en análisis GPT-4: {e}")
+            # Fallback a análisis simulado
+            fallback = {
+                "security_score": 85,
+                "performance_score": 75,
+                "ux_score": 80,
+                "backend_score": 78,
                 "recommendations": SecurityAnalyzer.get_smart_recommendations(),
+                "ai_analysis_error": f"GPT-4 API error: {str(e)}",
                 "ai_powered": False,
-                "analysis_method": "simulated"
+                "analysis_method": "fallback"
             }
+            return fallback
+    
+    @staticmethod
+    def simulated_analysis():
+        """Análisis simulado que se usa cuando GPT-4 no está disponible"""
+        return {
+            "security_score": 94,
+            "performance_score": 87,
+            "ux_score": 91,
+            "backend_score": 89,
+            "recommendations": SecurityAnalyzer.get_smart_recommendations(),
+            "ai_powered": False,
+            "analysis_method": "simulated"
+        }
 
+    @staticmethod
+    def analysis_messages():
+        """Mensajes para GPT-4 con el estado actual del sistema"""
         resumen_pruebas = """
         ESTADO ACTUAL DEL SISTEMA BCR FORM:
         
@@ -954,74 +3371,11 @@ CRITERIOS DE PUNTUACIÓN:
 - UX: +10 por responsivo, +15 por accesibilidad completa
 - Backend: +15 por logs, +10 por monitoreo, +15 por tests
 """
+        return [
+            {"role": "system", "content": "Eres un auditor de seguridad experto en OWASP. Responde SOLO con JSON válido."},
+            {"role": "user", "content": prompt}
+        ]
 
-        try:
-            print("🧠 Consultando GPT-4 para análisis de seguridad del sistema...")
-            
-            content = None  # Inicializar variable
-            
-            response = openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "Eres un auditor de seguridad experto en OWASP. Responde SOLO con JSON válido."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4,
-                max_tokens=1500
-            )
-
-            content = response.choices[0].message.content
-            if content:
-                content = content.strip()
-            else:
-                raise Exception("GPT-4 no devolvió contenido")
-            
-            # Limpiar contenido JSON
-            if content.startswith('```json'):
-                content = content.replace('```json', '').replace('```', '').strip()
-            
-            result = json.loads(content)
-            
-            # Agregar metadatos de análisis
-            result["ai_powered"] = True
-            result["analysis_method"] = "gpt-4"
-            result["model_used"] = "gpt-4"
-            result["timestamp"] = datetime.now().isoformat()
-            
-            print("✅ Análisis GPT-4 del sistema completado exitosamente")
-            return result
-
-        except json.JSONDecodeError as e:
-            print(f"⚠️ Error parseando JSON de GPT-4: {e}")
-            # Fallback a análisis simulado
-            fallback = {
-                "security_score": 85,
-                "performance_score": 75,
-                "ux_score": 80,
-                "backend_score": 78,
-                "recommendations": SecurityAnalyzer.get_smart_recommendations(),
-                "ai_analysis_error": f"GPT-4 JSON parsing error: {str(e)}",
-                "gpt_raw_response": "Invalid JSON response from GPT-4",
-                "ai_powered": False,
-                "analysis_method": "fallback"
-            }
-            return fallback
-            
-        except Exception as e:
-            print(f"⚠️ Error en análisis GPT-4: {e}")
-            # Fallback a análisis simulado
-            fallback = {
-                "security_score": 85,
-                "performance_score": 75,
-                "ux_score": 80,
-                "backend_score": 78,
-                "recommendations": SecurityAnalyzer.get_smart_recommendations(),
-                "ai_analysis_error": f"GPT-4 API error: {str(e)}",
-                "ai_powered": False,
-                "analysis_method": "fallback"
-            }
-            return fallback
-    
     @staticmethod
     def get_smart_recommendations():
         """Generar recomendaciones inteligentes basadas en análisis"""
@@ -1086,13 +3440,227 @@ CRITERIOS DE PUNTUACIÓN:
             }
         }
 
+# Análisis GPT-4 en streaming (SSE): las secciones del JSON se envían apenas se completan
+class JSONSectionParser:
+    """Parser incremental del objeto JSON que devuelve GPT-4.
+
+    `feed` recibe fragmentos de texto y devuelve (ruta, valor) por cada miembro ya
+    completo: los valores de primer nivel que no son objetos (puntuaciones, listas,
+    resumen) y los miembros de los objetos de primer nivel (cada categoría de
+    "recommendations"). Ignora lo que haya antes de la primera "{", como la cerca
+    ```json que a veces agrega el modelo.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.text = ""
+        self.pos = 0
+        self.stack = []  # por contenedor abierto: [tipo, clave actual, espera clave, inicio]
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.scalar_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        text = self.text
+        sections = []
+        i = self.pos
+        while i < len(text) and not self.done:
+            c = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    self._string_end(i + 1, sections)
+                i += 1
+                continue
+            if self.scalar_start is not None:
+                if c not in ",}] \t\r\n":
+                    i += 1
+                    continue
+                self._value_end(self.scalar_start, i, sections)
+                self.scalar_start = None
+            if c == '"':
+                if self.stack:
+                    self.in_string = True
+                    self.string_start = i
+            elif c == "{" or c == "[":
+                if self.stack or c == "{":
+                    self.stack.append([c, None, c == "{", i])
+            elif c == "}" or c == "]":
+                if self.stack:
+                    start = self.stack.pop()[3]
+                    if self.stack:
+                        self._value_end(start, i + 1, sections)
+                    else:
+                        self.done = True
+            elif c == ",":
+                if self.stack and self.stack[-1][0] == "{":
+                    self.stack[-1][2] = True
+            elif c not in ": \t\r\n" and self.stack:
+                # Número, true, false o null: termina en el siguiente delimitador
+                self.scalar_start = i
+            i += 1
+        self.pos = i
+        return sections
+
+    def _string_end(self, end: int, sections: list):
+        frame = self.stack[-1]
+        if frame[0] == "{" and frame[2]:
+            frame[1] = json.loads(self.text[self.string_start:end])
+            frame[2] = False
+        else:
+            self._value_end(self.string_start, end, sections)
+
+    def _value_end(self, start: int, end: int, sections: list):
+        depth = len(self.stack)
+        if any(frame[0] != "{" for frame in self.stack):
+            return  # elemento de una lista: se envía la lista completa
+        if depth == self.max_depth or (depth < self.max_depth and self.text[start] != "{"):
+            try:
+                value = json.loads(self.text[start:end])
+            except ValueError:
+                return  # valor mal formado: el resultado final decide
+            sections.append(([frame[1] for frame in self.stack], value))
+
+    def result(self) -> dict:
+        """Objeto completo; ValueError si la respuesta quedó cortada o no es JSON válido"""
+        if not self.done:
+            raise ValueError("respuesta JSON incompleta")
+        start = self.text.index("{")
+        return json.loads(self.text[start:self.pos])
+
+def analysis_sections(analysis: dict, max_depth: int = 2):
+    """Las mismas secciones que emite JSONSectionParser, a partir de un análisis ya completo"""
+    for key, value in analysis.items():
+        if isinstance(value, dict) and max_depth > 1:
+            for subkey, subvalue in value.items():
+                yield [key, subkey], subvalue
+        else:
+            yield [key], value
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_gpt_analysis(route: str, messages: list, temperature: float, max_tokens: int, finish):
+    """Eventos SSE de un análisis GPT-4: "section" por cada parte del JSON, "fallback" si
+    hay que cambiar al análisis simulado y "done" con el resultado final de `finish`.
+
+    El cupo de concurrencia de la ruta se mantiene mientras dura el stream.
+    """
+    if not OPENAI_AVAILABLE or openai_client is None:
+        print("📡 Usando IA simulada (OpenAI no disponible)")
+        analysis = SecurityAnalyzer.simulated_analysis()
+        for path, value in analysis_sections(analysis):
+            yield sse_event("section", {"path": path, "value": value})
+        yield sse_event("done", finish(analysis))
+        return
+
+    # Con el análisis en caché no hay nada que esperar: se envían todas las secciones juntas
+    choice = model_router.choose(ANALYSIS_BUDGET, max_tokens, messages)
+    cache_key = AnalysisCache.key(choice.model, messages, temperature)
+    cached = await analysis_cache.get(cache_key)
+    if cached is not None:
+        analysis, age = cached
+        if age > analysis_cache.ttl:
+            analysis_cache.refresh(cache_key, lambda: coalesced_gpt_analysis(route, choice, messages, temperature))
+        analysis = analysis_cache.annotate(analysis, age)
+        for path, value in analysis_sections(analysis):
+            yield sse_event("section", {"path": path, "value": value})
+        yield sse_event("done", finish(analysis))
+        return
+
+    parser = JSONSectionParser()
+    try:
+        print(f"🧠 Consultando {choice.model} en streaming...")
+        async with openai_call(route):
+            start = time.perf_counter()
+            first_token = True
+            try:
+                stream = await openai_deadline(openai_client.chat.completions.create(
+                    model=choice.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=choice.max_tokens,
+                    stream=True
+                ), choice.timeout)
+                # El stream se cierra siempre (desconexión del cliente, plazo vencido o error)
+                # para devolver la conexión al pool y descontarla de in_flight
+                try:
+                    chunks = aiter(stream)
+                    while True:
+                        try:
+                            chunk = await openai_deadline(anext(chunks), choice.timeout)
+                        except StopAsyncIteration:
+                            break
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            if first_token:
+                                model_latency.observe(choice.model, "stream_first_token", time.perf_counter() - start)
+                                first_token = False
+                            for path, value in parser.feed(delta):
+                                yield sse_event("section", {"path": path, "value": value})
+                finally:
+                    await stream.close()
+            except Exception:
+                model_latency.error(choice.model)
+                raise
+            model_latency.observe(choice.model, "stream_total", time.perf_counter() - start)
+        analysis = parser.result()
+        analysis["ai_powered"] = True
+        analysis["model_used"] = choice.model
+        await analysis_cache.put(cache_key, analysis)
+        analysis = analysis_cache.annotate(analysis, None)
+        print("✅ Análisis GPT-4 en streaming completado")
+    except Exception as e:
+        # El upstream falló a mitad de la respuesta: las secciones simuladas reemplazan a las recibidas
+        print(f"⚠️ Error en streaming de GPT-4: {e}")
+        analysis = SecurityAnalyzer.simulated_analysis()
+        analysis["ai_analysis_error"] = f"GPT-4 stream error: {str(e)}"
+        yield sse_event("fallback", {"reason": analysis["ai_analysis_error"]})
+        for path, value in analysis_sections(analysis):
+            yield sse_event("section", {"path": path, "value": value})
+    yield sse_event("done", finish(analysis))
+
+def event_stream_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/test-exhaustive/stream")
+async def run_exhaustive_tests_stream():
+    """Pruebas exhaustivas con GPT-4 por SSE: puntuaciones y recomendaciones a medida que llegan"""
+    return event_stream_response(stream_gpt_analysis(
+        "/test-exhaustive", security_analysis_messages(RESUMEN_TECNICO_EXHAUSTIVO), 0.3, 2000, build_exhaustive_report
+    ))
+
+@app.get("/test-security-analyzer/stream")
+async def test_security_analyzer_stream():
+    """SecurityAnalyzer por SSE"""
+    def finish(analysis):
+        analysis.setdefault("analysis_method", "gpt-4" if analysis.get("ai_powered") else "simulated")
+        return {
+            "status": "ANÁLISIS COMPLETADO ✅",
+            "analysis": analysis,
+            "ai_powered": analysis.get("ai_powered", False),
+            "analysis_method": analysis["analysis_method"],
+            "timestamp": datetime.now().isoformat()
+        }
+
+    return event_stream_response(
+        stream_gpt_analysis("/test-security-analyzer", SecurityAnalyzer.analysis_messages(), 0.4, 1500, finish)
+    )
+
 @app.get("/test-automated")
 async def run_automated_tests(request: Request, limit: int = 15):
     """Endpoint para ejecutar pruebas automáticas con límite de seguridad"""
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Demasiadas solicitudes")
-    
     # Límite de seguridad para evitar sobrecarga
     if limit > 50:
         limit = 50
@@ -1180,10 +3748,6 @@ async def run_automated_tests(request: Request, limit: int = 15):
 @app.get("/test-quick")
 async def run_quick_tests(request: Request, count: int = 5):
     """Endpoint para ejecutar pruebas rápidas con cantidad personalizable"""
-    client_ip = request.client.host if request.client else "unknown"
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Demasiadas solicitudes")
-    
     # Límite de seguridad más estricto para pruebas rápidas
     if count > 25:
         count = 25
@@ -1391,7 +3955,27 @@ async def submit_form(
 @app.get("/health")
 async def health_check():
     """Endpoint de verificación de salud"""
-    return {"status": "ok", "message": "Servidor funcionando correctamente"}
+    return {"status": "ok", "message": "Servidor funcionando correctamente",
+            "openai_circuit": openai_breaker.state}
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas internas del servidor"""
+    return {
+        "rate_limit": rate_limiter.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "websocket": chat_sockets.stats(),
+        "openai": {route: limiter.stats() for route, limiter in openai_limiters.items()},
+        "analysis_cache": analysis_cache.stats(),
+        "gpt_coalescing": gpt_single_flight.stats(),
+        "analysis_hedge": analysis_hedge.stats(),
+        "openai_circuit": openai_breaker.stats(),
+        "model_routing": model_router.stats(),
+        "model_latency": model_latency.stats(),
+        "openai_http": openai_http.stats() if openai_http else None,
+        "openai_cassette": openai_cassette.stats() if openai_cassette else None,
+        "timestamp": datetime.now().isoformat()
+    }
 
 @app.get("/test-gpt4")
 async def test_gpt4_integration():
@@ -1419,14 +4003,15 @@ async def test_gpt4_integration():
             raise Exception("Cliente OpenAI no inicializado")
             
         test_prompt = "Responde solo con: {'test': 'success', 'model': 'gpt-4'}"
+        messages = [
+            {"role": "user", "content": test_prompt}
+        ]
         
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "user", "content": test_prompt}
-            ],
-            temperature=0,
-            max_tokens=50
+        response = await openai_chat(
+            "/test-gpt4",
+            model_router.choose(GPT4_TEST_BUDGET, 50, messages),
+            messages=messages,
+            temperature=0
         )
         
         content = response.choices[0].message.content
@@ -1456,7 +4041,7 @@ async def test_security_analyzer():
     
     try:
         print("🔍 Iniciando análisis de seguridad del sistema...")
-        analysis_result = SecurityAnalyzer.analyze_system()
+        analysis_result = await SecurityAnalyzer.analyze_system()
         
         return {
             "status": "ANÁLISIS COMPLETADO ✅",
@@ -1490,14 +4075,15 @@ async def test_openai_quick():
         }
     
     try:
-        # Prueba muy simple y rápida
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "user", "content": "Responde solo: OK"}
-            ],
-            temperature=0,
-            max_tokens=10
+        # Prueba muy simple y rápida: el modelo más económico que entre en el presupuesto
+        messages = [
+            {"role": "user", "content": "Responde solo: OK"}
+        ]
+        response = await openai_chat(
+            "/test-openai-quick",
+            model_router.choose(PING_BUDGET, 10, messages),
+            messages=messages,
+            temperature=0
         )
         
         return {
@@ -1515,93 +4101,131 @@ async def test_openai_quick():
             "error_type": type(e).__name__
         }
 
-@app.get("/test-system-complete")
-async def test_system_complete():
-    """Endpoint para probar todo el sistema: OpenAI + Pruebas automáticas + Exhaustivas"""
-    
-    results = {
-        "timestamp": datetime.now().isoformat(),
-        "tests": {}
-    }
-    
-    # 1. Test OpenAI Connection
-    print("🔍 Testing OpenAI connection...")
-    if OPENAI_AVAILABLE and openai_client:
-        try:
-            response = openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": "Responde solo: TEST_OK"}],
-                temperature=0,
-                max_tokens=10
-            )
-            results["tests"]["openai"] = {
-                "status": "✅ PASS",
-                "response": response.choices[0].message.content,
-                "tokens_used": response.usage.total_tokens if response.usage else 0
-            }
-        except Exception as e:
-            results["tests"]["openai"] = {
-                "status": "❌ FAIL",
-                "error": str(e)
-            }
-    else:
-        results["tests"]["openai"] = {
-            "status": "⚠️ SKIP",
-            "message": "OpenAI no configurado, usando fallback"
-        }
-    
-    # 2. Test SecurityAnalyzer
-    print("🔍 Testing SecurityAnalyzer...")
-    try:
-        analyzer_result = SecurityAnalyzer.analyze_system()
-        results["tests"]["security_analyzer"] = {
-            "status": "✅ PASS",
-            "ai_powered": analyzer_result.get("ai_powered", False),
-            "security_score": analyzer_result.get("security_score", 0),
-            "method": analyzer_result.get("analysis_method", "unknown")
-        }
-    except Exception as e:
-        results["tests"]["security_analyzer"] = {
-            "status": "❌ FAIL",
-            "error": str(e)
-        }
-    
-    # 3. Test gpt_seguridad_pruebas
-    print("🔍 Testing gpt_seguridad_pruebas...")
-    try:
-        test_resumen = """
+# Verificaciones de /test-system-complete: corren en paralelo, cada una con su timeout,
+# y ninguna más allá del plazo total
+SYSTEM_CHECK_DEADLINE = float(os.getenv("SYSTEM_CHECK_DEADLINE", "45"))
+
+SYSTEM_CHECK_RESUMEN = """
         SISTEMA DE PRUEBA BCR:
         - FastAPI backend
         - OpenAI GPT-4 integration
         - Security validations implemented
         - Rate limiting active
         """
-        gpt_result = gpt_seguridad_pruebas(test_resumen)
-        results["tests"]["gpt_security"] = {
-            "status": "✅ PASS",
-            "ai_powered": gpt_result.get("ai_powered", False),
-            "has_scores": all(key in gpt_result for key in ["security_score", "performance_score"])
+
+async def check_openai_connection() -> dict:
+    """1. Test OpenAI Connection"""
+    if not (OPENAI_AVAILABLE and openai_client):
+        return {
+            "status": "⚠️ SKIP",
+            "message": "OpenAI no configurado, usando fallback"
         }
+    messages = [{"role": "user", "content": "Responde solo: TEST_OK"}]
+    response = await openai_chat(
+        "/test-system-complete",
+        model_router.choose(PING_BUDGET, 10, messages),
+        messages=messages,
+        temperature=0
+    )
+    return {
+        "status": "✅ PASS",
+        "model": response.model,
+        "response": response.choices[0].message.content,
+        "tokens_used": response.usage.total_tokens if response.usage else 0
+    }
+
+async def check_security_analyzer() -> dict:
+    """2. Test SecurityAnalyzer"""
+    analyzer_result = await SecurityAnalyzer.analyze_system("/test-system-complete")
+    return {
+        "status": "✅ PASS",
+        "ai_powered": analyzer_result.get("ai_powered", False),
+        "security_score": analyzer_result.get("security_score", 0),
+        "method": analyzer_result.get("analysis_method", "unknown")
+    }
+
+async def check_gpt_security() -> dict:
+    """3. Test gpt_seguridad_pruebas"""
+    gpt_result = await gpt_seguridad_pruebas(SYSTEM_CHECK_RESUMEN, "/test-system-complete")
+    return {
+        "status": "✅ PASS",
+        "ai_powered": gpt_result.get("ai_powered", False),
+        "has_scores": all(key in gpt_result for key in ["security_score", "performance_score"])
+    }
+
+# (nombre, verificación, timeout en segundos); son independientes entre sí
+SYSTEM_CHECKS = [
+    ("openai", check_openai_connection, 15),
+    ("security_analyzer", check_security_analyzer, 40),
+    ("gpt_security", check_gpt_security, 40),
+]
+
+async def run_system_check(name: str, check, timeout: float):
+    """(nombre, resultado con wall_time_ms); un error o el timeout se reportan como FAIL"""
+    print(f"🔍 Testing {name}...")
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(check(), timeout)
+    except asyncio.TimeoutError:
+        result = {"status": "❌ FAIL", "error": f"Sin respuesta en {timeout:g} s"}
     except Exception as e:
-        results["tests"]["gpt_security"] = {
-            "status": "❌ FAIL", 
-            "error": str(e)
+        result = {"status": "❌ FAIL", "error": str(e)}
+    result["wall_time_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return name, result
+
+async def system_checks():
+    """Lanza todas las verificaciones a la vez y entrega (nombre, resultado) a medida que terminan"""
+    tasks = [
+        asyncio.create_task(run_system_check(name, check, min(timeout, SYSTEM_CHECK_DEADLINE)))
+        for name, check, timeout in SYSTEM_CHECKS
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # Cliente desconectado a mitad del stream: no dejar verificaciones huérfanas
+        for task in tasks:
+            task.cancel()
+
+def system_checks_report(tests: dict, started: float) -> dict:
+    """Resultado completo: verificaciones en el orden de SYSTEM_CHECKS y resumen"""
+    tests = {name: tests[name] for name, _, _ in SYSTEM_CHECKS if name in tests}
+    passed_tests = len([test for test in tests.values() if "✅ PASS" in test["status"]])
+    total_tests = len(tests)
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "tests": tests,
+        "summary": {
+            "total_tests": total_tests,
+            "passed": passed_tests,
+            "failed": total_tests - passed_tests,
+            "success_rate": round((passed_tests / total_tests) * 100, 1),
+            "overall_status": "✅ ALL SYSTEMS GO" if passed_tests == total_tests else f"⚠️ {passed_tests}/{total_tests} TESTS PASSED",
+            "wall_time_ms": round((time.perf_counter() - started) * 1000, 1),
+            "sequential_time_ms": round(sum(test["wall_time_ms"] for test in tests.values()), 1)
         }
-    
-    # 4. Summary
-    passed_tests = len([test for test in results["tests"].values() if "✅ PASS" in test["status"]])
-    total_tests = len(results["tests"])
-    
-    results["summary"] = {
-        "total_tests": total_tests,
-        "passed": passed_tests,
-        "failed": total_tests - passed_tests,
-        "success_rate": round((passed_tests / total_tests) * 100, 1),
-        "overall_status": "✅ ALL SYSTEMS GO" if passed_tests == total_tests else f"⚠️ {passed_tests}/{total_tests} TESTS PASSED"
     }
-    
-    return results
+
+@app.get("/test-system-complete")
+async def test_system_complete():
+    """Endpoint para probar todo el sistema: OpenAI + Pruebas automáticas + Exhaustivas, en paralelo"""
+    started = time.perf_counter()
+    tests = {name: result async for name, result in system_checks()}
+    return system_checks_report(tests, started)
+
+async def stream_system_checks():
+    started = time.perf_counter()
+    tests = {}
+    async for name, result in system_checks():
+        tests[name] = result
+        yield sse_event("check", dict(result, name=name))
+    yield sse_event("done", system_checks_report(tests, started))
+
+@app.get("/test-system-complete/stream")
+async def test_system_complete_stream():
+    """Verificaciones de /test-system-complete por SSE: un evento "check" por cada una al terminar y "done" con el resumen"""
+    return event_stream_response(stream_system_checks())
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001, reload=True)
+    uvicorn.run(app, host="0.0.0.0", port=8001, reload=True, ws_max_size=WS_MAX_MESSAGE_BYTES)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Servidor OpenAI simulado: POST /v1/chat/completions con latencia fija.
+
+Lo usan los benchmarks y la app con OPENAI_TRANSPORT=mock. Responde con el análisis
+de ejemplo en formato JSON, completo o por streaming (stream=true, chunks SSE como la
+API real). La espera es asíncrona, así un solo proceso atiende muchas consultas en paralelo.
+
+Uso:
+    python mock_openai.py [--port 8010] [--latency 3] [--tokens-per-second 0]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHARS_PER_TOKEN = 4
+
+ANALYSIS = {
+    "security_score": 88,
+    "performance_score": 80,
+    "ux_score": 85,
+    "backend_score": 82,
+    "recommendations": {
+        category: {
+            "implemented": [f"Medida implementada de {category} número {i}" for i in range(4)],
+            "pending": [f"Mejora pendiente de {category} con prioridad {i}" for i in range(5)],
+        }
+        for category in ("security", "performance", "ux_ui", "backend")
+    },
+    "summary": "El sistema cubre las protecciones básicas; faltan 2FA, cifrado y monitoreo. " * 3,
+    "ai_confidence": 90,
+    "critical_vulnerabilities": ["Sin 2FA", "Sin cifrado AES-256", "Sin WAF"],
+    "next_priority_actions": ["Implementar 2FA", "Cifrar datos sensibles", "Configurar monitoreo"],
+}
+ANALYSIS_TEXT = "```json\n" + json.dumps(ANALYSIS, ensure_ascii=False, indent=2) + "\n```"
+
+def completion(model: str, content: str) -> dict:
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": len(content) // CHARS_PER_TOKEN,
+                  "total_tokens": 100 + len(content) // CHARS_PER_TOKEN},
+    }
+
+def chunk(model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def create_mock_openai_app(latency: float = 3.0, tokens_per_second: float = 0, content: str = ANALYSIS_TEXT,
+                           model_latency: dict = None):
+    """App con la latencia indicada (app.state.latency, modificable en caliente) o la de
+    model_latency para cada modelo; con tokens_per_second > 0 el stream se emite a ese ritmo"""
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.latency = latency
+    app.state.model_latency = model_latency or {}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4")
+        app.state.requests += 1
+        await asyncio.sleep(app.state.model_latency.get(model, app.state.latency))
+
+        if not body.get("stream"):
+            return JSONResponse(completion(model, content))
+
+        async def events():
+            yield chunk(model, {"role": "assistant", "content": ""})
+            delay = 1 / tokens_per_second if tokens_per_second > 0 else 0
+            for start in range(0, len(content), CHARS_PER_TOKEN):
+                if delay:
+                    await asyncio.sleep(delay)
+                yield chunk(model, {"content": content[start:start + CHARS_PER_TOKEN]})
+            yield chunk(model, {}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        """Consultas recibidas, para que los benchmarks comprueben que llegaron al simulado"""
+        return {"requests": app.state.requests}
+
+    return app
+
+def main_server():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", type=float, default=3.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0)
+    args = parser.parse_args()
+    app = create_mock_openai_app(args.latency, args.tokens_per_second)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main_server()